@@ -0,0 +1,57 @@
+# benchmarks/bench_record_format.py
+# 比較舊的 CBC 紀錄與 v2 AES-GCM 紀錄：每筆加解密延遲與存檔大小
+#
+#   python benchmarks/bench_record_format.py --count 20000 --lengths 16 64 256 1024
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'crypto_keeper'))
+
+from model import crypto
+
+
+def per_record_us(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def run(length, count):
+    cipher = crypto.RecordCipher(os.urandom(32))
+    entries = [('Exchange', f'exchange-{i}', 'x' * length) for i in range(count)]
+    aads = [crypto.associated_data(category, identifier) for category, identifier, _ in entries]
+    plaintexts = [plaintext for _, _, plaintext in entries]
+
+    cbc = [cipher.encrypt(plaintext) for plaintext in plaintexts]
+    gcm = [cipher.encrypt(plaintext, aad) for plaintext, aad in zip(plaintexts, aads)]
+
+    rows = {
+        'v1 CBC': (
+            per_record_us(cipher.encrypt, plaintexts),
+            per_record_us(cipher.decrypt, cbc),
+            sum(map(len, cbc)) / count,
+        ),
+        'v2 GCM': (
+            per_record_us(lambda item: cipher.encrypt(*item), list(zip(plaintexts, aads))),
+            per_record_us(lambda item: cipher.decrypt(*item), list(zip(gcm, aads))),
+            sum(map(len, gcm)) / count,
+        ),
+    }
+
+    print(f"\nplaintext {length} bytes, {count} records")
+    print(f"{'format':<10}{'encrypt us':>12}{'decrypt us':>12}{'stored bytes':>14}")
+    for name, (encrypt_us, decrypt_us, size) in rows.items():
+        print(f"{name:<10}{encrypt_us:>12.2f}{decrypt_us:>12.2f}{size:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Per-record latency and size of the CBC and AES-GCM record formats')
+    parser.add_argument('--count', type=int, default=20000)
+    parser.add_argument('--lengths', type=int, nargs='+', default=[16, 64, 256, 1024])
+    args = parser.parse_args()
+
+    for length in args.lengths:
+        run(length, args.count)
@@ -0,0 +1,239 @@
+# benchmarks/bench_suite.py
+# 以合成 vault 量測 LegacyModel 各項操作與 offscreen GUI 的延遲、吞吐量與記憶體，結果輸出成 JSON，
+# 並可與先前存下的 baseline 比較、標出退步的項目
+#
+#   python benchmarks/bench_suite.py --sizes 100 10000 100000 -o baseline.json
+#   python benchmarks/bench_suite.py --sizes 100 10000 --compare baseline.json
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'crypto_keeper'))
+
+from model.model import LegacyModel
+from model.schema import CATEGORIES, get_fields
+
+DEFAULT_THRESHOLD = 0.25
+# 低於此秒數的量測受雜訊影響太大，比較時不列為退步
+DEFAULT_NOISE_FLOOR = 0.001
+
+
+def make_vault(data_dir, size, storage):
+    # 依 Wallet/Exchange/Others 輪流分配，與 GUI 存入的分欄位紀錄相同格式
+    model = LegacyModel(data_dir=data_dir, storage=storage)
+    with model.batch():
+        for i in range(size):
+            category = CATEGORIES[i % len(CATEGORIES)]
+            fields = {field.key: f'{field.key}-{i}' for field in get_fields(category)}
+            model.store_fields(category, f'{category.lower()}-{i:06d}', fields, [('note', f'note {i}')])
+    model.close()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def latency_stats(prefix, samples):
+    samples = sorted(samples)
+    total = sum(samples)
+    return {
+        f'{prefix}_p50_s': samples[len(samples) // 2],
+        f'{prefix}_p95_s': samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+        f'{prefix}_per_s': len(samples) / total if total > 0 else 0.0,
+    }
+
+
+def peak_memory(func):
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def bench_model(data_dir, storage, ops, repeat):
+    results = {}
+    results['load_s'] = statistics.median(
+        timed(lambda: LegacyModel(data_dir=data_dir, storage=storage).close()) for _ in range(repeat)
+    )
+    results['load_peak_bytes'] = peak_memory(lambda: LegacyModel(data_dir=data_dir, storage=storage).close())
+
+    model = LegacyModel(data_dir=data_dir, storage=storage)
+    # 分片模式延遲載入，先讀進所有分類，讓 save_data 量到完整寫入
+    entries = [(category, identifier) for category, items in model.data.items() for identifier in items]
+    results['save_data_s'] = statistics.median(timed(model.save_data) for _ in range(repeat))
+
+    rng = random.Random(0)
+    targets = rng.sample(entries, min(ops, len(entries)))
+    results.update(latency_stats('decrypt_and_retrieve', [
+        timed(lambda: model.decrypt_and_retrieve(category, identifier)) for category, identifier in targets
+    ]))
+    results.update(latency_stats('encrypt_and_store', [
+        timed(lambda: model.encrypt_and_store('Others', f'bench-{i}', f'value-{i}')) for i in range(ops)
+    ]))
+    results.update(latency_stats('delete', [
+        timed(lambda: model.delete_data('Others', f'bench-{i}')) for i in range(ops)
+    ]))
+    results['ops_peak_bytes'] = peak_memory(
+        lambda: [model.decrypt_and_retrieve(category, identifier) for category, identifier in targets]
+    )
+    model.close()
+    return results
+
+
+def bench_gui(data_dir, storage, repeat):
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PySide6.QtWidgets import QApplication
+    from controller.controller import Controller
+    from view.mainwindow import Mainwindow
+
+    app = QApplication.instance() or QApplication([])
+    model = LegacyModel(data_dir=data_dir, storage=storage)
+    results = {}
+
+    def build():
+        view = Mainwindow(model)
+        Controller(model, view)
+        view.show()
+        app.processEvents()
+        return view
+
+    windows = []
+    results['window_construct_s'] = statistics.median(timed(lambda: windows.append(build())) for _ in range(repeat))
+    for view in windows[1:]:
+        model.remove_listener(view.on_model_changes)
+        view.close()
+    view = windows[0]
+
+    def switch_categories():
+        for index in range(view.category_combo.count()):
+            view.category_combo.setCurrentIndex(index)
+            app.processEvents()
+
+    results['category_switch_s'] = statistics.median(timed(switch_categories) for _ in range(repeat)) / view.category_combo.count()
+
+    # 最大分類的列表：重設 model 並讓 view 取完所有列
+    category = max(model.data, key=lambda name: len(model.data[name]), default=CATEGORIES[0])
+
+    def populate():
+        view.data_list_model.set_category(category, model.data.get(category, {}))
+        while view.data_list_model.canFetchMore():
+            view.data_list_model.fetchMore()
+        app.processEvents()
+
+    results['list_populate_s'] = statistics.median(timed(populate) for _ in range(repeat))
+    view.close()
+    model.close()
+    return results
+
+
+def run(args):
+    results = {}
+    for size in args.sizes:
+        for storage in args.storage:
+            data_dir = tempfile.mkdtemp(prefix='crypto-keeper-bench-')
+            try:
+                started = time.perf_counter()
+                make_vault(data_dir, size, storage)
+                print(f"size={size} storage={storage}: vault generated in {time.perf_counter() - started:.1f} s",
+                      file=sys.stderr)
+                prefix = f'size={size}/storage={storage}'
+                for name, value in bench_model(data_dir, storage, args.ops, args.repeat).items():
+                    results[f'{prefix}/model/{name}'] = value
+                if not args.skip_gui:
+                    for name, value in bench_gui(data_dir, storage, args.repeat).items():
+                        results[f'{prefix}/gui/{name}'] = value
+            finally:
+                shutil.rmtree(data_dir, ignore_errors=True)
+    return results
+
+
+def higher_is_better(name):
+    return name.endswith('_per_s')
+
+
+def below_noise(name, value, noise_floor):
+    if name.endswith('_per_s'):
+        return value > 1 / noise_floor
+    return name.endswith('_s') and value < noise_floor
+
+
+def compare(results, baseline, threshold, noise_floor=DEFAULT_NOISE_FLOOR):
+    # 回傳退步的項目；以相對變化判斷，吞吐量越高越好，其他（秒數、bytes）越低越好
+    regressions = []
+    print(f"{'metric':<64}{'baseline':>14}{'current':>14}{'change':>10}")
+    for name in sorted(results):
+        if name not in baseline:
+            continue
+        old, new = baseline[name], results[name]
+        if not old:
+            continue
+        change = (new - old) / old
+        worse = -change if higher_is_better(name) else change
+        noisy = below_noise(name, old, noise_floor) and below_noise(name, new, noise_floor)
+        flag = '  REGRESSION' if worse > threshold and not noisy else ''
+        print(f"{name:<64}{old:>14.6g}{new:>14.6g}{change:>+10.1%}{flag}")
+        if flag:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Crypto Keeper benchmark suite')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 10000, 100000])
+    parser.add_argument('--storage', nargs='+', choices=['json', 'journal', 'sharded'], default=['json'])
+    parser.add_argument('--ops', type=int, default=50, help='operations per latency measurement')
+    parser.add_argument('--repeat', type=int, default=3, help='repeats for load/save/GUI timings (median is kept)')
+    parser.add_argument('--skip-gui', action='store_true', help='do not load PySide6 or time the window')
+    parser.add_argument('-o', '--output', help='write results as JSON to this file')
+    parser.add_argument('--compare', metavar='BASELINE', help='compare against a JSON file written with --output')
+    parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help='relative change counted as a regression (default: 0.25)')
+    parser.add_argument('--noise-floor', type=float, default=DEFAULT_NOISE_FLOOR,
+                        help='ignore timings below this many seconds when flagging regressions (default: 0.001)')
+    args = parser.parse_args()
+
+    results = run(args)
+    report = {
+        'meta': {
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'sizes': args.sizes,
+            'storage': args.storage,
+            'ops': args.ops,
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4, sort_keys=True)
+    elif not args.compare:
+        json.dump(report, sys.stdout, indent=4, sort_keys=True)
+        sys.stdout.write('\n')
+
+    if args.compare:
+        with open(args.compare, 'r') as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.noise_floor)
+        if regressions:
+            print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
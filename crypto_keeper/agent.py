@@ -0,0 +1,335 @@
+# crypto_keeper/agent.py
+# 本機 secrets agent：載入 vault 一次後常駐，透過權限受限的 Unix domain socket 提供查詢
+#
+#   python cli.py agent                      # 啟動 agent
+#   python cli.py --profile client-a agent   # 另一個 vault 的 agent，client 以 AgentClient(profile='client-a') 連線
+#
+#   from agent import AgentClient
+#   with AgentClient() as client:
+#       client.get('Exchange', 'binance')
+#
+# 協定：每則訊息為 4 bytes big-endian 長度 + UTF-8 JSON。
+#   request:  {"op": "get", "category": "Exchange", "identifier": "binance"}（可加 "field" 只取單一欄位）
+#   response: {"ok": true, "value": "..."} 或 {"ok": false, "error": "not_found"}
+import asyncio
+import json
+import os
+import signal
+import socket
+import struct
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+from model.profiles import DEFAULT_PROFILE
+from model.storage import ShardedData
+
+HEADER = struct.Struct('>I')
+MAX_MESSAGE_SIZE = 16 * 1024 * 1024
+
+
+def default_socket_path(profile=None):
+    # 非預設的 profile 使用 agent-<profile>.sock
+    if os.environ.get('CRYPTO_KEEPER_AGENT_SOCK'):
+        return os.environ['CRYPTO_KEEPER_AGENT_SOCK']
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+    name = 'agent.sock' if profile in (None, DEFAULT_PROFILE) else f'agent-{profile}.sock'
+    return os.path.join(runtime_dir, f'crypto-keeper-{os.getuid()}', name)
+
+
+def encode_message(message):
+    payload = json.dumps(message, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+    return HEADER.pack(len(payload)) + payload
+
+
+class AgentError(RuntimeError):
+    pass
+
+
+class ReadWriteLock:
+    """asyncio lock shared by any number of readers or held by one writer.
+
+    A waiting writer keeps new readers out, so a steady stream of reads
+    cannot starve writes.
+    """
+
+    def __init__(self):
+        self.condition = asyncio.Condition()
+        self.readers = 0
+        self.writing = False
+        self.waiting_writers = 0
+
+    @asynccontextmanager
+    async def read(self):
+        async with self.condition:
+            await self.condition.wait_for(lambda: not self.writing and not self.waiting_writers)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.readers -= 1
+                self.condition.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self.condition:
+            self.waiting_writers += 1
+            try:
+                await self.condition.wait_for(lambda: not self.writing and not self.readers)
+            finally:
+                self.waiting_writers -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            async with self.condition:
+                self.writing = False
+                self.condition.notify_all()
+
+
+class VaultAgent:
+    def __init__(self, model, socket_path=None):
+        self.model = model
+        self.socket_path = socket_path or default_socket_path()
+        # 查詢持有 model_lock 的讀取鎖，可以同時進行；executor 中的寫入或重新載入改動 model.data 時
+        # 持有寫入鎖，查詢不會同時走訪它。碰到磁碟的工作在 vault_executor 執行，不卡住其他連線
+        self.model_lock = None
+        self.vault_executor = None
+        self.server = None
+
+    def run_in_vault(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.vault_executor, func, *args)
+
+    async def load_categories(self, categories):
+        # 分片模式下尚未載入的分類在 vault_executor 讀檔，不卡住 event loop
+        data = self.model.data
+        if not isinstance(data, ShardedData):
+            return
+        loaded = data.loaded()
+        missing = [category for category in categories if category in data and category not in loaded]
+        if missing:
+            await self.run_in_vault(lambda: [data[category] for category in missing])
+
+    async def handle_get(self, request):
+        category, identifier = request['category'], request['identifier']
+        await self.load_categories([category])
+        if identifier not in self.model.data.get(category, {}):
+            return {'ok': False, 'error': 'not_found'}
+        if request.get('field'):
+            value = self.model.get_field(category, identifier, request['field'])
+            if value is None:
+                return {'ok': False, 'error': 'field_not_found'}
+            return {'ok': True, 'value': value}
+        value = self.model.decrypt_and_retrieve(category, identifier)
+        if value is None:
+            return {'ok': False, 'error': 'decrypt_error'}
+        return {'ok': True, 'value': value}
+
+    async def handle_list(self, request):
+        category = request.get('category')
+        await self.load_categories([category] if category else list(self.model.data))
+        if category:
+            return {'ok': True, 'value': {category: sorted(self.model.data.get(category, {}))}}
+        return {'ok': True, 'value': {category: sorted(entries) for category, entries in self.model.data.items()}}
+
+    async def handle_write(self, request):
+        # 寫入會碰到磁碟，丟到 executor 執行
+        category, identifier = request['category'], request['identifier']
+        await self.load_categories([category])
+        if request['op'] == 'put':
+            await self.run_in_vault(self.model.encrypt_and_store, category, identifier, request['value'])
+        elif identifier in self.model.data.get(category, {}):
+            await self.run_in_vault(self.model.delete_data, category, identifier)
+        else:
+            return {'ok': False, 'error': 'not_found'}
+        return {'ok': True}
+
+    async def dispatch(self, request):
+        op = request.get('op')
+        if op == 'ping':
+            return {'ok': True}
+        if op == 'metrics':
+            from model import metrics
+            return {'ok': True, 'value': metrics.snapshot()}
+        if op not in ('get', 'list', 'put', 'delete', 'purge'):
+            return {'ok': False, 'error': f'unknown op: {op}'}
+        try:
+            if op == 'purge':
+                # 快取本身有鎖，不必等其他請求
+                self.model.purge_cache()
+                return {'ok': True}
+            # 只花一次 stat 檢查 vault 是否被 GUI 或其他程式改過；重新載入改動 model.data，在 executor 執行並持有寫入鎖
+            if self.model.is_stale():
+                async with self.model_lock.write():
+                    await self.run_in_vault(self.model.reload_if_changed)
+            if op == 'get':
+                async with self.model_lock.read():
+                    return await self.handle_get(request)
+            elif op == 'list':
+                async with self.model_lock.read():
+                    return await self.handle_list(request)
+            async with self.model_lock.write():
+                return await self.handle_write(request)
+        except KeyError as e:
+            return {'ok': False, 'error': f'missing field: {e}'}
+        except Exception as e:
+            # 讀寫失敗只回報給這個請求，連線與 agent 繼續運作
+            print(f"Agent request {op!r} failed: {e!r}", file=sys.stderr)
+            return {'ok': False, 'error': f'internal error: {e}'}
+
+    def peer_allowed(self, writer):
+        # Linux 上額外確認連線者與 agent 為同一使用者
+        sock = writer.get_extra_info('socket')
+        if sock is None or not hasattr(socket, 'SO_PEERCRED'):
+            return True
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+        _, uid, _ = struct.unpack('3i', creds)
+        return uid == os.getuid()
+
+    async def handle_client(self, reader, writer):
+        try:
+            if not self.peer_allowed(writer):
+                return
+            while True:
+                try:
+                    header = await reader.readexactly(HEADER.size)
+                except asyncio.IncompleteReadError:
+                    return
+                (length,) = HEADER.unpack(header)
+                if length > MAX_MESSAGE_SIZE:
+                    return
+                try:
+                    request = json.loads((await reader.readexactly(length)).decode('utf-8'))
+                    response = await self.dispatch(request)
+                except (ValueError, AttributeError) as e:
+                    response = {'ok': False, 'error': f'bad request: {e}'}
+                writer.write(encode_message(response))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        socket_dir = os.path.dirname(self.socket_path)
+        os.makedirs(socket_dir, mode=0o700, exist_ok=True)
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+
+        self.model_lock = ReadWriteLock()
+        self.vault_executor = ThreadPoolExecutor(1, thread_name_prefix='crypto-keeper-agent')
+        # 以 umask 確保 socket 建立時就只有擁有者可存取，之後再 chmod 一次
+        old_umask = os.umask(0o177)
+        try:
+            self.server = await asyncio.start_unix_server(self.handle_client, path=self.socket_path)
+        finally:
+            os.umask(old_umask)
+        os.chmod(self.socket_path, 0o600)
+
+    async def serve_forever(self):
+        await self.start()
+        # SIGINT / SIGTERM 時關閉 server 並移除 socket 檔
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            await stop.wait()
+        finally:
+            self.server.close()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+            async with self.model_lock.write():
+                await self.run_in_vault(self.model.close)
+            self.vault_executor.shutdown(wait=True)
+
+    def run(self):
+        asyncio.run(self.serve_forever())
+
+
+class AgentClient:
+    """Blocking client for :class:`VaultAgent`; one connection is reused for every call."""
+
+    def __init__(self, socket_path=None, timeout=5.0, profile=None):
+        self.socket_path = socket_path or default_socket_path(profile)
+        self.timeout = timeout
+        self.sock = None
+
+    def connect(self):
+        if self.sock is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.settimeout(self.timeout)
+            self.sock.connect(self.socket_path)
+        return self.sock
+
+    def recv_exactly(self, size):
+        chunks = []
+        while size:
+            chunk = self.sock.recv(size)
+            if not chunk:
+                raise AgentError('agent closed the connection')
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def request(self, op, **fields):
+        sock = self.connect()
+        try:
+            sock.sendall(encode_message(dict(fields, op=op)))
+            (length,) = HEADER.unpack(self.recv_exactly(HEADER.size))
+            return json.loads(self.recv_exactly(length).decode('utf-8'))
+        except (OSError, AgentError):
+            self.close()
+            raise
+
+    def get(self, category, identifier, field=None):
+        if field is not None:
+            response = self.request('get', category=category, identifier=identifier, field=field)
+        else:
+            response = self.request('get', category=category, identifier=identifier)
+        if response['ok']:
+            return response['value']
+        if response['error'] in ('not_found', 'field_not_found'):
+            return None
+        raise AgentError(response['error'])
+
+    def list(self, category=None):
+        response = self.request('list', category=category)
+        if not response['ok']:
+            raise AgentError(response['error'])
+        return response['value']
+
+    def put(self, category, identifier, value):
+        response = self.request('put', category=category, identifier=identifier, value=value)
+        if not response['ok']:
+            raise AgentError(response['error'])
+
+    def delete(self, category, identifier):
+        response = self.request('delete', category=category, identifier=identifier)
+        if not response['ok'] and response['error'] != 'not_found':
+            raise AgentError(response['error'])
+        return response['ok']
+
+    def purge(self):
+        # 請 agent 清除快取中的明文（例如螢幕鎖定時）
+        return self.request('purge')['ok']
+
+    def ping(self):
+        return self.request('ping')['ok']
+
+    def metrics(self):
+        # agent 行程內收集的計時與計數（需以 --metrics-file 或 CRYPTO_KEEPER_METRICS 啟用）
+        return self.request('metrics')['value']
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
@@ -0,0 +1,700 @@
+# crypto_keeper/cli.py
+# 無介面的命令列入口，給伺服器與交易機器人使用；不會載入 PySide6
+#
+#   python cli.py get Exchange binance
+#   echo -n 'secret' | python cli.py put Others api-key
+#   python cli.py list --json
+#   python cli.py import accounts.csv --category Exchange
+#   python cli.py export --archive -o vault.ckarchive
+#   python cli.py backup create && python cli.py backup prune --keep-hourly 24 --keep-daily 30
+#   python cli.py --profile client-a list
+#   python cli.py attachment add Exchange binance kyc.pdf && python cli.py attachment get Exchange binance kyc.pdf -o kyc.pdf
+import argparse
+import datetime
+import getpass
+import json
+import os
+import sys
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+if current_dir not in sys.path:
+    sys.path.insert(0, current_dir)
+
+from model.model import LegacyModel, get_app_dir
+from model.profiles import DEFAULT_PROFILE, list_profiles, profile_dir, validate_name
+from model.kdf import PassphraseError
+from model import metrics
+
+EXIT_NOT_FOUND = 1
+EXIT_DECRYPT_ERROR = 3
+EXIT_EXISTS = 4
+EXIT_PASSPHRASE = 5
+# 讀寫檔案失敗（磁碟已滿、權限不足、找不到輸入檔）；寫入 vault 失敗時 vault 維持原狀
+EXIT_IO_ERROR = 6
+
+
+def open_model(args):
+    # passphrase 由 $CRYPTO_KEEPER_PASSPHRASE 提供；未設定且在終端機上時才互動詢問
+    # 使用過的 passphrase 留在 args.passphrase，給需要再次用到的子命令
+    args.passphrase = os.environ.get('CRYPTO_KEEPER_PASSPHRASE')
+    try:
+        return LegacyModel(storage=args.storage, data_dir=vault_dir(args), passphrase=args.passphrase)
+    except PassphraseError:
+        if args.passphrase is not None or not sys.stdin.isatty():
+            raise
+    args.passphrase = getpass.getpass('Passphrase: ')
+    return LegacyModel(storage=args.storage, data_dir=vault_dir(args), passphrase=args.passphrase)
+
+
+def read_new_passphrase():
+    passphrase = os.environ.get('CRYPTO_KEEPER_NEW_PASSPHRASE')
+    if passphrase is not None:
+        return passphrase
+    passphrase = getpass.getpass('New passphrase: ')
+    if getpass.getpass('Repeat new passphrase: ') != passphrase:
+        raise PassphraseError("Passphrases do not match")
+    return passphrase
+
+
+def read_archive_passphrase(confirm):
+    # 封存檔的 passphrase 與 vault 的分開，由 $CRYPTO_KEEPER_ARCHIVE_PASSPHRASE 提供或互動詢問
+    passphrase = os.environ.get('CRYPTO_KEEPER_ARCHIVE_PASSPHRASE')
+    if passphrase is not None:
+        return passphrase
+    if not sys.stdin.isatty():
+        raise PassphraseError("Set CRYPTO_KEEPER_ARCHIVE_PASSPHRASE for the archive passphrase")
+    passphrase = getpass.getpass('Archive passphrase: ')
+    if confirm and getpass.getpass('Repeat archive passphrase: ') != passphrase:
+        raise PassphraseError("Passphrases do not match")
+    if not passphrase:
+        raise PassphraseError("Passphrase must not be empty")
+    return passphrase
+
+
+def profile_name(value):
+    try:
+        return validate_name(value)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def write_json(obj):
+    json.dump(obj, sys.stdout, ensure_ascii=False)
+    sys.stdout.write('\n')
+
+
+def cmd_get(args):
+    model = open_model(args)
+    if args.identifier not in model.data.get(args.category, {}):
+        print(f"Not found: {args.category}/{args.identifier}", file=sys.stderr)
+        return EXIT_NOT_FOUND
+
+    if args.field:
+        # 只解密這一個欄位
+        value = model.get_field(args.category, args.identifier, args.field)
+        if value is None:
+            print(f"No field '{args.field}' in {args.category}/{args.identifier}", file=sys.stderr)
+            return EXIT_NOT_FOUND
+    else:
+        value = model.decrypt_and_retrieve(args.category, args.identifier)
+        if value is None:
+            return EXIT_DECRYPT_ERROR
+
+    if args.json:
+        output = {'category': args.category, 'identifier': args.identifier, 'value': value}
+        if args.field:
+            output['field'] = args.field
+        write_json(output)
+    else:
+        sys.stdout.write(value)
+        if sys.stdout.isatty():
+            sys.stdout.write('\n')
+    return 0
+
+
+def cmd_put(args):
+    # 未給 value 時從 stdin 讀取，避免明文出現在 process list 與 shell history
+    value = args.value if args.value is not None else sys.stdin.read()
+    if args.value is None and value.endswith('\n'):
+        value = value[:-1]
+
+    model = open_model(args)
+    if args.identifier in model.data.get(args.category, {}) and not args.force:
+        print(f"Already exists: {args.category}/{args.identifier} (use --force to overwrite)", file=sys.stderr)
+        return EXIT_EXISTS
+    model.encrypt_and_store(args.category, args.identifier, value)
+    model.close()
+    return 0
+
+
+def cmd_list(args):
+    model = open_model(args)
+    if args.category:
+        listing = {args.category: sorted(model.data.get(args.category, {}))}
+    else:
+        listing = {category: sorted(entries) for category, entries in model.data.items()}
+
+    if args.json:
+        write_json(listing)
+    else:
+        for category, identifiers in listing.items():
+            for identifier in identifiers:
+                print(f"{category}\t{identifier}")
+    return 0
+
+
+def cmd_delete(args):
+    model = open_model(args)
+    if args.identifier not in model.data.get(args.category, {}):
+        print(f"Not found: {args.category}/{args.identifier}", file=sys.stderr)
+        return EXIT_NOT_FOUND
+    model.delete_data(args.category, args.identifier)
+    model.close()
+    return 0
+
+
+def cmd_export(args):
+    model = open_model(args)
+    if args.archive:
+        return export_archive(args, model)
+    output = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        if args.decrypt:
+            # 每行一筆 JSON，解密失敗的項目 value 為 null
+            entries = None
+            if args.category:
+                entries = ((args.category, identifier) for identifier in model.data.get(args.category, {}))
+            for category, identifier, value in model.decrypt_many(entries):
+                json.dump({'category': category, 'identifier': identifier, 'value': value}, output, ensure_ascii=False)
+                output.write('\n')
+        else:
+            # 與 legacy_data.json 相同格式的加密快照
+            if args.category:
+                data = {args.category: model.data.get(args.category, {})}
+            else:
+                data = dict(model.data.items())
+            json.dump(data, output, indent=4, sort_keys=True)
+            output.write('\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    return 0
+
+
+def export_archive(args, model):
+    from model import transfer
+
+    passphrase = read_archive_passphrase(confirm=True)
+    entries = None
+    if args.category:
+        entries = ((args.category, identifier) for identifier in model.data.get(args.category, {}))
+    output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+    failed = 0
+    try:
+        with transfer.ArchiveWriter(output, passphrase) as archive:
+            for item in model.export_records(entries, workers=args.workers, use_processes=args.processes):
+                if item.get('value', '') is None:
+                    failed += 1
+                    continue
+                archive.write(item)
+    finally:
+        if output is not sys.stdout.buffer:
+            output.close()
+    print(f"Exported {archive.count} entries", file=sys.stderr)
+    if failed:
+        print(f"Skipped {failed} entries that could not be decrypted", file=sys.stderr)
+        return EXIT_DECRYPT_ERROR
+    return 0
+
+
+def cmd_import(args):
+    from model import transfer
+
+    mapping = {}
+    for item in args.map:
+        column, _, field = item.partition('=')
+        if not field:
+            print(f"Invalid --map {item!r}, expected COLUMN=FIELD", file=sys.stderr)
+            return 2
+        mapping[column] = field
+
+    import_format = args.format
+    if import_format is None:
+        extension = os.path.splitext(args.file)[1].lower()
+        import_format = {'.csv': 'csv', transfer.ARCHIVE_SUFFIX: 'archive'}.get(extension, 'jsonl')
+
+    model = open_model(args)
+    if import_format == 'archive':
+        passphrase = read_archive_passphrase(confirm=False)
+        source = sys.stdin.buffer if args.file == '-' else open(args.file, 'rb')
+        records = transfer.read_archive(source, passphrase)
+    else:
+        # newline='' 讓 csv 模組自行處理欄位中的換行
+        source = sys.stdin if args.file == '-' else open(args.file, 'r', encoding='utf-8-sig', newline='')
+        reader = transfer.read_csv if import_format == 'csv' else transfer.read_jsonl
+        records = reader(source, args.category, mapping)
+
+    try:
+        counts = model.import_records(records, overwrite=args.force, workers=args.workers,
+                                      use_processes=args.processes)
+    except PassphraseError:
+        raise
+    except (ValueError, KeyError) as e:
+        # 任何一筆失敗時整批回滾，vault 不會只匯入一半
+        print(f"Import failed, nothing was imported: {e}", file=sys.stderr)
+        return 2
+    finally:
+        if source not in (sys.stdin, sys.stdin.buffer):
+            source.close()
+    model.close()
+    skipped = f", skipped {counts['skipped']} existing (use --force to overwrite)" if counts['skipped'] else ''
+    if counts['duplicates']:
+        skipped += f", skipped {counts['duplicates']} repeated identifiers"
+    print(f"Imported {counts['imported']} entries{skipped}", file=sys.stderr)
+    return 0
+
+
+def cmd_migrate_fields(args):
+    model = open_model(args)
+    migrated = model.migrate_field_records()
+    model.close()
+    print(f"Migrated {migrated} entries to per-field records", file=sys.stderr)
+    return 0
+
+
+def base_dir(args):
+    return args.data_dir or os.path.join(get_app_dir(), 'CryptoKeeperData')
+
+
+def vault_dir(args):
+    # --profile 的 vault 在 --data-dir（或預設 CryptoKeeperData）下的 profiles/<name>/
+    return profile_dir(args.profile, base_dir(args))
+
+
+def open_backups(args):
+    from model.backup import BackupRepository
+    return BackupRepository(args.dir or os.path.join(vault_dir(args), 'backups'))
+
+
+def format_time(timestamp):
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+def cmd_backup_create(args):
+    # 只讀取密文與金鑰檔，不需要 passphrase，適合排程執行
+    repository = open_backups(args)
+    started = time.perf_counter()
+    snapshot = repository.backup(vault_dir(args))
+    added = snapshot['added']
+    print(f"Snapshot {snapshot['id']}: {snapshot['entries']} entries, {added['objects']} new objects "
+          f"({added['bytes'] / 1024:.1f} KiB) in {time.perf_counter() - started:.2f} s", file=sys.stderr)
+    return 0
+
+
+def cmd_backup_list(args):
+    snapshots = open_backups(args).list_snapshots()
+    if args.json:
+        write_json([{key: snapshot[key] for key in ('id', 'created', 'parent', 'storage', 'entries', 'added')}
+                    for snapshot in snapshots])
+    else:
+        for snapshot in snapshots:
+            print(f"{snapshot['id']}\t{format_time(snapshot['created'])}\t{snapshot['entries']} entries\t"
+                  f"+{snapshot['added']['objects']} objects")
+    return 0
+
+
+def cmd_backup_restore(args):
+    repository = open_backups(args)
+    repository.check_exists()
+    at = None
+    if args.at:
+        try:
+            at = datetime.datetime.fromisoformat(args.at).timestamp()
+        except ValueError:
+            print(f"Invalid --at {args.at!r}, expected a time such as 2024-05-01T12:00", file=sys.stderr)
+            return 2
+    snapshot = repository.find_snapshot(args.snapshot, at=at)
+    if snapshot is None:
+        print(f"No snapshot matches {args.snapshot or args.at or 'latest'}", file=sys.stderr)
+        return EXIT_NOT_FOUND
+    storage = args.storage if args.storage != 'auto' else None
+    try:
+        count = repository.restore(snapshot, args.to, storage=storage, overwrite=args.force, key_file=args.key_file)
+    except FileExistsError as e:
+        print(f"{e} (use --force to move it aside)", file=sys.stderr)
+        return EXIT_EXISTS
+    print(f"Restored snapshot {snapshot['id']} ({format_time(snapshot['created'])}, {count} entries) to {args.to}",
+          file=sys.stderr)
+    return 0
+
+
+def cmd_backup_prune(args):
+    policy = {'last': args.keep_last, 'hourly': args.keep_hourly, 'daily': args.keep_daily,
+              'weekly': args.keep_weekly, 'monthly': args.keep_monthly, 'yearly': args.keep_yearly}
+    stats = open_backups(args).prune(policy, dry_run=args.dry_run)
+    for snapshot_id in stats['forgotten']:
+        print(f"{'would remove' if args.dry_run else 'removed'}\t{snapshot_id}")
+    if not args.dry_run:
+        print(f"Kept {stats['kept']} snapshots, deleted {stats['deleted_packs']} packs, repacked {stats['repacked']}, "
+              f"freed {stats['freed_bytes'] / 1024:.1f} KiB", file=sys.stderr)
+    return 0
+
+
+def cmd_backup(args):
+    from model.backup import BackupError
+
+    try:
+        return args.backup_func(args)
+    except BackupError as e:
+        print(e, file=sys.stderr)
+        return 2
+
+
+def require_entry(model, args):
+    if args.identifier not in model.data.get(args.category, {}):
+        raise KeyError(f"Not found: {args.category}/{args.identifier}")
+
+
+def cmd_attachment_add(args):
+    if args.file == '-' and not args.name:
+        print("--name is required when reading the attachment from stdin", file=sys.stderr)
+        return 2
+    model = open_model(args)
+    source = sys.stdin.buffer if args.file == '-' else args.file
+    try:
+        added = model.add_attachment(args.category, args.identifier, source, name=args.name)
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        return 2
+    finally:
+        model.close()
+    print(f"Attached {added['name']} ({added['size']} bytes) to {args.category}/{args.identifier}", file=sys.stderr)
+    return 0
+
+
+def cmd_attachment_list(args):
+    model = open_model(args)
+    require_entry(model, args)
+    attachments = model.list_attachments(args.category, args.identifier)
+    if args.json:
+        write_json(attachments)
+    else:
+        for item in attachments:
+            print(f"{item['name']}\t{item['size']}")
+    return 0
+
+
+def cmd_attachment_get(args):
+    # --offset/--length 只解密涵蓋該範圍的段落
+    model = open_model(args)
+    require_entry(model, args)
+    with model.open_attachment(args.category, args.identifier, args.name) as reader:
+        reader.seek(args.offset)
+        remaining = reader.size - args.offset if args.length is None else args.length
+        output = open(args.output, 'wb') if args.output else sys.stdout.buffer
+        try:
+            while remaining > 0:
+                data = reader.read(min(remaining, 1024 * 1024))
+                if not data:
+                    break
+                output.write(data)
+                remaining -= len(data)
+        finally:
+            if args.output:
+                output.close()
+    return 0
+
+
+def cmd_attachment_remove(args):
+    model = open_model(args)
+    require_entry(model, args)
+    model.remove_attachment(args.category, args.identifier, args.name)
+    model.close()
+    return 0
+
+
+def cmd_attachment_gc(args):
+    model = open_model(args)
+    removed = model.collect_attachments(grace=args.grace)
+    model.close()
+    print(f"Removed {removed} unreferenced attachment files", file=sys.stderr)
+    return 0
+
+
+def cmd_attachment(args):
+    try:
+        return args.attachment_func(args)
+    except KeyError as e:
+        print(e.args[0], file=sys.stderr)
+        return EXIT_NOT_FOUND
+    except ValueError as e:
+        # 附件或紀錄驗證失敗
+        print(e, file=sys.stderr)
+        return EXIT_DECRYPT_ERROR
+
+
+def cmd_profiles(args):
+    profiles = list_profiles(base_dir(args))
+    if args.json:
+        write_json([{'name': name, 'path': profile_dir(name, base_dir(args))} for name in profiles])
+    else:
+        for name in profiles:
+            print(f"{name}\t{profile_dir(name, base_dir(args))}")
+    return 0
+
+
+def cmd_agent(args):
+    # 延後匯入，其他子命令不需要載入 asyncio
+    from agent import VaultAgent, default_socket_path
+    from model.cache import DecryptCache
+
+    model = open_model(args)
+    if args.cache_ttl > 0:
+        model.cache = DecryptCache(max_entries=args.cache_entries, ttl=args.cache_ttl)
+    # 每個 profile 有自己的預設 socket，可以同時執行多個 agent
+    agent = VaultAgent(model, args.socket or default_socket_path(args.profile))
+    print(f"Crypto Keeper agent listening on {agent.socket_path}", file=sys.stderr)
+    agent.run()
+    return 0
+
+
+def cmd_set_passphrase(args):
+    model = open_model(args)
+    passphrase = read_new_passphrase()
+    if not passphrase:
+        raise PassphraseError("Passphrase must not be empty")
+    params = model.set_passphrase(passphrase, target_seconds=args.target_ms / 1000)
+    print(f"Vault key wrapped with scrypt n={params['n']} r={params['r']} p={params['p']} "
+          f"(~{params['seconds'] * 1000:.0f} ms per unlock)", file=sys.stderr)
+    return 0
+
+
+def cmd_rotate_key(args):
+    model = open_model(args)
+
+    def progress(done, total):
+        print(f"\r{done}/{total} entries re-encrypted", end='', file=sys.stderr, flush=True)
+
+    stats = model.rotate_key(
+        passphrase=args.passphrase,
+        workers=args.workers,
+        use_processes=args.processes,
+        progress=progress if sys.stderr.isatty() else None,
+    )
+    if sys.stderr.isatty():
+        print(file=sys.stderr)
+    resumed = f" ({stats['resumed']} from a previous run)" if stats['resumed'] else ''
+    print(f"Rotated {stats['entries']} entries{resumed} in {stats['seconds']:.2f} s "
+          f"({stats['per_second']:.0f} entries/s)", file=sys.stderr)
+    return 0
+
+
+def cmd_unlock_benchmark(args):
+    from model import kdf
+
+    print(f"Calibrating scrypt for {args.target_ms} ms on this machine:")
+    params = kdf.calibrate(args.target_ms / 1000, verbose=True)
+    print(f"recommended: n={params['n']} r={params['r']} p={params['p']}")
+
+    model = open_model(args)
+    if not model.uses_passphrase():
+        print("This vault is not protected by a passphrase (see set-passphrase)")
+        return 0
+    header = kdf.load_header(model.header_file)
+    timings = kdf.benchmark_unlock(header, args.passphrase, rounds=args.rounds)
+    print(f"current vault (n={header['n']} r={header['r']} p={header['p']}): "
+          + ', '.join(f"{t * 1000:.0f} ms" for t in timings))
+    return 0
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog='crypto-keeper', description='Headless access to the Crypto Keeper vault')
+    parser.add_argument('--data-dir', default=os.environ.get('CRYPTO_KEEPER_DATA_DIR'),
+                        help='vault directory (default: CryptoKeeperData next to the app, or $CRYPTO_KEEPER_DATA_DIR)')
+    parser.add_argument('--profile', type=profile_name, default=os.environ.get('CRYPTO_KEEPER_PROFILE') or DEFAULT_PROFILE,
+                        help="named vault under the data directory's profiles/ folder, created on first use "
+                             "(default: $CRYPTO_KEEPER_PROFILE or the main vault)")
+    parser.add_argument('--storage', choices=['auto', 'json', 'journal', 'sharded'],
+                        default=os.environ.get('CRYPTO_KEEPER_STORAGE', 'auto'),
+                        help="storage layout; 'sharded' migrates a single-file vault on first use (default: auto-detect)")
+    parser.add_argument('--metrics-file', default=os.environ.get('CRYPTO_KEEPER_METRICS_FILE'),
+                        help='collect timings and write them here on exit (.json for JSON, otherwise a Prometheus textfile)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    get_parser = subparsers.add_parser('get', help='print a decrypted value')
+    get_parser.add_argument('category')
+    get_parser.add_argument('identifier')
+    get_parser.add_argument('--field', help='print only this field (a default field key such as exchange_password, or a custom field name)')
+    get_parser.add_argument('--json', action='store_true', help='print a JSON object instead of the raw value')
+    get_parser.set_defaults(func=cmd_get)
+
+    put_parser = subparsers.add_parser('put', help='encrypt and store a value (read from stdin if omitted)')
+    put_parser.add_argument('category')
+    put_parser.add_argument('identifier')
+    put_parser.add_argument('value', nargs='?')
+    put_parser.add_argument('--force', action='store_true', help='overwrite an existing entry')
+    put_parser.set_defaults(func=cmd_put)
+
+    list_parser = subparsers.add_parser('list', help='list identifiers')
+    list_parser.add_argument('category', nargs='?')
+    list_parser.add_argument('--json', action='store_true')
+    list_parser.set_defaults(func=cmd_list)
+
+    delete_parser = subparsers.add_parser('delete', help='delete an entry')
+    delete_parser.add_argument('category')
+    delete_parser.add_argument('identifier')
+    delete_parser.set_defaults(func=cmd_delete)
+
+    export_parser = subparsers.add_parser('export', help='export the vault as JSON or as a portable encrypted archive')
+    export_parser.add_argument('category', nargs='?')
+    export_parser.add_argument('--decrypt', action='store_true', help='emit decrypted JSON lines instead of the encrypted snapshot')
+    export_parser.add_argument('--archive', action='store_true',
+                               help='write an archive encrypted with its own passphrase ($CRYPTO_KEEPER_ARCHIVE_PASSPHRASE) '
+                                    'that any vault can import')
+    export_parser.add_argument('--workers', type=int,
+                               help='decryption worker threads for --archive of large vaults (default: one per CPU)')
+    export_parser.add_argument('--processes', action='store_true', help='use worker processes instead of threads')
+    export_parser.add_argument('-o', '--output')
+    export_parser.set_defaults(func=cmd_export)
+
+    import_parser = subparsers.add_parser(
+        'import', help='import entries from CSV, JSON lines or an archive written by export --archive')
+    import_parser.add_argument('file', help="input file, or '-' for stdin")
+    import_parser.add_argument('--format', choices=['csv', 'jsonl', 'archive'],
+                               help='input format (default: from the file extension)')
+    import_parser.add_argument('--category', help='category for rows without a category column')
+    import_parser.add_argument('--map', action='append', default=[], metavar='COLUMN=FIELD',
+                               help='read COLUMN into FIELD (a field key such as exchange_password, or identifier); repeatable')
+    import_parser.add_argument('--force', action='store_true', help='overwrite existing entries')
+    import_parser.add_argument('--workers', type=int, help='encryption worker threads for large imports (default: one per CPU)')
+    import_parser.add_argument('--processes', action='store_true', help='use worker processes instead of threads')
+    import_parser.set_defaults(func=cmd_import)
+
+    migrate_parser = subparsers.add_parser(
+        'migrate-fields', help='convert entries saved in the old comma-separated format to per-field records')
+    migrate_parser.set_defaults(func=cmd_migrate_fields)
+
+    backup_parser = subparsers.add_parser(
+        'backup', help='incremental backups of the vault folder: create, list, restore, prune')
+    backup_parser.set_defaults(func=cmd_backup)
+    backup_options = argparse.ArgumentParser(add_help=False)
+    backup_options.add_argument('--dir', default=os.environ.get('CRYPTO_KEEPER_BACKUP_DIR'),
+                                help='backup folder (default: $CRYPTO_KEEPER_BACKUP_DIR or CryptoKeeperData/backups)')
+    backup_subparsers = backup_parser.add_subparsers(dest='backup_command', required=True)
+
+    create_parser = backup_subparsers.add_parser(
+        'create', parents=[backup_options], help='record a snapshot; only changed entries are written')
+    create_parser.set_defaults(backup_func=cmd_backup_create)
+
+    backups_list_parser = backup_subparsers.add_parser('list', parents=[backup_options], help='list snapshots')
+    backups_list_parser.add_argument('--json', action='store_true')
+    backups_list_parser.set_defaults(backup_func=cmd_backup_list)
+
+    restore_parser = backup_subparsers.add_parser(
+        'restore', parents=[backup_options], help='write a snapshot out as a complete vault folder')
+    restore_parser.add_argument('snapshot', nargs='?', help="snapshot id or unique prefix (default: latest)")
+    restore_parser.add_argument('--at', help='restore the newest snapshot taken at or before this local time (ISO 8601)')
+    restore_parser.add_argument('--to', required=True, help='target vault folder')
+    restore_parser.add_argument('--force', action='store_true',
+                                help='replace an existing vault; its files are moved to pre-restore-<snapshot>/')
+    restore_parser.add_argument('--key-file',
+                                help="the vault's key.txt, which backups do not contain (default: key.txt in --to)")
+    restore_parser.set_defaults(backup_func=cmd_backup_restore)
+
+    prune_parser = backup_subparsers.add_parser(
+        'prune', parents=[backup_options], help='remove snapshots outside the retention policy and reclaim space')
+    for period in ('last', 'hourly', 'daily', 'weekly', 'monthly', 'yearly'):
+        prune_parser.add_argument(f'--keep-{period}', type=int, default=0, metavar='N')
+    prune_parser.add_argument('--dry-run', action='store_true', help='only list the snapshots that would be removed')
+    prune_parser.set_defaults(backup_func=cmd_backup_prune)
+
+    profiles_parser = subparsers.add_parser('profiles', help='list the named vaults')
+    profiles_parser.add_argument('--json', action='store_true')
+    profiles_parser.set_defaults(func=cmd_profiles)
+
+    attachment_parser = subparsers.add_parser(
+        'attachment', help='files attached to an entry, encrypted in chunks: add, list, get, remove, gc')
+    attachment_parser.set_defaults(func=cmd_attachment)
+    attachment_subparsers = attachment_parser.add_subparsers(dest='attachment_command', required=True)
+
+    attach_parser = attachment_subparsers.add_parser('add', help='encrypt a file and attach it to an entry')
+    attach_parser.add_argument('category')
+    attach_parser.add_argument('identifier')
+    attach_parser.add_argument('file', help="file to attach, or '-' for stdin")
+    attach_parser.add_argument('--name', help='attachment name (default: the file name); replaces an attachment of that name')
+    attach_parser.set_defaults(attachment_func=cmd_attachment_add)
+
+    attachments_list_parser = attachment_subparsers.add_parser('list', help="list an entry's attachments")
+    attachments_list_parser.add_argument('category')
+    attachments_list_parser.add_argument('identifier')
+    attachments_list_parser.add_argument('--json', action='store_true')
+    attachments_list_parser.set_defaults(attachment_func=cmd_attachment_list)
+
+    extract_parser = attachment_subparsers.add_parser('get', help='write the decrypted attachment (or a byte range of it)')
+    extract_parser.add_argument('category')
+    extract_parser.add_argument('identifier')
+    extract_parser.add_argument('name')
+    extract_parser.add_argument('-o', '--output', help='output file (default: stdout)')
+    extract_parser.add_argument('--offset', type=int, default=0, help='first byte to write')
+    extract_parser.add_argument('--length', type=int, help='number of bytes to write (default: to the end)')
+    extract_parser.set_defaults(attachment_func=cmd_attachment_get)
+
+    detach_parser = attachment_subparsers.add_parser('remove', help='remove an attachment and delete its file')
+    detach_parser.add_argument('category')
+    detach_parser.add_argument('identifier')
+    detach_parser.add_argument('name')
+    detach_parser.set_defaults(attachment_func=cmd_attachment_remove)
+
+    gc_parser = attachment_subparsers.add_parser(
+        'gc', help='delete attachment files no entry refers to, for example after an interrupted add')
+    gc_parser.add_argument('--grace', type=float, default=3600,
+                           help='keep unreferenced files younger than this many seconds (default: 3600)')
+    gc_parser.set_defaults(attachment_func=cmd_attachment_gc)
+
+    agent_parser = subparsers.add_parser('agent', help='serve the vault to local clients over a Unix socket')
+    agent_parser.add_argument('--socket', help='socket path (default: $CRYPTO_KEEPER_AGENT_SOCK or a per-user runtime dir)')
+    agent_parser.add_argument('--cache-ttl', type=float, default=0,
+                              help='keep decrypted values in memory for this many seconds (default: disabled)')
+    agent_parser.add_argument('--cache-entries', type=int, default=1024)
+    agent_parser.set_defaults(func=cmd_agent)
+
+    set_passphrase_parser = subparsers.add_parser(
+        'set-passphrase', help='protect the vault key with a passphrase (or change it); reads $CRYPTO_KEEPER_NEW_PASSPHRASE')
+    set_passphrase_parser.add_argument('--target-ms', type=int, default=500,
+                                       help='calibrate the KDF cost to roughly this unlock time (default: 500)')
+    set_passphrase_parser.set_defaults(func=cmd_set_passphrase)
+
+    rotate_parser = subparsers.add_parser(
+        'rotate-key', help='re-encrypt every entry under a new key; rerun to resume after an interruption')
+    rotate_parser.add_argument('--workers', type=int, help='worker threads for large vaults (default: one per CPU)')
+    rotate_parser.add_argument('--processes', action='store_true', help='use worker processes instead of threads')
+    rotate_parser.set_defaults(func=cmd_rotate_key)
+
+    benchmark_parser = subparsers.add_parser('unlock-benchmark', help='measure KDF cost and unlock time on this machine')
+    benchmark_parser.add_argument('--target-ms', type=int, default=500)
+    benchmark_parser.add_argument('--rounds', type=int, default=3)
+    benchmark_parser.set_defaults(func=cmd_unlock_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.metrics_file:
+        metrics.enable()
+    try:
+        return args.func(args)
+    except PassphraseError as e:
+        print(e, file=sys.stderr)
+        return EXIT_PASSPHRASE
+    except OSError as e:
+        print(e, file=sys.stderr)
+        return EXIT_IO_ERROR
+    finally:
+        if args.metrics_file:
+            metrics.write_file(args.metrics_file)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
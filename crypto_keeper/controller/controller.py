@@ -1,123 +1,234 @@
 # crypto_keeper/controller/controller.py
-from PySide6.QtWidgets import QMessageBox
+import gc
+import os
+import sys
+
+from PySide6.QtWidgets import QFileDialog, QInputDialog, QLineEdit, QMessageBox
+from PySide6.QtCore import QTimer
+from model.schema import get_fields
+from model.profiles import validate_name
+from model.search import IdentifierIndex
+from model import metrics
+from controller.worker import VaultWorker
+from controller.watcher import VaultWatcher
+
+# 多久檢查一次閒置的 vault
+IDLE_CHECK_MS = 60 * 1000
+
 
 class Controller:
-    def __init__(self, model, view):
+    def __init__(self, model, view, worker=None, vaults=None):
         self.model = model
         self.view = view
+        # vaults: model/profiles.py 的 VaultManager；只在背景執行緒呼叫
+        self.vaults = vaults
+        self.vault_name = None
+        # vault 的讀寫與加解密在背景執行緒執行，UI 執行緒只負責表單
+        self.worker = worker if worker is not None else VaultWorker(view)
+        # 畫面上列出附件的項目 (category, identifier)
+        self.attachment_entry = None
+        # 其他程式寫入 vault 時重新載入
+        self.watcher = VaultWatcher(model, self.worker, view) if model is not None else None
         self.connect_signals()
+        if model is not None:
+            self.index_vault(model)
+        if vaults is not None:
+            self.idle_timer = QTimer(view)
+            self.idle_timer.setInterval(IDLE_CHECK_MS)
+            self.idle_timer.timeout.connect(lambda: self.worker.submit(self.vaults.evict_idle))
+            self.idle_timer.start()
+
+    def set_model(self, model):
+        # vault 在背景載入完成或切換 vault 後呼叫
+        if self.watcher is not None:
+            self.watcher.stop()
+        self.model = model
+        self.view.set_model(model)
+        self.index_vault(model)
+        self.watcher = VaultWatcher(model, self.worker, self.view)
+        # 切換回仍開著的 vault 時，補上它不在畫面上時其他程式寫入的變更
+        self.watcher.check()
+
+    def index_vault(self, model):
+        # 搜尋索引在背景執行緒建立，輸入查詢時不必掃描整個 vault；完成前畫面顯示 Indexing...
+        self.worker.submit(
+            self.build_search_index, model,
+            on_done=lambda index: self.view.set_search_index(model, index),
+            on_error=lambda error: print(f"Failed to index the vault: {error}", file=sys.stderr),
+        )
+
+    def build_search_index(self, model):
+        # 在背景執行緒執行。建立時配置數百萬個 set，暫停 gc 避免建立期間反覆掃描它們；
+        # 建好後在這裡做一次完整回收，不讓它落在之後的某次按鍵上
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            index = IdentifierIndex(model, listen=False).build()
+        finally:
+            if enabled:
+                gc.enable()
+        gc.collect()
+        return index
+
+    # ---- vault（profile）----
+    def open_vault(self, name, passphrase=None, on_open=None, on_cancel=None, on_fail=None):
+        """Open the vault ``name`` through the vault manager and show it.
+
+        The vault is loaded on the worker thread; a passphrase is asked for
+        on the GUI thread and the open retried. ``on_cancel``/``on_fail``
+        default to going back to the vault that was shown before.
+        """
+        self.view.set_busy(True, f'Opening {name}...')
+
+        def on_error(error):
+            from model.kdf import PassphraseError
+            if not isinstance(error, PassphraseError):
+                QMessageBox.critical(self.view, "Error", f"Failed to open the vault: {error}")
+                (on_fail or self.on_vault_not_opened)()
+                return
+            prompt = f"{error}. Passphrase:" if passphrase is not None else "Passphrase:"
+            new_passphrase, ok = QInputDialog.getText(self.view, f"Unlock {name}", prompt, QLineEdit.Password)
+            if not ok:
+                (on_cancel or self.on_vault_not_opened)()
+                return
+            self.open_vault(name, new_passphrase, on_open, on_cancel, on_fail)
+
+        self.worker.submit(
+            self.open_and_list_vaults, name, passphrase,
+            on_done=lambda result: self.on_vault_opened(name, *result, on_open=on_open),
+            on_error=on_error,
+        )
+
+    def open_and_list_vaults(self, name, passphrase):
+        # 在背景執行緒執行；最近用過的 vault 直接取得，不重新載入
+        return self.vaults.open(name, passphrase), self.vaults.profiles()
+
+    def on_vault_opened(self, name, model, names, on_open=None):
+        self.vault_name = name
+        self.view.set_vaults(names, name)
+        self.set_model(model)
+        if on_open is not None:
+            on_open(model)
+
+    def on_vault_not_opened(self):
+        self.view.set_vaults([self.view.vault_combo.itemText(i) for i in range(self.view.vault_combo.count())],
+                             self.vault_name)
+        self.view.set_busy(False)
+
+    def switch_vault(self, name):
+        # 沒有 vault manager（直接傳入 model）時只有一個 vault
+        if self.vaults is None or name == self.vault_name:
+            return
+        # 不把這個 vault 的表單內容帶到另一個 vault
+        self.view.reset_fields()
+        self.attachment_entry = None
+        self.open_vault(name)
+
+    def create_vault(self):
+        name, ok = QInputDialog.getText(self.view, 'New Vault', 'Vault name:')
+        if not ok or not name.strip():
+            return
+        try:
+            name = validate_name(name.strip())
+        except ValueError as e:
+            QMessageBox.warning(self.view, "Error", str(e))
+            return
+        # 不存在的 vault 在開啟時建立
+        self.switch_vault(name)
 
     def connect_signals(self):
         self.view.category_combo.currentIndexChanged.connect(self.update_category)
-        self.view.identifier_input.textChanged.connect(self.update_identifier)
-        self.view.save_button.clicked.connect(self.save_data)
-        self.view.retrieve_button.clicked.connect(self.retrieve_data)
-        self.view.data_list.currentRowChanged.connect(self.update_data_list_selection)
+        self.view.vault_combo.activated.connect(lambda index: self.switch_vault(self.view.vault_combo.itemText(index)))
+        self.view.new_vault_button.clicked.connect(self.create_vault)
+        self.view.search_index_requested.connect(self.index_vault)
+        # 透過 lambda 呼叫，metrics 啟用後換上的計時版本才會生效
+        self.view.save_button.clicked.connect(lambda: self.save_data())
+        self.view.retrieve_button.clicked.connect(lambda: self.retrieve_data())
+        self.view.data_list.selectionModel().currentChanged.connect(self.update_data_list_selection)
         self.view.delete_button.clicked.connect(self.confirm_delete)
+        self.view.attach_button.clicked.connect(self.attach_file)
+        self.view.attachment_save_requested.connect(self.save_attachment)
+        self.view.attachment_remove_requested.connect(self.confirm_remove_attachment)
 
     def update_category(self, index):
         # 清除所有數據欄位
         self.view.clear_data_fields()
         # 清除所有自定義欄位
         self.view.remove_custom_fields()
+        self.view.remove_attachments()
         # 更新數據列表
         self.update_data_list(index)
         # 重新評估保存按鈕狀態
         self.update_save_button_state()
 
 
-    def update_identifier(self, text):
-        category = self.view.category_combo.currentText()
-        identifier = text.strip()
-
-        has_valid_identifier = bool(identifier)
-        can_save = self.can_save(category, has_valid_identifier)
-
-        self.view.save_button.setEnabled(can_save)
-
-    def has_valid_custom_fields(self):
-        return any(
-            name_widget.text().strip() and value_input.text().strip()
-            for _, name_widget, value_input in self.view.custom_fields
-        )
-
-    def can_save(self, category, has_valid_identifier):
-        if category == 'Others':
-            has_valid_custom_fields = self.has_valid_custom_fields()
-            return has_valid_identifier and has_valid_custom_fields
-        else:
-            data_fields = self.get_data_fields(category)
-            has_valid_default_fields = any(field.strip() for field in data_fields)
-            return has_valid_identifier and has_valid_default_fields
-
     def update_save_button_state(self):
-        category = self.view.category_combo.currentText()
-        identifier = self.view.identifier_input.text().strip()
-        has_valid_identifier = bool(identifier)
-
-        can_save = self.can_save(category, has_valid_identifier)
-        self.view.save_button.setEnabled(can_save)
-
-    def get_default_fields(self, category):
-        if category == 'Wallet':
-            return [self.view.wallet_seed_input, self.view.private_key_input]
-        elif category == 'Exchange':
-            return [
-                self.view.exchange_account_input, self.view.exchange_password_input,
-                self.view.google_2fa_input,self.view.auth_email_input,
-                self.view.auth_phone_input,self.view.fund_password_input,
-                self.view.identity_data_input
-            ]
-        return []
-
+        # 存檔按鈕由 view 依欄位變動增量判斷，這裡只在切換分類後重新評估
+        self.view.update_save_button_state()
 
     def save_data(self):
         category = self.view.category_combo.currentText()
         identifier = self.view.identifier_input.text()
+        fields = (self.get_data_fields(category), self.get_custom_data())
+        # 送出時就決定寫入哪個 vault，寫入前切換 vault 也不會寫到另一個 vault；
+        # 項目是否已存在由背景執行緒判斷，UI 執行緒不讀取可能正被更新的 model.data
+        model = self.model
+        self.view.set_busy(True, 'Saving...')
+        self.worker.submit(
+            self.entry_exists, model, category, identifier,
+            on_done=lambda exists: self.confirm_write(model, category, identifier, fields, exists),
+            on_error=self.on_write_failed,
+        )
 
-        if not self.confirm_overwrite(category, identifier):
-            return
+    def entry_exists(self, model, category, identifier):
+        return identifier in model.data.get(category, {})
 
-        data_fields = self.get_data_fields(category)
-        custom_data = self.get_custom_data()
+    def confirm_write(self, model, category, identifier, fields, exists):
+        if exists and not self.confirm_overwrite(category, identifier):
+            self.view.set_busy(False)
+            return
+        self.submit_write(model, category, identifier, fields)
+
+    def submit_write(self, model, category, identifier, fields):
+        # 寫入期間存檔與刪除按鈕停用，同一時間只會有一筆寫入
+        self.view.set_busy(True, 'Saving...' if fields is not None else 'Deleting...')
+        self.worker.submit(
+            self.apply_write, model, category, identifier, fields,
+            on_done=lambda result: self.on_write_done(fields),
+            on_error=self.on_write_failed,
+        )
 
-        all_data = ','.join(data_fields + custom_data)
+    def apply_write(self, model, category, identifier, fields):
+        # 在背景執行緒執行：每個欄位分開加密，失敗時 batch 回滾；列表由模型的變更通知更新
+        with model.batch():
+            if fields is None:
+                model.delete_data(category, identifier)
+            else:
+                model.store_fields(category, identifier, *fields)
 
-        try:
-            self.model.encrypt_and_store(category, identifier, all_data)
+    def on_write_done(self, fields):
+        self.view.set_busy(False)
+        if fields is not None:
             self.view.remove_custom_fields()
-            self.update_data_list(self.view.category_combo.currentIndex())
             self.view.clear_data_fields()
-        except Exception as e:
-            QMessageBox.critical(self.view, "Error", f"Failed to save data: {str(e)}")
+            self.view.remove_attachments()
+
+    def on_write_failed(self, error):
+        # 模型已回滾，表單內容保留讓使用者重試
+        self.view.set_busy(False)
+        QMessageBox.critical(self.view, "Error", f"Failed to save data: {str(error)}")
 
     def confirm_overwrite(self, category, identifier):
-        if identifier in self.model.data.get(category, {}):
-            reply = QMessageBox.question(
-                self.view, 'Confirm Save',
-                f"'{identifier}' already exists for '{category}'. Do you want to overwrite it?",
-                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
-            )
-            return reply == QMessageBox.Yes
-        return True
+        reply = QMessageBox.question(
+            self.view, 'Confirm Save',
+            f"'{identifier}' already exists for '{category}'. Do you want to overwrite it?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        return reply == QMessageBox.Yes
 
     def get_data_fields(self, category):
-        data_fields = []
-        if category == 'Wallet':
-            data_fields.append(self.view.wallet_seed_input.text())
-            data_fields.append(self.view.private_key_input.text())
-        elif category == 'Exchange':
-            data_fields.extend([
-                self.view.exchange_account_input.text(),
-                self.view.exchange_password_input.text(),
-                self.view.google_2fa_input.text(),
-                self.view.auth_email_input.text(),
-                self.view.auth_phone_input.text(),
-                self.view.fund_password_input.text(),
-                self.view.identity_data_input.text()
-            ])
-        return data_fields
-
+        inputs = self.view.field_inputs.get(category, {})
+        return {field.key: inputs[field.key].text() for field in get_fields(category)}
 
     def get_custom_data(self):
         custom_data = []
@@ -125,99 +236,158 @@ class Controller:
             name = name_input.text().strip()
             value = value_input.text().strip()
             if name and value:
-                custom_data.append(f"{name}:{value}")
+                custom_data.append((name, value))
         return custom_data
 
     def retrieve_data(self):
-        current_item = self.view.data_list.currentItem()
-        if current_item is None:
+        entry = self.view.current_entry()
+        if entry is None:
             return
 
-        category = self.view.category_combo.currentText()
-        identifier = self.view.data_list.currentItem().text()
-        decrypted_data = self.model.decrypt_and_retrieve(category, identifier)
+        category, identifier = entry
+        if category != self.view.category_combo.currentText():
+            # 跨分類搜尋的結果，先切換到對應分類再填入欄位
+            self.view.jump_to_search_result()
+        # 解密在背景執行緒，排在尚未完成的寫入之後
+        self.worker.submit(
+            self.load_record, self.model, category, identifier,
+            on_done=lambda result: self.show_record(category, identifier, *result),
+            on_error=self.on_retrieve_failed,
+        )
+
+    def load_record(self, model, category, identifier):
+        # 在背景執行緒執行；附件只解密名稱與大小
+        record = model.retrieve_fields(category, identifier)
+        attachments = model.list_attachments(category, identifier) if record is not None else []
+        return record, attachments
+
+    def on_retrieve_failed(self, error):
+        if isinstance(error, ValueError):
+            # 舊格式中無法解析的自定義欄位
+            QMessageBox.warning(self.view, "Error", str(error))
+        else:
+            QMessageBox.critical(self.view, "Error", f"Failed to retrieve data: {str(error)}")
 
-        if decrypted_data is None:
+    def show_record(self, category, identifier, record, attachments=()):
+        if category != self.view.category_combo.currentText():
+            # 解密期間已切換到其他分類
+            return
+        if record is None:
             QMessageBox.warning(self.view, "Error", "Failed to retrieve data or decryption error, please check the key and try again.")
             return
 
         self.view.identifier_input.setText(identifier)
-        data_parts = decrypted_data.split(',')
+        data_fields, custom_data = record
 
         self.view.remove_custom_fields()
 
-        self.populate_default_fields(category, data_parts)
-        self.populate_custom_fields(category, data_parts)
-
-    def populate_default_fields(self, category, data_parts):
-        if category == 'Wallet':
-            if len(data_parts) >= 2:
-                self.view.wallet_seed_input.setText(data_parts[0])
-                self.view.private_key_input.setText(data_parts[1])
-        elif category == 'Exchange':
-            if len(data_parts) >= 7:
-                self.view.exchange_account_input.setText(data_parts[0])
-                self.view.exchange_password_input.setText(data_parts[1])
-                self.view.google_2fa_input.setText(data_parts[2])
-                self.view.auth_email_input.setText(data_parts[3])
-                self.view.auth_phone_input.setText(data_parts[4])
-                self.view.fund_password_input.setText(data_parts[5])
-                self.view.identity_data_input.setText(data_parts[6])
-
-    def populate_custom_fields(self, category, data_parts):
-        custom_data_parts = []
-        if category == 'Wallet':
-            if len(data_parts) >= 2:
-                custom_data_parts = data_parts[2:]
-        elif category == 'Exchange':
-            if len(data_parts) >= 7:
-                custom_data_parts = data_parts[7:]
-        else:  # Others
-            custom_data_parts = data_parts
-
-        for custom_data in custom_data_parts:
-            name_value_pair = custom_data.split(':', 1)
-            if len(name_value_pair) == 2:
-                name, value = name_value_pair
-                self.view.add_custom_field(name.strip(), value.strip())
-            else:
-                QMessageBox.warning(self.view, "Error", f"Invalid custom field format: {custom_data}")
-                return
+        self.populate_default_fields(category, data_fields)
+        self.populate_custom_fields(custom_data)
+        self.attachment_entry = (category, identifier)
+        self.view.show_attachments(attachments)
+
+    def populate_default_fields(self, category, data_fields):
+        inputs = self.view.field_inputs.get(category, {})
+        for field in get_fields(category):
+            if field.key in data_fields:
+                inputs[field.key].setText(data_fields[field.key])
+
+    def populate_custom_fields(self, custom_data):
+        for name, value in custom_data:
+            self.view.add_custom_field(name, value)
+
+    def attach_file(self):
+        # 附件加到名稱欄的項目；項目不存在時會建立只有附件的項目
+        category = self.view.category_combo.currentText()
+        identifier = self.view.identifier_input.text().strip()
+        if not identifier:
+            QMessageBox.warning(self.view, "Error", "Enter a name or retrieve an entry before attaching a file.")
+            return
+        path, _ = QFileDialog.getOpenFileName(self.view, 'Attach File')
+        if not path:
+            return
+        self.view.set_busy(True, f'Encrypting {os.path.basename(path)}...')
+        self.worker.submit(
+            self.add_and_list_attachments, self.model, category, identifier, path,
+            on_done=lambda attachments: self.on_attachments_changed(category, identifier, attachments),
+            on_error=lambda error: self.on_attachment_failed('attach the file', error),
+        )
+
+    def add_and_list_attachments(self, model, category, identifier, path):
+        model.add_attachment(category, identifier, path)
+        return model.list_attachments(category, identifier)
+
+    def remove_and_list_attachments(self, model, category, identifier, attachment_id):
+        model.remove_attachment(category, identifier, attachment_id)
+        return model.list_attachments(category, identifier)
+
+    def on_attachments_changed(self, category, identifier, attachments):
+        self.view.set_busy(False)
+        if category == self.view.category_combo.currentText():
+            self.attachment_entry = (category, identifier)
+            self.view.show_attachments(attachments)
+
+    def on_attachment_failed(self, action, error):
+        self.view.set_busy(False)
+        QMessageBox.critical(self.view, "Error", f"Failed to {action}: {str(error)}")
+
+    def save_attachment(self, attachment_id):
+        category, identifier = self.attachment_entry
+        name = self.view.attachment_names.get(attachment_id, '')
+        path, _ = QFileDialog.getSaveFileName(self.view, 'Save Attachment', name)
+        if not path:
+            return
+        # 串流解密寫入，檔案不會整個載入記憶體
+        self.view.set_busy(True, f'Decrypting {name}...')
+        self.worker.submit(
+            self.model.save_attachment, category, identifier, attachment_id, path,
+            on_done=lambda size: self.view.set_busy(False),
+            on_error=lambda error: self.on_attachment_failed('save the attachment', error),
+        )
+
+    def confirm_remove_attachment(self, attachment_id):
+        category, identifier = self.attachment_entry
+        reply = QMessageBox.question(
+            self.view, 'Confirm Remove',
+            f"Remove '{self.view.attachment_names.get(attachment_id)}' from '{identifier}'? "
+            "The encrypted file will be deleted.",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        if reply != QMessageBox.Yes:
+            return
+        self.view.set_busy(True, 'Removing attachment...')
+        self.worker.submit(
+            self.remove_and_list_attachments, self.model, category, identifier, attachment_id,
+            on_done=lambda attachments: self.on_attachments_changed(category, identifier, attachments),
+            on_error=lambda error: self.on_attachment_failed('remove the attachment', error),
+        )
 
     def update_data_list(self, index):
-        category = self.view.category_combo.itemText(index)
-        self.view.data_list.clear()
-        if category in self.model.data:
-            self.view.data_list.addItems(self.model.data[category].keys())
+        self.view.update_data_list(index)
 
-    def update_data_list_selection(self, current_item):
-        self.view.enable_delete_button(current_item)
+    def update_data_list_selection(self, current, previous=None):
+        self.view.enable_delete_button(current)
 
     # 添加一個方法來處理刪除事件
     def confirm_delete(self):
-        selected_item = self.view.data_list.currentItem()
-        if selected_item:
+        entry = self.view.current_entry()
+        if entry:
+            category, identifier = entry
             reply = QMessageBox.question(
                 self.view, 
                 'Confirm Delete', 
-                f"Are you sure you want to delete '{selected_item.text()}'?",
+                f"Are you sure you want to delete '{identifier}'?",
                 QMessageBox.Yes | QMessageBox.No, 
                 QMessageBox.No
             )
 
             if reply == QMessageBox.Yes:
-                self.delete_data(selected_item.text())
+                self.delete_data(identifier, category)
 
-    def delete_data(self, identifier):
-        category = self.view.category_combo.currentText()
-        self.model.delete_data(category, identifier)  # 呼叫模型的 delete_data 方法
-        self.update_data_list(self.view.category_combo.currentIndex())  # 更新數據列表
+    def delete_data(self, identifier, category=None):
+        if category is None:
+            category = self.view.category_combo.currentText()
+        self.submit_write(self.model, category, identifier, None)  # 在背景執行緒刪除，列表由變更通知更新
 
 
-    # 添加一個方法來刪除數據
-    def delete_data(self, identifier):
-        category = self.view.category_combo.currentText()
-        if identifier in self.model.data[category]:
-            del self.model.data[category][identifier]
-            self.model.save_data()  # 保存數據到文件
-            self.update_data_list(self.view.category_combo.currentIndex())  # 更新列表
\ No newline at end of file
+metrics.instrument(Controller, 'save_data', 'retrieve_data', prefix='controller')
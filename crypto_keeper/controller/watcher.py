@@ -0,0 +1,65 @@
+# crypto_keeper/controller/watcher.py
+# 以 QFileSystemWatcher 監看 vault 的資料夾與檔案，其他程式寫入後在背景執行緒重新載入，
+# 列表只依逐項差異更新。檔案以 rename 取代後會從監看清單消失，因此同時監看資料夾並在每次變動後重新加入。
+import os
+import sys
+
+from PySide6.QtCore import QObject, QFileSystemWatcher, QTimer
+
+# 一次寫入常會觸發數個事件（暫存檔、rename、日誌），等這段時間後只檢查一次
+DEBOUNCE_MS = 200
+
+
+class VaultWatcher(QObject):
+    def __init__(self, model, worker, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.worker = worker
+        self.stopped = False
+        self.watcher = QFileSystemWatcher(self)
+        self.watcher.directoryChanged.connect(self.schedule)
+        self.watcher.fileChanged.connect(self.schedule)
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(DEBOUNCE_MS)
+        self.timer.timeout.connect(self.check)
+        self.paths = []
+        self.watch(model.storage.paths())
+
+    def watch(self, paths):
+        # paths 為 storage 的檔案；同時監看它們所在的資料夾，才能察覺以 rename 取代或新建的檔案
+        if self.stopped:
+            return
+        self.paths = paths
+        candidates = list(dict.fromkeys([os.path.dirname(path) for path in paths] + paths))
+        watched = set(self.watcher.files()) | set(self.watcher.directories())
+        missing = [path for path in candidates if path not in watched and os.path.exists(path)]
+        if missing:
+            self.watcher.addPaths(missing)
+
+    def stop(self):
+        # 切換到其他 vault 時停止監看這個 vault；已送出的 reload 完成後不再加回路徑
+        self.stopped = True
+        self.timer.stop()
+        paths = self.watcher.files() + self.watcher.directories()
+        if paths:
+            self.watcher.removePaths(paths)
+        self.deleteLater()
+
+    def schedule(self, path=None):
+        self.timer.start()
+
+    def check(self):
+        # 自己的寫入也會觸發事件，簽章相同時 reload_if_changed 只花一次 stat
+        self.worker.submit(self.reload, on_done=self.watch, on_error=self.on_reload_failed)
+
+    def on_reload_failed(self, error):
+        # 其他程式寫到一半的檔案或被移除的資料夾只是暫時的，下一次變動時會再檢查；
+        # 沿用上次的檔案清單重新監看，不讀取背景執行緒正在更新的 storage
+        print(f"Failed to reload the vault: {error}", file=sys.stderr)
+        self.watch(self.paths)
+
+    def reload(self):
+        # 在背景執行緒執行；分片的清單可能在重新載入時改變，一併回傳最新的檔案
+        self.model.reload_if_changed()
+        return self.model.storage.paths()
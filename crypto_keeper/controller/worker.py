@@ -0,0 +1,64 @@
+# crypto_keeper/controller/worker.py
+# 在背景執行緒執行 vault 的讀寫與加解密，結果透過 signal 回到 UI 執行緒。
+# 只有一條執行緒：所有 model 操作依送出順序執行，不會同時修改 vault。
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal
+
+
+class Task(QRunnable):
+    def __init__(self, worker, func, args, on_done, on_error):
+        super().__init__()
+        self.worker = worker
+        self.func = func
+        self.args = args
+        self.on_done = on_done
+        self.on_error = on_error
+
+    def run(self):
+        try:
+            result = self.func(*self.args)
+        except Exception as e:
+            self.worker.finished.emit(self, None, e)
+        else:
+            self.worker.finished.emit(self, result, None)
+
+
+class VaultWorker(QObject):
+    """Run vault calls on one background thread and report back on the GUI thread.
+
+    ``submit(func, *args, on_done=..., on_error=...)`` queues ``func``; the
+    callbacks receive its result or exception on the thread that owns the
+    worker, so they may touch widgets.
+    """
+
+    # 由背景執行緒送出；接收端在 UI 執行緒，Qt 會以 queued connection 傳遞
+    finished = Signal(object, object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)
+        # 執行中的工作；Task 由 Qt 執行完後可能被釋放，這裡保留到回呼結束
+        self.tasks = set()
+        self.finished.connect(self.dispatch)
+
+    def submit(self, func, *args, on_done=None, on_error=None):
+        task = Task(self, func, args, on_done, on_error)
+        task.setAutoDelete(False)
+        self.tasks.add(task)
+        self.pool.start(task)
+
+    def dispatch(self, task, result, error):
+        self.tasks.discard(task)
+        if error is not None:
+            if task.on_error is None:
+                raise error
+            task.on_error(error)
+        elif task.on_done is not None:
+            task.on_done(result)
+
+    def busy(self):
+        return bool(self.tasks)
+
+    def wait(self, msecs=-1):
+        # 結束程式前等待已送出的寫入完成
+        return self.pool.waitForDone(msecs)
@@ -9,6 +9,7 @@
 
 
 # crypto_keeper/main.py
+import startup
 import sys
 import os
 
@@ -23,16 +24,102 @@ if parent_dir not in sys.path:
     sys.path.append(parent_dir)
 
 from PySide6.QtWidgets import QApplication
-from model.model import LegacyModel
+from PySide6.QtCore import Qt, QObject, QEvent, QTimer
+startup.mark('import PySide6')
+from model import metrics
+from model.profiles import DEFAULT_PROFILE, VaultManager
 from controller.controller import Controller
+from controller.worker import VaultWorker
 from view.mainwindow import Mainwindow
+startup.mark('import views')
+
+# 視窗沒有收到繪製事件時（例如以最小化啟動），最晚在這個時間後開始載入 vault
+LOAD_DELAY_MS = 200
+
+
+class FirstPaintFilter(QObject):
+    # 視窗第一次繪製完成後呼叫 callback 一次
+    def __init__(self, widget, callback):
+        super().__init__(widget)
+        self.widget = widget
+        self.callback = callback
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Paint:
+            self.widget.removeEventFilter(self)
+            # 等這次繪製處理完再呼叫
+            QTimer.singleShot(0, self.callback)
+        return False
+
+
+def load_model(data_dir, passphrase):
+    # 由 VaultManager 在背景執行緒呼叫：匯入 cryptography 並解析 vault，不佔用第一次繪製前的時間
+    # 快取最近取出的明文一分鐘，視窗失去焦點時立即清除
+    # CRYPTO_KEEPER_STORAGE=sharded 可將 vault 轉為分類分檔並延遲載入
+    from model.model import LegacyModel
+    from model.cache import DecryptCache
+    storage = os.environ.get('CRYPTO_KEEPER_STORAGE', 'auto')
+    return LegacyModel(storage=storage, cache=DecryptCache(max_entries=64, ttl=60), data_dir=data_dir,
+                       passphrase=passphrase)
+
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
+    startup.mark('QApplication')
+
+    view = Mainwindow()
+    worker = VaultWorker(view)
+    # 最近使用的 vault 保持開啟，切換時不必重新載入；CRYPTO_KEEPER_PROFILE 選擇啟動時開啟的 vault
+    vaults = VaultManager(opener=load_model)
+    controller = Controller(None, view, worker, vaults)
+    # VaultManager 只在背景執行緒使用：結束前等待尚未完成的寫入，再由背景執行緒關閉所有 vault
+    def close_vaults():
+        worker.wait()
+        worker.submit(vaults.close_all)
+        worker.wait()
+
+    app.aboutToQuit.connect(close_vaults)
+    # 視窗失去焦點時清除所有開著的 vault 的明文快取
+    app.applicationStateChanged.connect(
+        lambda state: worker.submit(vaults.purge_caches) if state != Qt.ApplicationActive else None
+    )
+    # 設定 CRYPTO_KEEPER_METRICS_FILE 時，結束前寫出收集到的計時與計數
+    metrics_file = os.environ.get('CRYPTO_KEEPER_METRICS_FILE')
+    if metrics_file:
+        app.aboutToQuit.connect(lambda: metrics.write_file(metrics_file))
+    startup.mark('build window')
+
+    def finish_trace():
+        # 第一次繪製與 vault 載入都完成後印出各階段耗時；設定預算時直接結束
+        if startup.elapsed('first paint') is None or startup.elapsed('vault loaded') is None:
+            return
+        startup.report()
+        if startup.BUDGET_MS:
+            app.exit(0 if startup.within_budget() else 1)
+
+    def on_open(model):
+        startup.mark('vault loaded')
+        if startup.ENABLED:
+            finish_trace()
+
+    loading = []
+
+    def start_loading():
+        if not loading:
+            loading.append(True)
+            # 取消輸入 passphrase 時結束，無法開啟 vault 時以結束代碼 1 結束
+            controller.open_vault(os.environ.get('CRYPTO_KEEPER_PROFILE') or DEFAULT_PROFILE, on_open=on_open,
+                                  on_cancel=QApplication.quit, on_fail=lambda: QApplication.exit(1))
 
-    model = LegacyModel()
-    view = Mainwindow(model)
-    controller = Controller(model, view)
+    def on_first_paint():
+        startup.mark('first paint')
+        start_loading()
+        if startup.ENABLED:
+            finish_trace()
 
+    FirstPaintFilter(view, on_first_paint)
+    QTimer.singleShot(LOAD_DELAY_MS, start_loading)
     view.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    startup.mark('show')
+    sys.exit(app.exec())
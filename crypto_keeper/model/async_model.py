@@ -0,0 +1,221 @@
+# crypto_keeper/model/async_model.py
+# 給 asyncio 程式（交易機器人）使用的 LegacyModel 包裝：
+#   async with AsyncLegacyModel(data_dir=...) as vault:
+#       password = await vault.get('Exchange', 'binance', field='exchange_password')
+#       await vault.put('Others', 'api-key', 'secret')
+#
+# 所有讀取或修改 vault 的工作都在單一的 vault 執行緒上依序執行，event loop 不碰 model.data；
+# 同時送出的寫入合併成一次 batch，只寫一次檔案。小筆紀錄的加解密只需幾微秒，直接在 event loop 上處理，
+# 大筆紀錄才丟到執行緒池，避免每次都付出切換執行緒的成本。
+import asyncio
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from model.model import LegacyModel
+from model import crypto, record
+
+# 超過此長度（字元）的紀錄改在執行緒池加解密
+INLINE_CRYPTO_LIMIT = 4096
+
+
+class AsyncLegacyModel:
+    """Awaitable get/put/delete/list over a :class:`LegacyModel`.
+
+    Keyword arguments are passed to ``LegacyModel`` when the vault is opened.
+    Writes issued while a flush is running are coalesced into the next flush;
+    each write returns once its flush is on disk. ``flush_delay`` holds the
+    first write of a flush for that many seconds to gather more writers.
+    """
+
+    def __init__(self, flush_delay=0.0, executor=None, **model_kwargs):
+        self.model_kwargs = model_kwargs
+        self.flush_delay = flush_delay
+        # 執行緒池：大筆紀錄的加解密；None 為 event loop 的預設執行緒池
+        self.executor = executor
+        self.vault_executor = None
+        self.model = None
+        self.cipher = None
+        # 項目被寫入或重新載入時遞增（只在 vault 執行緒上修改）；讀取途中有變動就不放進快取
+        self.generations = {}
+        self.epoch = 0
+        self.pending = None
+        self.pending_future = None
+        self.flush_lock = None
+        self.flush_task = None
+
+    # ---- open / close ----
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        self.vault_executor = ThreadPoolExecutor(1, thread_name_prefix='crypto-keeper-vault')
+        self.flush_lock = asyncio.Lock()
+        try:
+            # 載入 vault 與 passphrase 的 KDF 都可能花上數百毫秒
+            self.model = await loop.run_in_executor(self.vault_executor, lambda: LegacyModel(**self.model_kwargs))
+        except BaseException:
+            self.vault_executor.shutdown(wait=False)
+            self.vault_executor = None
+            raise
+        self.model.add_listener(self.on_changes)
+        return self
+
+    async def close(self):
+        if self.model is None:
+            return
+        await self.flush()
+        loop = asyncio.get_running_loop()
+        self.model.remove_listener(self.on_changes)
+        await loop.run_in_executor(self.vault_executor, self.model.close)
+        self.vault_executor.shutdown(wait=True)
+        self.vault_executor = None
+        self.model = None
+
+    async def __aenter__(self):
+        return await self.open()
+
+    async def __aexit__(self, exc_type, exc, traceback):
+        await self.close()
+
+    # ---- helpers ----
+    def run_in_vault(self, func, *args):
+        return asyncio.get_running_loop().run_in_executor(self.vault_executor, func, *args)
+
+    def loop_cipher(self, key):
+        # event loop 專用的 cipher，不與 vault 執行緒共用暫存緩衝區；金鑰輪替後換成新金鑰的 cipher
+        if self.cipher is None or self.cipher.key != key:
+            self.cipher = crypto.RecordCipher(key)
+        return self.cipher
+
+    async def run_crypto(self, size, func, *args, key=None):
+        # key 預設為 model 目前的金鑰；讀取時傳入與紀錄一起在 vault 執行緒取得的金鑰
+        if key is None:
+            key = self.model.key
+        if size <= INLINE_CRYPTO_LIMIT:
+            return func(self.loop_cipher(key), *args)
+        # 每個工作使用自己的 RecordCipher，執行緒之間不共用暫存緩衝區
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, lambda: func(crypto.RecordCipher(key), *args)
+        )
+
+    def read_entry(self, category, identifier):
+        # 在 vault 執行緒執行：紀錄、解密它的金鑰與快取的世代一起取得，不會跨過寫入或金鑰輪替
+        encrypted_data = self.model.data.get(category, {}).get(identifier)
+        return encrypted_data, self.model.key, self.generation(category, identifier)
+
+    def generation(self, category, identifier):
+        return self.epoch, self.generations.get((category, identifier), 0)
+
+    def on_changes(self, changes):
+        # model 的變更通知，在 vault 執行緒上呼叫；先遞增世代再清掉快取，
+        # 與 get 先放進快取再比對世代的順序搭配，兩邊交錯時過期的明文都會被清掉
+        cache = self.model.cache
+        if changes is None:
+            self.epoch += 1
+            if cache is not None:
+                cache.purge()
+            return
+        for category, identifier, _ in changes:
+            key = (category, identifier)
+            self.generations[key] = self.generations.get(key, 0) + 1
+            if cache is not None:
+                cache.invalidate(key)
+
+    # ---- reads ----
+    async def get(self, category, identifier, field=None):
+        """Return the decrypted value (or a single field), ``None`` if missing or undecryptable."""
+        cache = self.model.cache
+        if field is None and cache is not None:
+            plaintext = cache.get((category, identifier))
+            if plaintext is not None:
+                return plaintext
+
+        encrypted_data, key, generation = await self.run_in_vault(self.read_entry, category, identifier)
+        if not encrypted_data:
+            return None
+        try:
+            if field is not None:
+                return await self.run_crypto(len(encrypted_data), crypto.RecordCipher.decrypt_field,
+                                             encrypted_data, category, identifier, field, key=key)
+            plaintext = await self.run_crypto(len(encrypted_data), crypto.RecordCipher.decrypt,
+                                              encrypted_data, crypto.associated_data(category, identifier), key=key)
+        except ValueError as e:
+            print(f"Decryption error: {e}", file=sys.stderr)
+            return None
+        if cache is not None:
+            cache.put((category, identifier), plaintext)
+            if self.generation(category, identifier) != generation:
+                # 解密期間項目被寫入或 vault 重新載入，這份明文已過期
+                cache.invalidate((category, identifier))
+        return plaintext
+
+    async def list(self, category=None):
+        # 排序大量 identifier 也交給 vault 執行緒，順便避免與寫入同時走訪
+        def listing():
+            if category:
+                return {category: sorted(self.model.data.get(category, {}))}
+            return {name: sorted(entries) for name, entries in self.model.data.items()}
+        return await self.run_in_vault(listing)
+
+    async def reload_if_changed(self):
+        return await self.run_in_vault(self.model.reload_if_changed)
+
+    # ---- writes ----
+    async def put(self, category, identifier, value):
+        key = self.model.key
+        encrypted_data = await self.run_crypto(len(value), crypto.RecordCipher.encrypt, value,
+                                               crypto.associated_data(category, identifier), key=key)
+        await self.enqueue((category, identifier, encrypted_data, key))
+
+    async def put_fields(self, category, identifier, fields, custom_fields=()):
+        items = record.from_fields(fields, custom_fields)
+        size = sum(len(value) for _, _, value in items)
+        key = self.model.key
+        encrypted_data = await self.run_crypto(size, crypto.RecordCipher.encrypt_fields, items,
+                                               crypto.associated_data(category, identifier), key=key)
+        await self.enqueue((category, identifier, encrypted_data, key))
+
+    async def delete(self, category, identifier):
+        await self.enqueue((category, identifier, None, None))
+
+    async def enqueue(self, change):
+        # change: (category, identifier, encrypted_data or None, 加密時的金鑰)
+        # 第一個寫入建立新的一批並啟動 flush，之後的寫入加入同一批，共用同一個結果
+        if self.pending is None:
+            self.pending = []
+            self.pending_future = asyncio.get_running_loop().create_future()
+            self.flush_task = asyncio.ensure_future(self.flush_pending())
+        self.pending.append(change)
+        # shield：單一呼叫端被取消時不影響同一批的其他寫入
+        await asyncio.shield(self.pending_future)
+
+    async def flush_pending(self):
+        async with self.flush_lock:
+            if self.flush_delay:
+                await asyncio.sleep(self.flush_delay)
+            changes, future = self.pending, self.pending_future
+            self.pending = self.pending_future = None
+            try:
+                await self.run_in_vault(self.apply_changes, changes)
+            except BaseException as e:
+                future.set_exception(e)
+            else:
+                future.set_result(None)
+
+    def apply_changes(self, changes):
+        # 在 vault 執行緒上執行：整批只寫一次檔案
+        with self.model.batch():
+            for category, identifier, encrypted_data, key in changes:
+                if encrypted_data is None:
+                    self.model.delete_data(category, identifier)
+                elif key != self.model.key:
+                    # 等待寫入期間金鑰已輪替，舊金鑰的密文不能寫進 vault；整批回滾
+                    raise ValueError("The vault key was rotated while the write was pending; nothing was written")
+                else:
+                    self.model.store_encrypted(category, identifier, encrypted_data)
+
+    async def flush(self):
+        # 等待所有已送出的寫入完成
+        while self.pending_future is not None:
+            await asyncio.shield(self.pending_future)
+        async with self.flush_lock:
+            pass
+
@@ -0,0 +1,168 @@
+# crypto_keeper/model/attachment.py
+# 附件（KYC 掃描檔、PDF 等）存成 CryptoKeeperData/attachments/<id>.ckatt，不放進 vault 的 JSON：
+#   header  magic 'CKAT' | version:u8 | chunk_size:u32
+#   chunks  AES-GCM(chunk_size bytes 明文) + 16 bytes tag；最後一段可以較短，空檔案為一段空的明文
+# 每個附件有自己的隨機金鑰，nonce 為段落序號；associated data 綁定標頭、序號與是否為最後一段，
+# 段落被調換、截斷或換成其他位置的段落都會在讀取時發現。每段密文長度固定，
+# 讀取任何位置只需解密涵蓋它的段落，加密與解密都以串流進行，檔案不必整個放進記憶體。
+# 附件的金鑰、名稱與大小存在項目的 v3 紀錄中（FIELD_ATTACHMENT 欄位，欄位名稱為附件 id），
+# 隨紀錄一起加密，輪替 vault 金鑰時附件檔案不需要重寫。
+import io
+import os
+import struct
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+SUFFIX = '.ckatt'
+MAGIC = b'CKAT'
+VERSION = 1
+HEADER = struct.Struct('>4sBI')
+CHUNK_BYTES = 64 * 1024
+TAG_BYTES = 16
+# 沒有被任何項目引用的附件檔案超過這個時間才清除；其他行程可能剛寫完檔案、還沒寫入紀錄
+ORPHAN_GRACE_SECONDS = 3600
+
+
+def new_id():
+    return os.urandom(16).hex()
+
+
+def chunk_nonce(index):
+    return struct.pack('>4xQ', index)
+
+
+def chunk_associated_data(header, index, final):
+    return header + struct.pack('>QB', index, final)
+
+
+class AttachmentWriter:
+    """Encrypt a stream into an attachment file, one chunk at a time.
+
+    Data is written to ``<path>.tmp`` and renamed into place by :meth:`close`.
+    """
+
+    def __init__(self, path, key, chunk_size=CHUNK_BYTES):
+        self.path = path
+        self.tmp_path = f"{path}.tmp"
+        self.chunk_size = chunk_size
+        self.aead = AESGCM(key)
+        self.header = HEADER.pack(MAGIC, VERSION, chunk_size)
+        self.file = open(self.tmp_path, 'wb')
+        self.file.write(self.header)
+        self.buffer = bytearray()
+        self.index = 0
+        self.size = 0
+
+    def write(self, data):
+        self.buffer += data
+        self.size += len(data)
+        # 最後一段要到 close 才知道，緩衝區至少留下一段
+        while len(self.buffer) > self.chunk_size:
+            self.seal(bytes(self.buffer[:self.chunk_size]), final=False)
+            del self.buffer[:self.chunk_size]
+        return len(data)
+
+    def seal(self, chunk, final):
+        aad = chunk_associated_data(self.header, self.index, final)
+        self.file.write(self.aead.encrypt(chunk_nonce(self.index), chunk, aad))
+        self.index += 1
+
+    def close(self):
+        self.seal(bytes(self.buffer), final=True)
+        self.buffer = bytearray()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self.file.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class AttachmentReader(io.RawIOBase):
+    """Seekable, read-only file object over the plaintext of an attachment.
+
+    Only the chunks covering the bytes read are loaded and authenticated;
+    a modified or truncated file raises ``ValueError``.
+    """
+
+    def __init__(self, path, key):
+        super().__init__()
+        self.file = open(path, 'rb')
+        self.header = self.file.read(HEADER.size)
+        try:
+            magic, version, chunk_size = HEADER.unpack(self.header)
+        except struct.error:
+            magic, version, chunk_size = None, None, 0
+        if magic != MAGIC or version != VERSION or chunk_size == 0:
+            self.file.close()
+            raise ValueError(f"Not an attachment file: {path}")
+        self.chunk_size = chunk_size
+        self.aead = AESGCM(key)
+        sealed_size = os.fstat(self.file.fileno()).st_size - HEADER.size
+        self.chunks = max(1, -(-sealed_size // (chunk_size + TAG_BYTES)))
+        self.size = max(0, sealed_size - self.chunks * TAG_BYTES)
+        self.position = 0
+        self.cached_index = None
+        self.cached = b''
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise ValueError("Negative seek position")
+        self.position = offset
+        return offset
+
+    def chunk(self, index):
+        if index != self.cached_index:
+            self.file.seek(HEADER.size + index * (self.chunk_size + TAG_BYTES))
+            sealed = self.file.read(self.chunk_size + TAG_BYTES)
+            aad = chunk_associated_data(self.header, index, index == self.chunks - 1)
+            try:
+                self.cached = self.aead.decrypt(chunk_nonce(index), sealed, aad)
+            except InvalidTag:
+                raise ValueError(f"Attachment chunk {index} failed authentication: the file was modified or truncated.")
+            self.cached_index = index
+        return self.cached
+
+    def readinto(self, buffer):
+        view = memoryview(buffer).cast('B')
+        filled = 0
+        while filled < len(view) and self.position < self.size:
+            index, offset = divmod(self.position, self.chunk_size)
+            chunk = self.chunk(index)
+            count = min(len(view) - filled, len(chunk) - offset)
+            if count <= 0:
+                break
+            view[filled:filled + count] = chunk[offset:offset + count]
+            filled += count
+            self.position += count
+        return filled
+
+    def close(self):
+        if not self.closed:
+            self.file.close()
+        super().close()
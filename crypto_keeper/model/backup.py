@@ -0,0 +1,550 @@
+# crypto_keeper/model/backup.py
+# 增量備份。備份資料夾（預設 CryptoKeeperData/backups/）：
+#   packs/<id>.pack       一次備份新增的物件依序串接；寫完後不再修改
+#   packs/<id>.idx        每個物件一筆 digest | offset | length，在 pack 寫完後才建立
+#   snapshots/<id>.json   一次備份的時間、來源格式與 root 物件的 digest
+#   backup.lock           備份之間可以同時進行，prune 需要獨佔
+# 物件以內容的 sha256 定址。項目的密文原樣保存，仍由 vault 金鑰加密，所以備份與還原都不需要 passphrase；
+# tree 是一個 bucket 的 {identifier: 密文 digest}，root 記錄每個分類各 bucket 的 tree 與 vault_header.json。
+# key.txt 是明文的金鑰，不寫進備份；快照只記錄它的指紋，還原時由使用者提供並核對。
+# 沒有變動的 bucket 得到相同的 tree digest 而不必再寫，每次備份寫入的量與變動的項目數成正比。
+# 項目引用的附件檔案切成固定大小的 piece 保存；附件寫入後內容不會再改變，上一個快照已有的附件直接沿用。
+import datetime
+import hashlib
+import json
+import math
+import os
+import shutil
+import struct
+import time
+import zlib
+
+from model import crypto
+from model.attachment import SUFFIX as ATTACHMENT_SUFFIX
+from model.locking import VaultLock
+from model.storage import LAYOUT_FILE, create_storage, detect_storage, write_layout
+
+SNAPSHOT_VERSION = 1
+INDEX_ENTRY = struct.Struct('>32sQI')
+# 物件的第一個 byte：密文幾乎無法壓縮，原樣保存；tree 與 root 以 zlib 壓縮
+RAW = b'r'
+COMPRESSED = b'z'
+KEY_FILES = ('key.txt', 'vault_header.json')
+KEY_FILE = 'key.txt'
+# 只有以 passphrase 包裝的金鑰檔會寫進備份
+BACKUP_KEY_FILES = ('vault_header.json',)
+# 還原到已有 vault 的資料夾時，這些檔案先移到 pre-restore-<snapshot>/
+VAULT_FILES = ('legacy_data.json', 'legacy_data.journal', 'legacy_data.journal.compacting', 'shards',
+               'attachments', LAYOUT_FILE) + KEY_FILES
+# 附件檔案已經加密，piece 原樣保存
+ATTACHMENT_PIECE_BYTES = 4 * 1024 * 1024
+# prune 時 pack 中不再被任何快照使用的 bytes 超過這個比例才重寫，否則留到之後
+REPACK_RATIO = 0.5
+# 保留規則：每個週期保留其中最新的一個快照
+RETENTION_PERIODS = {
+    'hourly': lambda t: (t.year, t.month, t.day, t.hour),
+    'daily': lambda t: (t.year, t.month, t.day),
+    'weekly': lambda t: t.isocalendar()[:2],
+    'monthly': lambda t: (t.year, t.month),
+    'yearly': lambda t: t.year,
+}
+
+
+class BackupError(Exception):
+    pass
+
+
+def object_digest(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def encode_json(value):
+    return json.dumps(value, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def bucket_count(entries):
+    # 約 sqrt(n) 個 bucket，變動一個項目時重寫的 tree 與 root 都維持在 O(sqrt(n))；
+    # 取 2 的次方，分類成長跨過門檻時才整個重新分配
+    return 1 << math.ceil(math.log2(math.sqrt(entries))) if entries > 1 else 1
+
+
+def bucket_of(identifier, count):
+    return f"{zlib.crc32(identifier.encode('utf-8')) & (count - 1):x}"
+
+
+def key_fingerprint(key_text):
+    # 用來確認還原時提供的 key.txt 屬於這個 vault；由 256 位元的隨機金鑰無法反推
+    key = bytes.fromhex(key_text.decode('ascii').strip())
+    return hashlib.sha256(b'crypto-keeper-backup-key\x00' + key).hexdigest()[:32]
+
+
+def write_file_atomic(path, data):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def existing_vault_files(data_dir):
+    return [name for name in VAULT_FILES if os.path.exists(os.path.join(data_dir, name))]
+
+
+def select_snapshots(snapshots, policy):
+    """Return the ids of ``snapshots`` kept by ``policy``.
+
+    ``policy`` maps ``'last'`` and the keys of :data:`RETENTION_PERIODS` to
+    counts: the newest ``last`` snapshots are kept, and for each period the
+    newest snapshot of each of the ``count`` most recent periods.
+    """
+    newest_first = sorted(snapshots, key=lambda snapshot: snapshot['created'], reverse=True)
+    keep = {snapshot['id'] for snapshot in newest_first[:policy.get('last', 0)]}
+    for period, period_of in RETENTION_PERIODS.items():
+        remaining = policy.get(period, 0)
+        last_period = None
+        for snapshot in newest_first:
+            if remaining <= 0:
+                break
+            current = period_of(datetime.datetime.fromtimestamp(snapshot['created']))
+            if current != last_period:
+                keep.add(snapshot['id'])
+                last_period = current
+                remaining -= 1
+    return keep
+
+
+class PackWriter:
+    def __init__(self, pack_dir):
+        self.pack_id = f"{time.strftime('%Y%m%dT%H%M%S', time.gmtime())}-{os.urandom(4).hex()}"
+        self.path = os.path.join(pack_dir, self.pack_id + '.pack')
+        self.file = None
+        self.offsets = {}
+        self.size = 0
+
+    def add(self, digest, data, compress=False):
+        self.add_payload(digest, COMPRESSED + zlib.compress(data) if compress else RAW + data)
+
+    def add_payload(self, digest, payload):
+        if digest in self.offsets:
+            return
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+        self.file.write(payload)
+        self.offsets[digest] = (self.size, len(payload))
+        self.size += len(payload)
+
+    def close(self):
+        # pack 落地後才寫索引；沒有索引的 pack 視為中斷的備份，prune 時刪除
+        if self.file is None:
+            return
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        index = b''.join(INDEX_ENTRY.pack(bytes.fromhex(digest), offset, length)
+                         for digest, (offset, length) in self.offsets.items())
+        write_file_atomic(os.path.splitext(self.path)[0] + '.idx', index)
+
+
+class BackupRepository:
+    """Content-addressed, incremental backups of a ``CryptoKeeperData`` folder."""
+
+    def __init__(self, backup_dir):
+        self.backup_dir = backup_dir
+        self.pack_dir = os.path.join(backup_dir, 'packs')
+        self.snapshot_dir = os.path.join(backup_dir, 'snapshots')
+        self.lock = VaultLock(os.path.join(backup_dir, 'backup.lock'))
+        # digest -> (pack id, offset, length)
+        self.index = {}
+        self.pack_files = {}
+
+    def exists(self):
+        return os.path.isdir(self.snapshot_dir)
+
+    def check_exists(self):
+        if not self.exists():
+            raise BackupError(f"No backups in {self.backup_dir}")
+
+    def pack_ids(self):
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(self.pack_dir) if name.endswith('.idx'))
+
+    def read_pack_index(self, pack_id):
+        with open(os.path.join(self.pack_dir, pack_id + '.idx'), 'rb') as f:
+            return {digest.hex(): (offset, length) for digest, offset, length in INDEX_ENTRY.iter_unpack(f.read())}
+
+    def load_index(self):
+        self.index = {}
+        for pack_id in self.pack_ids():
+            for digest, (offset, length) in self.read_pack_index(pack_id).items():
+                self.index[digest] = (pack_id, offset, length)
+
+    def read_payload(self, digest):
+        try:
+            pack_id, offset, length = self.index[digest]
+        except KeyError:
+            raise BackupError(f"Backup object {digest} is missing")
+        return self.read_from_pack(pack_id, offset, length)
+
+    def read_from_pack(self, pack_id, offset, length):
+        f = self.pack_files.get(pack_id)
+        if f is None:
+            f = self.pack_files[pack_id] = open(os.path.join(self.pack_dir, pack_id + '.pack'), 'rb')
+        f.seek(offset)
+        return f.read(length)
+
+    def read_object(self, digest):
+        payload = self.read_payload(digest)
+        data = None
+        if payload[:1] == RAW:
+            data = payload[1:]
+        elif payload[:1] == COMPRESSED:
+            try:
+                data = zlib.decompress(payload[1:])
+            except zlib.error:
+                pass
+        if data is None or object_digest(data) != digest:
+            raise BackupError(f"Backup object {digest} is corrupted")
+        return data
+
+    def close_packs(self):
+        for f in self.pack_files.values():
+            f.close()
+        self.pack_files = {}
+
+    # ---- 快照 ----
+    def snapshot_path(self, snapshot_id):
+        return os.path.join(self.snapshot_dir, snapshot_id + '.json')
+
+    def list_snapshots(self):
+        # 由舊到新
+        if not self.exists():
+            return []
+        snapshots = []
+        for name in os.listdir(self.snapshot_dir):
+            if name.endswith('.json'):
+                with open(os.path.join(self.snapshot_dir, name), 'rb') as f:
+                    snapshots.append(json.load(f))
+        return sorted(snapshots, key=lambda snapshot: snapshot['created'])
+
+    def find_snapshot(self, snapshot_id=None, at=None):
+        # snapshot_id 可以是完整 id、唯一的前綴或 'latest'；at 為時間戳記時取該時間點以前最新的快照
+        snapshots = self.list_snapshots()
+        if at is not None:
+            snapshots = [snapshot for snapshot in snapshots if snapshot['created'] <= at]
+        if snapshot_id in (None, 'latest'):
+            return snapshots[-1] if snapshots else None
+        matches = [snapshot for snapshot in snapshots if snapshot['id'].startswith(snapshot_id)]
+        exact = [snapshot for snapshot in matches if snapshot['id'] == snapshot_id]
+        if exact or len(matches) == 1:
+            return (exact or matches)[0]
+        if matches:
+            raise BackupError(f"Snapshot id {snapshot_id!r} is ambiguous")
+        return None
+
+    def new_snapshot_id(self, created):
+        base = time.strftime('%Y%m%dT%H%M%SZ', time.gmtime(created))
+        snapshot_id = base
+        suffix = 1
+        while os.path.exists(self.snapshot_path(snapshot_id)):
+            suffix += 1
+            snapshot_id = f"{base}-{suffix}"
+        return snapshot_id
+
+    # ---- 備份 ----
+    def read_vault(self, data_dir, data_file):
+        # 在 vault 的共享鎖內讀取，寫入中的其他行程不會留下一半的狀態
+        layout = detect_storage(data_dir, data_file)
+        # 只持有共享鎖，日誌尾端寫到一半的紀錄略過而不截掉
+        storage = create_storage(layout, data_dir, data_file, repair=False)
+        vault_lock = VaultLock(os.path.join(data_dir, 'vault.lock'))
+        try:
+            with vault_lock.shared():
+                generation = vault_lock.generation()
+                data = storage.load()
+                # 分片模式在這裡讀入每個分類
+                entries = {category: data[category] for category in data}
+                files = {}
+                for name in BACKUP_KEY_FILES:
+                    path = os.path.join(data_dir, name)
+                    if os.path.exists(path):
+                        with open(path, 'rb') as f:
+                            files[name] = f.read()
+                key_check = None
+                key_path = os.path.join(data_dir, KEY_FILE)
+                if os.path.exists(key_path):
+                    with open(key_path, 'rb') as f:
+                        key_check = key_fingerprint(f.read())
+        finally:
+            storage.close()
+            vault_lock.close()
+        return layout, generation, entries, files, key_check
+
+    def backup(self, data_dir, data_file='legacy_data.json'):
+        """Record a snapshot of the vault in ``data_dir`` and return its manifest.
+
+        Only ciphertexts and trees the repository does not hold yet are
+        written, in one new pack. ``key.txt`` is never stored, only its
+        fingerprint.
+        """
+        if not os.path.isdir(data_dir):
+            raise BackupError(f"No vault in {data_dir}")
+        created = time.time()
+        layout, generation, entries, files, key_check = self.read_vault(data_dir, os.path.join(data_dir, data_file))
+
+        os.makedirs(self.pack_dir, exist_ok=True)
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        with self.lock.shared():
+            self.load_index()
+            parent = self.find_snapshot()
+            writer = PackWriter(self.pack_dir)
+
+            def store(data, compress=False):
+                digest = object_digest(data)
+                if digest not in self.index:
+                    writer.add(digest, data, compress)
+                return digest
+
+            trees = {}
+            count = 0
+            for category, category_entries in entries.items():
+                buckets = {}
+                size = bucket_count(len(category_entries))
+                for identifier, encrypted_data in category_entries.items():
+                    buckets.setdefault(bucket_of(identifier, size), {})[identifier] = encode_json(encrypted_data)
+                    count += 1
+                trees[category] = {}
+                for bucket, bucket_entries in sorted(buckets.items()):
+                    tree = encode_json({identifier: object_digest(value) for identifier, value in bucket_entries.items()})
+                    tree_digest = object_digest(tree)
+                    # tree 已在備份中時，它引用的密文也都在；新的 tree 寫在它的密文之後
+                    if tree_digest not in self.index:
+                        for value in bucket_entries.values():
+                            store(value)
+                        store(tree, compress=True)
+                    trees[category][bucket] = tree_digest
+            files = {name: store(content) for name, content in files.items()}
+            attachments = self.backup_attachments(data_dir, entries, parent, store)
+            root = store(encode_json({'trees': trees, 'files': files, 'attachments': attachments}), compress=True)
+            writer.close()
+
+            snapshot = {
+                'version': SNAPSHOT_VERSION,
+                'id': self.new_snapshot_id(created),
+                'created': created,
+                'parent': parent['id'] if parent else None,
+                'storage': layout,
+                'generation': generation,
+                'entries': count,
+                'attachments': len(attachments),
+                'root': root,
+                'key_check': key_check,
+                'added': {'objects': len(writer.offsets), 'bytes': writer.size},
+            }
+            write_file_atomic(self.snapshot_path(snapshot['id']), encode_json(snapshot))
+        return snapshot
+
+    def backup_attachments(self, data_dir, entries, parent, store):
+        # {附件檔名: [piece digest]}；只保存快照中的項目引用的附件
+        previous = self.read_root(parent).get('attachments', {}) if parent else {}
+        attachments = {}
+        for category_entries in entries.values():
+            for encrypted_data in category_entries.values():
+                for attachment_id in crypto.attachment_ids(encrypted_data):
+                    name = attachment_id + ATTACHMENT_SUFFIX
+                    if name in previous:
+                        attachments[name] = previous[name]
+                        continue
+                    try:
+                        with open(os.path.join(data_dir, 'attachments', name), 'rb') as f:
+                            attachments[name] = [store(piece) for piece in iter(lambda: f.read(ATTACHMENT_PIECE_BYTES), b'')]
+                    except FileNotFoundError:
+                        # 讀取 vault 之後項目被刪除，附件檔案也跟著清掉了
+                        continue
+        return attachments
+
+    # ---- 還原 ----
+    def read_root(self, snapshot):
+        return json.loads(self.read_object(snapshot['root']))
+
+    def read_snapshot_data(self, snapshot):
+        root = self.read_root(snapshot)
+        data = {}
+        wanted = []
+        for category, buckets in root['trees'].items():
+            entries = data[category] = {}
+            for tree_digest in buckets.values():
+                for identifier, digest in json.loads(self.read_object(tree_digest)).items():
+                    wanted.append((category, identifier, digest))
+        # 依 pack 與位置順序讀取，還原大型快照時以循序讀為主
+        wanted.sort(key=lambda item: self.index.get(item[2], ('', 0, 0))[:2])
+        for category, identifier, digest in wanted:
+            data[category][identifier] = json.loads(self.read_object(digest))
+        files = {name: self.read_object(digest) for name, digest in root['files'].items()}
+        return data, files, root.get('attachments', {})
+
+    def restore_attachments(self, attachments, staging):
+        # 先寫到暫存資料夾，取得 vault 鎖之後再整個換上
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+        os.makedirs(staging)
+        for name, pieces in attachments.items():
+            with open(os.path.join(staging, name), 'wb') as f:
+                for digest in pieces:
+                    f.write(self.read_object(digest))
+                f.flush()
+                os.fsync(f.fileno())
+
+    def restore_key(self, snapshot, data_dir, key_file=None):
+        # 快照來自以 key.txt 保護的 vault 時，讀取並核對使用者提供的 key.txt（預設為目標資料夾中的）
+        if not snapshot.get('key_check'):
+            return None
+        path = key_file or os.path.join(data_dir, KEY_FILE)
+        try:
+            with open(path, 'rb') as f:
+                key_text = f.read()
+            matches = key_fingerprint(key_text) == snapshot['key_check']
+        except FileNotFoundError:
+            raise BackupError(f"Snapshot {snapshot['id']} is encrypted with the vault's key.txt, which backups do not "
+                              f"contain; pass a copy of it with --key-file")
+        except (UnicodeDecodeError, ValueError):
+            matches = False
+        if not matches:
+            raise BackupError(f"{path} is not the key of snapshot {snapshot['id']}")
+        return key_text
+
+    def restore(self, snapshot, data_dir, storage=None, overwrite=False, key_file=None):
+        """Write ``snapshot`` as a complete vault into ``data_dir``.
+
+        ``storage`` picks the layout (default: the layout that was backed
+        up). An existing vault is refused unless ``overwrite`` is set, in
+        which case its files are moved to ``pre-restore-<snapshot id>/``.
+        A vault protected by ``key.txt`` needs that key: ``key_file``, or the
+        ``key.txt`` already in ``data_dir``.
+        """
+        self.check_exists()
+        existing = existing_vault_files(data_dir) if os.path.isdir(data_dir) else []
+        if existing and not overwrite:
+            raise FileExistsError(f"{data_dir} already contains a vault")
+        key_text = self.restore_key(snapshot, data_dir, key_file)
+        os.makedirs(data_dir, exist_ok=True)
+        staging = os.path.join(data_dir, 'attachments.restoring')
+        with self.lock.shared():
+            self.load_index()
+            try:
+                data, files, attachments = self.read_snapshot_data(snapshot)
+                if key_text is not None:
+                    files[KEY_FILE] = key_text
+                if attachments:
+                    self.restore_attachments(attachments, staging)
+            finally:
+                self.close_packs()
+
+        existing = existing_vault_files(data_dir)
+        aside = os.path.join(data_dir, f"pre-restore-{snapshot['id']}")
+        vault_lock = VaultLock(os.path.join(data_dir, 'vault.lock'))
+        try:
+            with vault_lock.exclusive():
+                if existing:
+                    os.makedirs(aside, exist_ok=True)
+                    for name in existing:
+                        os.replace(os.path.join(data_dir, name), os.path.join(aside, name))
+                for name, content in files.items():
+                    write_file_atomic(os.path.join(data_dir, name), content)
+                if attachments:
+                    os.replace(staging, os.path.join(data_dir, 'attachments'))
+                layout = storage or snapshot['storage']
+                target = create_storage(layout, data_dir, os.path.join(data_dir, 'legacy_data.json'))
+                try:
+                    target.save(data)
+                except OSError as e:
+                    moved = f"; the previous vault files are in {aside}" if existing else ''
+                    raise BackupError(f"Failed to write the restored vault to {data_dir} ({e}){moved}") from e
+                finally:
+                    target.close()
+                write_layout(data_dir, layout)
+                # 開著這個 vault 的行程會察覺世代改變並重新載入
+                vault_lock.bump()
+        finally:
+            vault_lock.close()
+        return sum(len(entries) for entries in data.values())
+
+    # ---- 清理 ----
+    def prune(self, policy, dry_run=False):
+        """Forget the snapshots ``policy`` does not keep and reclaim their space.
+
+        Packs whose objects are all unused are deleted; packs that are
+        mostly unused are rewritten with the objects still referenced.
+        """
+        if not any(policy.values()):
+            raise BackupError("Refusing to remove every snapshot; give at least one --keep option")
+        self.check_exists()
+        with self.lock.exclusive():
+            snapshots = self.list_snapshots()
+            keep = select_snapshots(snapshots, policy)
+            forget = [snapshot for snapshot in snapshots if snapshot['id'] not in keep]
+            stats = {'kept': len(keep), 'forgotten': [snapshot['id'] for snapshot in forget],
+                     'deleted_packs': 0, 'repacked': 0, 'freed_bytes': 0}
+            if dry_run:
+                return stats
+            for snapshot in forget:
+                os.remove(self.snapshot_path(snapshot['id']))
+            try:
+                self.sweep([snapshot for snapshot in snapshots if snapshot['id'] in keep], stats)
+            finally:
+                self.close_packs()
+        return stats
+
+    def sweep(self, snapshots, stats):
+        self.load_index()
+        live = set()
+        for snapshot in snapshots:
+            if snapshot['root'] in live:
+                continue
+            live.add(snapshot['root'])
+            root = self.read_root(snapshot)
+            live.update(root['files'].values())
+            for pieces in root.get('attachments', {}).values():
+                live.update(pieces)
+            for buckets in root['trees'].values():
+                for tree_digest in buckets.values():
+                    if tree_digest not in live:
+                        live.add(tree_digest)
+                        live.update(json.loads(self.read_object(tree_digest)).values())
+
+        for name in os.listdir(self.pack_dir):
+            pack_id, extension = os.path.splitext(name)
+            # 中斷的備份留下沒有索引的 pack 與暫存檔
+            if extension == '.tmp' or (extension == '.pack'
+                                       and not os.path.exists(os.path.join(self.pack_dir, pack_id + '.idx'))):
+                path = os.path.join(self.pack_dir, name)
+                stats['freed_bytes'] += os.path.getsize(path)
+                os.remove(path)
+
+        for pack_id in self.pack_ids():
+            offsets = self.read_pack_index(pack_id)
+            dead = {digest for digest in offsets if digest not in live}
+            if not dead:
+                continue
+            pack_path = os.path.join(self.pack_dir, pack_id + '.pack')
+            size = os.path.getsize(pack_path)
+            kept_size = 0
+            if len(dead) < len(offsets):
+                dead_bytes = sum(offsets[digest][1] for digest in dead)
+                if dead_bytes / size < REPACK_RATIO:
+                    continue
+                # 把仍在使用的物件複製到新的 pack，新的索引寫好後才刪除舊的
+                writer = PackWriter(self.pack_dir)
+                for digest, (offset, length) in offsets.items():
+                    if digest not in dead:
+                        writer.add_payload(digest, self.read_from_pack(pack_id, offset, length))
+                writer.close()
+                kept_size = writer.size
+                stats['repacked'] += 1
+            else:
+                stats['deleted_packs'] += 1
+            f = self.pack_files.pop(pack_id, None)
+            if f is not None:
+                f.close()
+            os.remove(os.path.join(self.pack_dir, pack_id + '.idx'))
+            os.remove(pack_path)
+            stats['freed_bytes'] += size - kept_size
@@ -0,0 +1,78 @@
+# crypto_keeper/model/cache.py
+import threading
+import time
+from collections import OrderedDict
+
+
+class DecryptCache:
+    """LRU cache of decrypted plaintexts bounded by entry count, bytes and TTL.
+
+    Plaintexts only live in memory for ``ttl`` seconds; call :meth:`purge` on
+    lock/idle events to drop them immediately.
+    """
+
+    def __init__(self, max_entries=256, max_bytes=1024 * 1024, ttl=300, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = OrderedDict()  # key -> (value, size, expires_at)
+        self.total_bytes = 0
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at <= self.clock():
+                self.remove(key)
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes or self.max_entries <= 0:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+            self.entries[key] = (value, size, self.clock() + self.ttl)
+            self.total_bytes += size
+            # 超過數量或容量時從最久未使用的開始淘汰
+            while len(self.entries) > self.max_entries or self.total_bytes > self.max_bytes:
+                oldest = next(iter(self.entries))
+                self.remove(oldest)
+                self.evictions += 1
+
+    def remove(self, key):
+        value, size, _ = self.entries.pop(key)
+        self.total_bytes -= size
+
+    def invalidate(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.remove(key)
+
+    def purge(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+    def stats(self):
+        with self.lock:
+            return {
+                'entries': len(self.entries),
+                'bytes': self.total_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,312 @@
+# crypto_keeper/model/crypto.py
+import os
+import base64
+import itertools
+import collections
+import threading
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from model import record
+
+BLOCK_BYTES = algorithms.AES.block_size // 8
+
+# 紀錄格式：沒有前綴的是原本的 base64(iv + CBC 密文)；
+# 'v2:' + base64(nonce + GCM 密文與 tag)，並以 category\0identifier 作為 associated data。
+# 'v3:' + base64(分欄位容器，見 record.py)，每個欄位各自以 AES-GCM 加密。
+# base64 不會出現 ':'，前綴不會與舊格式混淆
+V2_PREFIX = 'v2:'
+V3_PREFIX = 'v3:'
+NONCE_BYTES = 12
+
+DEFAULT_CHUNK_SIZE = 1024
+# 批次少於這個數量時直接在目前執行緒處理：實測 10k 筆時 thread pool 與 process pool 加密都比單執行緒慢
+# （約 229k/s 對 123k/s、94k/s），到 100k 筆 thread pool 才追上；只有一顆 CPU 時也不使用 pool
+PARALLEL_MIN_ENTRIES = 100_000
+
+
+def associated_data(category, identifier):
+    # 把密文綁定到項目位置，搬到其他分類或名稱下會無法解密
+    return f"{category}\x00{identifier}".encode('utf-8')
+
+
+def record_version(encrypted_data):
+    if encrypted_data.startswith(V3_PREFIX):
+        return 3
+    return 2 if encrypted_data.startswith(V2_PREFIX) else 1
+
+
+def sealed_fields(encrypted_data):
+    # v3 紀錄中各欄位的 (kind, name, sealed)，不需要金鑰
+    return record.unpack(base64.b64decode(encrypted_data[len(V3_PREFIX):].encode('utf-8')))
+
+
+def attachment_ids(encrypted_data):
+    # 附件 id 是欄位名稱，不解密就能列出；用來清理不再被引用的附件檔案
+    if not encrypted_data.startswith(V3_PREFIX):
+        return []
+    return [name for kind, name, _ in sealed_fields(encrypted_data) if kind == record.FIELD_ATTACHMENT]
+
+
+class RecordCipher:
+    """Record cipher for both vault formats that keeps key setup and scratch buffers.
+
+    With ``associated_data`` :meth:`encrypt` writes authenticated ``v2:``
+    AES-GCM records; without it, the original ``base64(iv + ciphertext)``
+    AES-CBC/PKCS7 format. :meth:`encrypt_fields` writes ``v3:`` records whose
+    fields are sealed one by one. :meth:`decrypt` reads all of them.
+    """
+
+    def __init__(self, key):
+        self.key = key
+        self.algorithm = None
+        self.aead = None
+        self.buffer = bytearray(4096)
+
+    def get_algorithm(self):
+        # 延後到第一次使用才檢查金鑰長度，key.txt 錯誤時與原本一樣在解密時回報
+        if self.algorithm is None:
+            self.algorithm = algorithms.AES(self.key)
+        return self.algorithm
+
+    def get_aead(self):
+        if self.aead is None:
+            self.aead = AESGCM(self.key)
+        return self.aead
+
+    def scratch(self, size):
+        if len(self.buffer) < size + BLOCK_BYTES:
+            self.buffer = bytearray(size + BLOCK_BYTES)
+        return self.buffer
+
+    def encrypt(self, plaintext, associated_data=None):
+        if associated_data is None:
+            return self.encrypt_cbc(plaintext)
+        return V2_PREFIX + base64.b64encode(self.seal(plaintext, associated_data)).decode('utf-8')
+
+    def decrypt(self, encrypted_data, associated_data=None):
+        if encrypted_data.startswith(V3_PREFIX):
+            # 分欄位紀錄以 JSON 文字回傳給只處理單一字串的呼叫端
+            return record.to_json(self.decrypt_fields(encrypted_data, associated_data))
+        if not encrypted_data.startswith(V2_PREFIX):
+            return self.decrypt_cbc(encrypted_data)
+        if associated_data is None:
+            raise ValueError("A v2 record can only be decrypted with its category and identifier.")
+        raw = base64.b64decode(encrypted_data[len(V2_PREFIX):].encode('utf-8'))
+        return self.open_sealed(raw, associated_data)
+
+    def seal(self, plaintext, associated_data):
+        nonce = os.urandom(NONCE_BYTES)
+        return nonce + self.get_aead().encrypt(nonce, plaintext.encode('utf-8'), associated_data)
+
+    def open_sealed(self, sealed, associated_data):
+        try:
+            plaintext = self.get_aead().decrypt(sealed[:NONCE_BYTES], sealed[NONCE_BYTES:], associated_data)
+        except InvalidTag:
+            raise ValueError("Authentication failed: the record was modified or belongs to another entry.")
+        return plaintext.decode('utf-8')
+
+    def encrypt_fields(self, items, associated_data, sealed_items=()):
+        # items: [(kind, name, value)]；sealed_items 為同一項目中沿用的欄位密文 [(kind, name, sealed)]
+        sealed = list(sealed_items)
+        sealed.extend(
+            (kind, name, self.seal(value, record.field_associated_data(associated_data, kind, name)))
+            for kind, name, value in items
+        )
+        return V3_PREFIX + base64.b64encode(record.pack(sealed)).decode('utf-8')
+
+    def decrypt_fields(self, encrypted_data, associated_data, select=None, kind=None):
+        """Return ``[(kind, name, value)]`` from a ``v3:`` record.
+
+        With ``select=(kind, name)`` only that field is decrypted, and with
+        ``kind`` only the fields of that kind; the other fields are skipped by
+        their length prefix.
+        """
+        if associated_data is None:
+            raise ValueError("A v3 record can only be decrypted with its category and identifier.")
+        items = []
+        for field_kind, name, sealed in sealed_fields(encrypted_data):
+            if select is not None and (field_kind, name) != select:
+                continue
+            if kind is not None and field_kind != kind:
+                continue
+            aad = record.field_associated_data(associated_data, field_kind, name)
+            items.append((field_kind, name, self.open_sealed(sealed, aad)))
+        return items
+
+    def decrypt_field(self, encrypted_data, category, identifier, field):
+        # 預設欄位優先，其次為同名的自定義欄位；舊格式的紀錄依分類欄位定義拆開後查找
+        aad = associated_data(category, identifier)
+        if record_version(encrypted_data) == 3:
+            for kind in (record.FIELD_DEFAULT, record.FIELD_CUSTOM):
+                items = self.decrypt_fields(encrypted_data, aad, select=(kind, field))
+                if items:
+                    return items[0][2]
+            return None
+        return record.find_field(*record.parse_legacy(category, self.decrypt(encrypted_data, aad)), field)
+
+    def encrypt_cbc(self, plaintext):
+        iv = os.urandom(16)
+        data = plaintext.encode('utf-8')
+        pad = BLOCK_BYTES - len(data) % BLOCK_BYTES
+        data += bytes((pad,)) * pad
+
+        encryptor = Cipher(self.get_algorithm(), modes.CBC(iv)).encryptor()
+        buffer = self.scratch(len(data))
+        written = encryptor.update_into(data, buffer)
+        encryptor.finalize()
+        return base64.b64encode(iv + bytes(buffer[:written])).decode('utf-8')
+
+    def decrypt_cbc(self, encrypted_data):
+        raw = base64.b64decode(encrypted_data.encode('utf-8'))
+        iv, body = raw[:16], raw[16:]
+        if not body or len(body) % BLOCK_BYTES:
+            raise ValueError("The length of the provided data is not a multiple of the block length.")
+
+        decryptor = Cipher(self.get_algorithm(), modes.CBC(iv)).decryptor()
+        buffer = self.scratch(len(body))
+        written = decryptor.update_into(body, buffer)
+        decryptor.finalize()
+
+        pad = buffer[written - 1]
+        if not 1 <= pad <= BLOCK_BYTES or buffer[written - pad:written] != bytes((pad,)) * pad:
+            raise ValueError("Invalid padding bytes.")
+        return bytes(buffer[:written - pad]).decode('utf-8')
+
+
+# ---- process pool 的工作函式，每個子行程只建立一次 RecordCipher ----
+_worker_cipher = None
+_worker_new_cipher = None
+
+
+def _init_worker(key, new_key=None):
+    global _worker_cipher, _worker_new_cipher
+    _worker_cipher = RecordCipher(key)
+    _worker_new_cipher = RecordCipher(new_key) if new_key is not None else None
+
+
+def _encrypt_chunk(chunk, cipher=None, new_cipher=None):
+    # plaintext 為 [(kind, name, value)] 時寫成 v3 分欄位紀錄
+    cipher = cipher or _worker_cipher
+    return [
+        (category, identifier, cipher.encrypt(plaintext, associated_data(category, identifier))
+         if isinstance(plaintext, str) else cipher.encrypt_fields(plaintext, associated_data(category, identifier)))
+        for category, identifier, plaintext in chunk
+    ]
+
+
+def _decrypt_chunk(chunk, cipher=None, new_cipher=None):
+    cipher = cipher or _worker_cipher
+    results = []
+    for category, identifier, encrypted_data in chunk:
+        try:
+            results.append((category, identifier, cipher.decrypt(encrypted_data, associated_data(category, identifier))))
+        except (ValueError, UnicodeDecodeError):
+            results.append((category, identifier, None))
+    return results
+
+
+def _reencrypt_chunk(chunk, cipher=None, new_cipher=None):
+    # 以舊金鑰解密後立即以新金鑰加密，明文不離開 worker；舊的 CBC 紀錄同時升級為 v2
+    cipher = cipher or _worker_cipher
+    new_cipher = new_cipher or _worker_new_cipher
+    results = []
+    for category, identifier, encrypted_data in chunk:
+        aad = associated_data(category, identifier)
+        try:
+            if record_version(encrypted_data) == 3:
+                reencrypted = new_cipher.encrypt_fields(cipher.decrypt_fields(encrypted_data, aad), aad)
+            else:
+                reencrypted = new_cipher.encrypt(cipher.decrypt(encrypted_data, aad), aad)
+            results.append((category, identifier, reencrypted))
+        except (ValueError, UnicodeDecodeError):
+            results.append((category, identifier, None))
+    return results
+
+
+def _chunks(entries, chunk_size):
+    iterator = iter(entries)
+    while True:
+        chunk = list(itertools.islice(iterator, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def execution_path(count, workers=None, use_processes=False):
+    """Return 'serial', 'threads' or 'processes': how a batch of ``count`` entries is run."""
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or count < PARALLEL_MIN_ENTRIES:
+        return 'serial'
+    return 'processes' if use_processes else 'threads'
+
+
+def _run(worker, key, entries, workers, chunk_size, use_processes, new_key=None):
+    workers = workers or os.cpu_count() or 1
+    chunks = _chunks(entries, chunk_size)
+    # 先讀入到門檻為止的 chunk 來決定路徑，較大的批次仍然串流處理
+    head = []
+    if workers > 1:
+        head = list(itertools.islice(chunks, -(-PARALLEL_MIN_ENTRIES // chunk_size)))
+    path = execution_path(sum(len(chunk) for chunk in head), workers, use_processes)
+
+    if path == 'serial':
+        cipher = RecordCipher(key)
+        new_cipher = RecordCipher(new_key) if new_key is not None else None
+        for chunk in itertools.chain(head, chunks):
+            yield from worker(chunk, cipher, new_cipher)
+        return
+
+    # concurrent.futures 匯入成本不低，只在需要平行處理時載入，讓 CLI 啟動維持快速
+    from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+    if use_processes:
+        executor = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(key, new_key))
+        submit = lambda chunk: executor.submit(worker, chunk)
+    else:
+        # 每個執行緒各自持有 RecordCipher，避免共用 scratch buffer
+        local = threading.local()
+
+        def task(chunk):
+            if not hasattr(local, 'cipher'):
+                local.cipher = RecordCipher(key)
+                local.new_cipher = RecordCipher(new_key) if new_key is not None else None
+            return worker(chunk, local.cipher, local.new_cipher)
+
+        executor = ThreadPoolExecutor(workers)
+        submit = lambda chunk: executor.submit(task, chunk)
+
+    # 限制進行中的 chunk 數量，讓記憶體維持固定並依輸入順序串流輸出
+    with executor:
+        in_flight = collections.deque()
+        for chunk in itertools.chain(head, chunks):
+            in_flight.append(submit(chunk))
+            if len(in_flight) >= workers * 2:
+                yield from in_flight.popleft().result()
+        while in_flight:
+            yield from in_flight.popleft().result()
+
+
+def encrypt_many(key, entries, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, use_processes=False):
+    """Yield ``(category, identifier, encrypted_data)`` for each ``(category, identifier, plaintext)``.
+
+    ``plaintext`` may also be a list of ``(kind, name, value)`` field items,
+    which are written as a ``v3:`` per-field record.
+    """
+    return _run(_encrypt_chunk, key, entries, workers, chunk_size, use_processes)
+
+
+def decrypt_many(key, entries, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, use_processes=False):
+    """Yield ``(category, identifier, plaintext)`` for each ``(category, identifier, encrypted_data)``.
+
+    Records that fail to decrypt yield ``None`` as plaintext instead of raising.
+    """
+    return _run(_decrypt_chunk, key, entries, workers, chunk_size, use_processes)
+
+
+def reencrypt_many(key, new_key, entries, workers=None, chunk_size=DEFAULT_CHUNK_SIZE, use_processes=False):
+    """Yield ``(category, identifier, encrypted_data)`` re-encrypted from ``key`` to ``new_key``.
+
+    Records that fail to decrypt under ``key`` yield ``None`` instead of raising.
+    """
+    return _run(_reencrypt_chunk, key, entries, workers, chunk_size, use_processes, new_key)
@@ -0,0 +1,125 @@
+# crypto_keeper/model/kdf.py
+# 以 passphrase 保護資料金鑰：scrypt 由 passphrase 衍生出 key-encryption key (KEK)，
+# 再以 AES-GCM 包裝 vault 的資料金鑰並存放在 vault_header.json。
+# 更換 passphrase 只需要重新包裝金鑰，不必重新加密所有項目。
+import os
+import json
+import time
+import hashlib
+from cryptography.hazmat.primitives.kdf.scrypt import Scrypt
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+from model.storage import write_json_atomic
+
+HEADER_VERSION = 1
+WRAP_AAD = b'crypto-keeper-vault-key'
+
+# scrypt 的 n 範圍與記憶體上限（128 * r * n bytes）
+MIN_LOG2_N = 14
+MAX_LOG2_N = 22
+DEFAULT_MAX_MEMORY = 256 * 1024 * 1024
+DEFAULT_TARGET_SECONDS = 0.5
+
+# 同一個行程內已衍生過的 KEK，避免每次開啟 vault 都重新執行 scrypt
+_session_keys = {}
+
+
+class PassphraseError(ValueError):
+    pass
+
+
+def derive_kek(passphrase, salt, n, r, p, use_cache=True):
+    cache_key = (salt, n, r, p, hashlib.sha256(salt + passphrase.encode('utf-8')).digest())
+    if use_cache and cache_key in _session_keys:
+        return _session_keys[cache_key]
+
+    kek = Scrypt(salt=salt, length=32, n=n, r=r, p=p).derive(passphrase.encode('utf-8'))
+    if use_cache:
+        _session_keys[cache_key] = kek
+    return kek
+
+
+def forget_session_keys(salt=None):
+    # salt 為 None 時清除全部，否則只清除該 vault 的 KEK
+    if salt is None:
+        _session_keys.clear()
+        return
+    for cache_key in [cache_key for cache_key in _session_keys if cache_key[0] == salt]:
+        del _session_keys[cache_key]
+
+
+def time_scrypt(n, r, p):
+    start = time.perf_counter()
+    Scrypt(salt=os.urandom(16), length=32, n=n, r=r, p=p).derive(b'calibration')
+    return time.perf_counter() - start
+
+
+def calibrate(target_seconds=DEFAULT_TARGET_SECONDS, r=8, p=1, max_memory=DEFAULT_MAX_MEMORY, verbose=False):
+    """Pick the largest scrypt ``n`` whose unlock time stays within ``target_seconds``.
+
+    Cost doubles with each step of ``n``, so the search starts at the minimum
+    and stops as soon as the next step would exceed the target or the memory
+    limit. Returns the chosen parameters and the measured time.
+    """
+    log2_n = MIN_LOG2_N
+    elapsed = time_scrypt(2 ** log2_n, r, p)
+    if verbose:
+        print(f"n=2^{log2_n}: {elapsed * 1000:.0f} ms")
+
+    while log2_n < MAX_LOG2_N:
+        next_n = 2 ** (log2_n + 1)
+        # 下一階大約是兩倍時間，預估超過目標就不用實際量測
+        if elapsed * 2 > target_seconds or 128 * r * next_n > max_memory:
+            break
+        log2_n += 1
+        elapsed = time_scrypt(next_n, r, p)
+        if verbose:
+            print(f"n=2^{log2_n}: {elapsed * 1000:.0f} ms")
+
+    return {'kdf': 'scrypt', 'n': 2 ** log2_n, 'r': r, 'p': p, 'seconds': elapsed}
+
+
+def create_header(data_key, passphrase, params):
+    salt = os.urandom(16)
+    kek = derive_kek(passphrase, salt, params['n'], params['r'], params['p'])
+    nonce = os.urandom(12)
+    wrapped = AESGCM(kek).encrypt(nonce, data_key, WRAP_AAD)
+    return {
+        'version': HEADER_VERSION,
+        'kdf': 'scrypt',
+        'salt': salt.hex(),
+        'n': params['n'],
+        'r': params['r'],
+        'p': params['p'],
+        'wrapped_key': (nonce + wrapped).hex(),
+    }
+
+
+def unlock(header, passphrase, use_cache=True):
+    if header.get('kdf') != 'scrypt':
+        raise PassphraseError(f"Unsupported KDF: {header.get('kdf')}")
+    kek = derive_kek(passphrase, bytes.fromhex(header['salt']), header['n'], header['r'], header['p'], use_cache)
+    blob = bytes.fromhex(header['wrapped_key'])
+    try:
+        return AESGCM(kek).decrypt(blob[:12], blob[12:], WRAP_AAD)
+    except InvalidTag:
+        raise PassphraseError("Wrong passphrase")
+
+
+def benchmark_unlock(header, passphrase, rounds=3):
+    # 量測實際解鎖時間（不使用 session 快取）
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        unlock(header, passphrase, use_cache=False)
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def load_header(path):
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_header(path, header):
+    write_json_atomic(path, header)
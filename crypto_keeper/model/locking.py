@@ -0,0 +1,85 @@
+# crypto_keeper/model/locking.py
+# 多個行程共用同一個 vault 時的 advisory lock 與世代計數（CryptoKeeperData/vault.lock）。
+# 讀取 vault 取得共享鎖，可以同時進行；寫入取得獨佔鎖，在鎖內確認記憶體中的資料仍是最新世代，
+# 過期時先逐項合併磁碟上的變更再寫入，寫完遞增世代。
+# 沒有 fcntl 的平台（Windows）鎖不做事，仍以世代與檔案簽章偵測過期的資料。
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# 世代以固定寬度寫在檔案開頭，原地覆寫不需要截斷
+GENERATION_WIDTH = 20
+
+
+class VaultLock:
+    """Shared/exclusive ``flock`` on a lock file that also stores the write generation.
+
+    Locks are reentrant within a process: a nested ``shared()`` or
+    ``exclusive()`` inside a held lock keeps the outer mode.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.fd = None
+        self.depth = 0
+        # flock 以 open file description 為單位，同一行程的執行緒之間另以 RLock 互斥
+        self.thread_lock = threading.RLock()
+        self.owner = None
+
+    def open(self):
+        if self.fd is None:
+            self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        return self.fd
+
+    @contextmanager
+    def hold(self, operation):
+        with self.thread_lock:
+            if self.depth == 0 and fcntl is not None:
+                fcntl.flock(self.open(), operation)
+            self.depth += 1
+            self.owner = threading.get_ident()
+            try:
+                yield self
+            finally:
+                self.depth -= 1
+                if self.depth == 0:
+                    self.owner = None
+                    if fcntl is not None:
+                        fcntl.flock(self.fd, fcntl.LOCK_UN)
+
+    def held(self):
+        # 目前的執行緒是否持有這個鎖
+        return self.owner == threading.get_ident()
+
+    def shared(self):
+        return self.hold(fcntl.LOCK_SH if fcntl is not None else None)
+
+    def exclusive(self):
+        return self.hold(fcntl.LOCK_EX if fcntl is not None else None)
+
+    def generation(self):
+        # 每次寫入遞增；讀取只需一次小的 read，不需要鎖
+        fd = self.open()
+        os.lseek(fd, 0, os.SEEK_SET)
+        try:
+            return int(os.read(fd, GENERATION_WIDTH) or 0)
+        except ValueError:
+            return 0
+
+    def bump(self):
+        # 只在獨佔鎖內呼叫
+        generation = self.generation() + 1
+        fd = self.open()
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, str(generation).rjust(GENERATION_WIDTH).encode('ascii'))
+        return generation
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
@@ -0,0 +1,175 @@
+# crypto_keeper/model/metrics.py
+# 熱點路徑的計時與計數。停用時（預設）被量測的方法就是原本的函式，沒有任何額外成本；
+# enable() 才把登記過的方法換成計時的包裝，disable() 再換回來。
+# 讀寫 bytes 由 storage 在 `if metrics.ENABLED:` 之後回報，停用時只多一次全域變數判斷。
+#
+#   CRYPTO_KEEPER_METRICS=1 python main.py      # 啟動時就啟用
+#   CRYPTO_KEEPER_METRICS_FILE=/var/lib/node_exporter/crypto_keeper.prom python main.py   # 結束時寫出
+#   metrics.enable(); ...; print(metrics.to_prometheus())
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+
+# 延遲直方圖的上界（秒），與 Prometheus histogram 的 le 相同
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+ENABLED = False
+
+_lock = threading.Lock()
+_timers = {}  # name -> Timer
+_counters = {}
+_targets = []  # (cls, attribute, metric name, original function)
+
+
+class Timer:
+    __slots__ = ('buckets', 'count', 'total', 'max')
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+
+def observe(name, seconds):
+    with _lock:
+        timer = _timers.get(name)
+        if timer is None:
+            timer = _timers[name] = Timer()
+        timer.observe(seconds)
+
+
+def add(name, amount=1):
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + amount
+
+
+def timed(name, func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observe(name, time.perf_counter() - start)
+    return wrapper
+
+
+def instrument(cls, *attributes, prefix):
+    """Register ``cls`` methods to be timed as ``<prefix>.<attribute>`` while metrics are enabled."""
+    for attribute in attributes:
+        target = (cls, attribute, f'{prefix}.{attribute}', cls.__dict__[attribute])
+        _targets.append(target)
+        if ENABLED:
+            setattr(cls, attribute, timed(target[2], target[3]))
+
+
+def enable():
+    global ENABLED
+    if ENABLED:
+        return
+    ENABLED = True
+    for cls, attribute, name, original in _targets:
+        setattr(cls, attribute, timed(name, original))
+
+
+def disable():
+    global ENABLED
+    if not ENABLED:
+        return
+    ENABLED = False
+    for cls, attribute, name, original in _targets:
+        setattr(cls, attribute, original)
+
+
+def reset():
+    with _lock:
+        _timers.clear()
+        _counters.clear()
+
+
+def snapshot():
+    with _lock:
+        timers = {
+            name: {
+                'count': timer.count,
+                'sum_s': timer.total,
+                'max_s': timer.max,
+                'mean_s': timer.total / timer.count if timer.count else 0.0,
+                # 累計數量，與 Prometheus 的 bucket 相同
+                'buckets': dict(zip([str(bound) for bound in BUCKETS] + ['+Inf'], _cumulative(timer.buckets))),
+            }
+            for name, timer in _timers.items()
+        }
+        return {'enabled': ENABLED, 'timers': timers, 'counters': dict(_counters)}
+
+
+def _cumulative(counts):
+    total = 0
+    result = []
+    for count in counts:
+        total += count
+        result.append(total)
+    return result
+
+
+def to_json():
+    return json.dumps(snapshot(), indent=4, sort_keys=True)
+
+
+def to_prometheus():
+    # Prometheus text exposition format，可交給 node_exporter 的 textfile collector
+    data = snapshot()
+    lines = [
+        '# HELP crypto_keeper_call_duration_seconds Time spent in instrumented Crypto Keeper calls.',
+        '# TYPE crypto_keeper_call_duration_seconds histogram',
+    ]
+    for name in sorted(data['timers']):
+        timer = data['timers'][name]
+        for bound, count in timer['buckets'].items():
+            lines.append(f'crypto_keeper_call_duration_seconds_bucket{{op="{name}",le="{bound}"}} {count}')
+        lines.append(f'crypto_keeper_call_duration_seconds_sum{{op="{name}"}} {timer["sum_s"]:.9f}')
+        lines.append(f'crypto_keeper_call_duration_seconds_count{{op="{name}"}} {timer["count"]}')
+    for name in sorted(data['counters']):
+        metric = 'crypto_keeper_' + name.replace('.', '_')
+        lines.append(f'# TYPE {metric} counter')
+        lines.append(f'{metric} {data["counters"][name]}')
+    return '\n'.join(lines) + '\n'
+
+
+def _write_atomic(path, text):
+    # 先寫暫存檔再 rename，collector 不會讀到寫到一半的檔案
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def write_textfile(path):
+    _write_atomic(path, to_prometheus())
+
+
+def write_json(path):
+    _write_atomic(path, to_json() + '\n')
+
+
+def write_file(path):
+    # 副檔名為 .json 時寫 JSON，其他一律為 Prometheus textfile
+    if path.endswith('.json'):
+        write_json(path)
+    else:
+        write_textfile(path)
+
+
+if os.environ.get('CRYPTO_KEEPER_METRICS') or os.environ.get('CRYPTO_KEEPER_METRICS_FILE'):
+    enable()
@@ -1,17 +1,24 @@
 # crypto_keeper/model/model.py
 import os
 import sys
-from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
-from cryptography.hazmat.primitives import padding
 import json
-import base64
-import platform
+import time
+import shutil
+import functools
+from contextlib import contextmanager, nullcontext
+from model.storage import create_storage, detect_storage, read_layout, write_layout
+from model.rotation import KeyRotation, fingerprint
+from model.locking import VaultLock
+from model.profiles import profile_dir
+from model import attachment, crypto, record, metrics
 
+@functools.lru_cache(maxsize=None)
 def get_app_dir():
+    # 結果在行程中不會改變，只探測一次標記檔
     base_path = os.path.dirname(sys.executable if getattr(sys, 'frozen', False) else os.path.abspath(__file__))
 
     # 檢查是否在 macOS 的 .app 包内
-    if base_path.endswith('MacOS') and platform.system() == 'Darwin':
+    if base_path.endswith('MacOS') and sys.platform == 'darwin':
         # 向上三级是.app外
         return os.path.abspath(os.path.join(base_path, os.pardir, os.pardir, os.pardir))
     elif os.path.exists(os.path.join(base_path, 'exe_marker.txt')):
@@ -29,111 +36,730 @@ def get_app_dir():
     return base_path  # 默認返回當前路徑
 
 class LegacyModel:
-    def __init__(self, key_file='key.txt', data_file='legacy_data.json'):
-        app_dir = get_app_dir()
-        data_dir = os.path.join(app_dir, 'CryptoKeeperData')
+    # storage: 'json' 每次寫入整份 legacy_data.json；'journal' 以追加日誌記錄每次變更；
+    #          'sharded' 每個分類一個檔案並延遲載入；'auto' 使用 vault_layout.json 記錄的格式，
+    #          指定其他格式時轉換 vault 並更新記錄
+    # data_dir: 預設為程式旁的 CryptoKeeperData 資料夾
+    # cache: 選用的 DecryptCache，快取 decrypt_and_retrieve / retrieve_fields 解密後的明文
+    # passphrase: vault 有 vault_header.json 時用來解開資料金鑰
+    def __init__(self, key_file='key.txt', data_file='legacy_data.json', storage='auto', data_dir=None, cache=None,
+                 passphrase=None, profile=None):
+        # profile 為 model/profiles.py 的 vault 名稱；data_dir 優先
+        if data_dir is None:
+            data_dir = profile_dir(profile)
         if not os.path.exists(data_dir):
             os.makedirs(data_dir)
 
+        self.data_dir = data_dir
         self.key_file = os.path.join(data_dir, key_file)
+        self.header_file = os.path.join(data_dir, 'vault_header.json')
         self.data_file = os.path.join(data_dir, data_file)
-        
-        self.load_key_and_data()
+        self.attachments_dir = os.path.join(data_dir, 'attachments')
+        # 多個行程共用 vault：讀取取得共享鎖，寫入取得獨佔鎖並在過期時先合併其他行程的變更
+        self.vault_lock = VaultLock(os.path.join(data_dir, 'vault.lock'))
+        self.storage = self.create_storage(storage)
+        self.loaded_generation = None
+        # 在 batch() 內累積的變更，離開時一次寫入
+        self.pending_changes = None
+        self.undo_log = None
+        # 被覆蓋或刪除的紀錄不再引用的附件 id，寫入 vault 後才刪除檔案
+        self.detached_attachments = []
+        self.cache = cache
+        # 變更通知：callback(changes)，changes 為 [(category, identifier, encrypted_data or None)]，
+        # 整個 vault 重新載入時為 None
+        self.listeners = []
 
-    def load_key_and_data(self):
-        if os.path.exists(self.key_file):
+        self.load_key_and_data(passphrase)
+
+    def create_storage(self, storage):
+        # 開啟時記下格式，之後以 'auto' 開啟的行程都使用同一種格式
+        layout = self.detect_storage()
+        if storage == 'auto':
+            storage = layout
+        elif storage != layout:
+            self.convert_storage(layout, storage)
+        if read_layout(self.data_dir) != storage:
+            write_layout(self.data_dir, storage)
+        return create_storage(storage, self.data_dir, self.data_file, self.vault_lock)
+
+    def convert_storage(self, layout, storage):
+        # json 與 journal 共用 legacy_data.json：改為單檔前先把日誌寫回快照；
+        # 分片 vault 的單檔已改名為 .pre-shard，不能再以其他格式開啟
+        if layout == 'sharded':
+            raise ValueError(f"{self.data_dir} uses the sharded layout and cannot be opened as '{storage}'")
+        if layout == 'journal' and storage == 'json':
+            journal = create_storage('journal', self.data_dir, self.data_file, self.vault_lock)
+            with self.vault_lock.exclusive():
+                journal.save(journal.load())
+                self.vault_lock.bump()
+            journal.close()
+
+    def detect_storage(self):
+        return detect_storage(self.data_dir, self.data_file)
+
+    def uses_passphrase(self):
+        return os.path.exists(self.header_file)
+
+    def load_key_and_data(self, passphrase=None):
+        if self.uses_passphrase():
+            # 延後匯入，未使用 passphrase 的 vault 不需要載入 KDF
+            from model import kdf
+            if passphrase is None:
+                raise kdf.PassphraseError("This vault is protected by a passphrase")
+            self.key = kdf.unlock(kdf.load_header(self.header_file), passphrase)
+        elif os.path.exists(self.key_file):
             with open(self.key_file, 'r') as f:
                 self.key = bytes.fromhex(f.read())
         else:
             self.key = os.urandom(32)
             with open(self.key_file, 'w') as f:
                 f.write(self.key.hex())
+        self.cipher = crypto.RecordCipher(self.key)
 
         self.data = {}
-        if os.path.exists(self.data_file):
-            self.load_data()
+        rotation = KeyRotation(self.data_dir)
+        state = rotation.load_state()
+        if state is not None and state['phase'] == 'commit':
+            # 上次輪替在寫回 vault 時中斷，所有項目都已重新加密，直接完成
+            with self.vault_lock.exclusive():
+                self.finish_rotation(rotation, state, self.rotation_key(state, passphrase), rotation.completed())
+            return
+        self.load_data()
 
     def load_data(self):
-        try:
-            with open(self.data_file, 'r') as f:
-                self.data = json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
-            print(f"Error loading from file: {e}")
-
-
-
-    def encrypt_data(self, plaintext):
-        # Generate a new random IV
-        iv = os.urandom(16)
-        cipher = Cipher(algorithms.AES(self.key), modes.CBC(iv))
-        encryptor = cipher.encryptor()
-        
-        # Prepare the plaintext for encryption
-        padder = padding.PKCS7(algorithms.AES.block_size).padder()
-        padded_data = padder.update(plaintext.encode('utf-8')) + padder.finalize()
-        
-        # Encrypt the data
-        encrypted_data = encryptor.update(padded_data) + encryptor.finalize()
-        
-        # Return the IV along with the encrypted data, here encoded in base64
-        return base64.b64encode(iv + encrypted_data).decode('utf-8')
-
-    def decrypt_data(self, encrypted_data):
-        # Decode the data from base64
-        encrypted_data_with_iv = base64.b64decode(encrypted_data.encode('utf-8'))
-        
-        # Extract the IV and encrypted data
-        iv = encrypted_data_with_iv[:16]
-        encrypted_data = encrypted_data_with_iv[16:]
-        
-        # Create a Cipher object using the extracted IV
-        cipher = Cipher(algorithms.AES(self.key), modes.CBC(iv))
-        decryptor = cipher.decryptor()
-        
-        # Decrypt and depad the data
-        decrypted_data = decryptor.update(encrypted_data) + decryptor.finalize()
-        unpadder = padding.PKCS7(algorithms.AES.block_size).unpadder()
-        unpadded_data = unpadder.update(decrypted_data) + unpadder.finalize()
-        
-        return unpadded_data.decode('utf-8')
+        with self.vault_lock.shared():
+            self.loaded_generation = self.vault_lock.generation()
+            self.loaded_signature = self.storage.signature()
+            self.data = self.storage.load()
+        self.purge_cache()
+        self.notify(None)
+
+    def is_stale(self):
+        # 其他行程在我們載入或寫入之後寫過 vault；不經過 LegacyModel 的寫入由檔案簽章察覺
+        return (self.vault_lock.generation() != self.loaded_generation
+                or self.storage.signature() != self.loaded_signature)
+
+    def reload_if_changed(self):
+        # 其他行程寫入 vault 時重新載入，只通知實際變動的項目；回傳是否有項目變動
+        if self.pending_changes is not None or not self.is_stale():
+            return False
+        with self.vault_lock.shared():
+            self.loaded_generation = self.vault_lock.generation()
+            self.loaded_signature = self.storage.signature()
+            self.data, changes = self.storage.reload(self.data)
+        if not changes:
+            return False
+        self.invalidate_cached(changes)
+        self.notify(changes)
+        return True
+
+    def merge_from_disk(self, changes):
+        # 在獨佔鎖內呼叫：重新讀取其他行程寫入的內容，再套用這次的變更；同一項目以這次的變更為準
+        data, disk_changes = self.storage.reload(self.data)
+        ours = set()
+        for category, identifier, encrypted_data in changes:
+            ours.add((category, identifier))
+            if encrypted_data is None:
+                if category in data:
+                    data[category].pop(identifier, None)
+            else:
+                data.setdefault(category, {})[identifier] = encrypted_data
+        self.data = data
+        theirs = [change for change in disk_changes if (change[0], change[1]) not in ours]
+        if theirs:
+            self.invalidate_cached(theirs)
+            self.notify(theirs)
+
+    def write_changes(self, changes):
+        with self.vault_lock.exclusive():
+            if self.is_stale():
+                self.merge_from_disk(changes)
+            self.storage.apply(self.data, changes)
+            self.loaded_generation = self.vault_lock.bump()
+            self.loaded_signature = self.storage.signature()
+        self.remove_detached_attachments()
 
+    def invalidate_cached(self, changes):
+        if self.cache is not None:
+            for category, identifier, _ in changes:
+                self.cache.invalidate((category, identifier))
+
+    def encrypt_data(self, plaintext, category=None, identifier=None):
+        # 指定項目位置時寫入 v2（AES-GCM，綁定 category/identifier），否則為原本的 base64(iv + CBC 密文)
+        if category is None:
+            return self.cipher.encrypt(plaintext)
+        return self.cipher.encrypt(plaintext, crypto.associated_data(category, identifier))
+
+    def decrypt_data(self, encrypted_data, category=None, identifier=None):
+        # 依紀錄版本選擇解密方式；v2 紀錄必須提供項目位置
+        if category is None:
+            return self.cipher.decrypt(encrypted_data)
+        return self.cipher.decrypt(encrypted_data, crypto.associated_data(category, identifier))
+
+    def encrypt_many(self, entries, **kwargs):
+        # entries: iterable of (category, identifier, plaintext)，依序串流回傳 (category, identifier, encrypted_data)
+        return crypto.encrypt_many(self.key, entries, **kwargs)
+
+    def decrypt_many(self, entries=None, **kwargs):
+        # entries: iterable of (category, identifier)，預設為整個 vault；不存在的項目會略過
+        if entries is None:
+            entries = ((category, identifier) for category, items in self.data.items() for identifier in items)
+        records = (
+            (category, identifier, self.data[category][identifier])
+            for category, identifier in entries
+            if identifier in self.data.get(category, {})
+        )
+        return crypto.decrypt_many(self.key, records, **kwargs)
 
     def encrypt_and_store(self, category, identifier, plaintext):
-        encrypted_data = self.encrypt_data(plaintext)
-        if category not in self.data:
-            self.data[category] = {}
-        self.data[category][identifier] = encrypted_data
-        self.save_data()
+        # 每次寫入都使用 v2 格式，舊的 CBC 紀錄在下一次儲存時自然升級
+        self.store_encrypted(category, identifier, self.encrypt_data(plaintext, category, identifier))
+
+    def store_encrypted(self, category, identifier, encrypted_data):
+        # 單筆寫入也是一個 batch，寫入失敗時同樣回滾
+        with self.batch():
+            self.remember_previous(category, identifier)
+            self.detach_attachments(category, identifier, encrypted_data)
+            if category not in self.data:
+                self.data[category] = {}
+            self.data[category][identifier] = encrypted_data
+            self.record_changes([(category, identifier, encrypted_data)])
 
     def decrypt_and_retrieve(self, category, identifier):
+        if self.cache is not None:
+            plaintext = self.cache.get((category, identifier))
+            if plaintext is not None:
+                return plaintext
+
         encrypted_data = self.data[category].get(identifier)
         if encrypted_data:
             try:
-                return self.decrypt_data(encrypted_data)
+                plaintext = self.decrypt_data(encrypted_data, category, identifier)
+                if self.cache is not None:
+                    self.cache.put((category, identifier), plaintext)
+                return plaintext
             except ValueError as e:
-                print(f"Decryption error: {e}")
+                print(f"Decryption error: {e}", file=sys.stderr)
                 return None
         return None
 
+    def store_fields(self, category, identifier, fields, custom_fields=()):
+        # fields: {schema key: value}，custom_fields: [(name, value)]；每個欄位各自加密成一筆 v3 紀錄
+        # 附件由 add_attachment 管理，重新存檔時沿用原本的附件欄位密文
+        items = record.from_fields(fields, custom_fields)
+        kept = self.sealed_attachments(category, identifier)
+        encrypted_data = self.cipher.encrypt_fields(items, crypto.associated_data(category, identifier), kept)
+        self.store_encrypted(category, identifier, encrypted_data)
+
+    def retrieve_fields(self, category, identifier):
+        """Return ``(fields, custom_fields)`` for an entry, or ``None`` if it cannot be decrypted.
+
+        Entries still in the old comma format are split using the category
+        schema; a malformed custom field raises ``ValueError``.
+        """
+        encrypted_data = self.data[category].get(identifier)
+        if not encrypted_data:
+            return None
+        # 經過 decrypt_and_retrieve 的快取，寫入或重新載入時一併失效
+        plaintext = self.decrypt_and_retrieve(category, identifier)
+        if plaintext is None:
+            return None
+        return self.parse_fields(category, encrypted_data, plaintext)
+
+    @staticmethod
+    def parse_fields(category, encrypted_data, plaintext):
+        # v3 紀錄的明文是 record.to_json 的 JSON，舊格式依分類欄位拆開
+        if crypto.record_version(encrypted_data) == 3:
+            return record.from_json(plaintext)
+        return record.parse_legacy(category, plaintext)
+
+    def get_field(self, category, identifier, field):
+        # field 可以是分類預設欄位的 key 或自定義欄位名稱（預設欄位優先）；
+        # 快取中有整筆明文時直接取用，否則 v3 紀錄只解密指定的欄位
+        encrypted_data = self.data.get(category, {}).get(identifier)
+        if not encrypted_data:
+            return None
+        try:
+            plaintext = self.cache.get((category, identifier)) if self.cache is not None else None
+            if plaintext is None:
+                if crypto.record_version(encrypted_data) == 3:
+                    return self.cipher.decrypt_field(encrypted_data, category, identifier, field)
+                # 舊格式本來就要解密整筆，順便放進快取
+                plaintext = self.decrypt_and_retrieve(category, identifier)
+                if plaintext is None:
+                    return None
+            return record.find_field(*self.parse_fields(category, encrypted_data, plaintext), field)
+        except ValueError as e:
+            print(f"Decryption error: {e}", file=sys.stderr)
+            return None
+
+    def migrate_field_records(self, **kwargs):
+        """Convert entries in the old comma format to per-field ``v3:`` records.
+
+        Entries that do not split cleanly into the category's fields (for
+        example single values stored from the CLI) are left unchanged.
+        Returns the number of migrated entries.
+        """
+        legacy = (
+            (category, identifier)
+            for category, entries in self.data.items()
+            for identifier, encrypted_data in entries.items()
+            if crypto.record_version(encrypted_data) != 3
+        )
+        migrated = 0
+        with self.batch():
+            # 先取完解密結果再寫入，避免在走訪 vault 時修改它
+            for category, identifier, plaintext in list(self.decrypt_many(legacy, **kwargs)):
+                if plaintext is None:
+                    continue
+                try:
+                    fields, custom_fields = record.parse_legacy(category, plaintext)
+                except ValueError:
+                    continue
+                if fields or custom_fields:
+                    self.store_fields(category, identifier, fields, custom_fields)
+                    migrated += 1
+        return migrated
+
+    def import_records(self, records, overwrite=False, **kwargs):
+        """Encrypt and store records from :mod:`model.transfer` in a single commit.
+
+        ``records`` is consumed lazily and encrypted in chunks through
+        :func:`crypto.encrypt_many`, so the input is never held in memory;
+        memory still grows with the number of imported entries, which are
+        added to the vault and kept for the rollback until the commit.
+        Existing entries are skipped unless ``overwrite`` is set, and a record
+        repeating an identifier seen earlier in the same input is skipped.
+        Returns ``{'imported': n, 'skipped': n, 'duplicates': n}``.
+        """
+        counts = {'imported': 0, 'skipped': 0, 'duplicates': 0}
+        seen = set()
+
+        def entries():
+            for item in records:
+                category, identifier = item['category'], item['identifier']
+                # 同一個檔案內重複的項目只匯入第一筆
+                if (category, identifier) in seen:
+                    counts['duplicates'] += 1
+                    continue
+                seen.add((category, identifier))
+                if not overwrite and identifier in self.data.get(category, {}):
+                    counts['skipped'] += 1
+                    continue
+                if 'value' in item:
+                    yield category, identifier, item['value']
+                else:
+                    yield category, identifier, record.from_fields(item['fields'], item['custom_fields'])
+
+        with self.batch():
+            for category, identifier, encrypted_data in self.encrypt_many(entries(), **kwargs):
+                self.store_encrypted(category, identifier, encrypted_data)
+                counts['imported'] += 1
+        return counts
+
+    def export_records(self, entries=None, **kwargs):
+        # 依序產生 model.transfer 的紀錄；無法解密的項目 value 為 None
+        for category, identifier, plaintext in self.decrypt_many(entries, **kwargs):
+            if plaintext is not None and crypto.record_version(self.data[category][identifier]) == 3:
+                decoded = json.loads(plaintext)
+                yield {'category': category, 'identifier': identifier,
+                       'fields': decoded['fields'], 'custom_fields': decoded['custom_fields']}
+            else:
+                yield {'category': category, 'identifier': identifier, 'value': plaintext}
+
+    # ---- 附件 ----
+    def attachment_path(self, attachment_id):
+        return os.path.join(self.attachments_dir, attachment_id + attachment.SUFFIX)
+
+    def sealed_attachments(self, category, identifier):
+        encrypted_data = self.data.get(category, {}).get(identifier)
+        if not encrypted_data or crypto.record_version(encrypted_data) != 3:
+            return []
+        try:
+            return [(kind, name, bytes(sealed)) for kind, name, sealed in crypto.sealed_fields(encrypted_data)
+                    if kind == record.FIELD_ATTACHMENT]
+        except ValueError:
+            # 損毀的紀錄讀不出附件，重新存檔時直接取代
+            return []
+
+    def attachment_refs(self, category, identifier):
+        # [(附件 id, {'name', 'size', 'key', 'chunk'})]；只解密附件欄位
+        encrypted_data = self.data.get(category, {}).get(identifier)
+        if not encrypted_data or crypto.record_version(encrypted_data) != 3:
+            return []
+        aad = crypto.associated_data(category, identifier)
+        return record.attachments(self.cipher.decrypt_fields(encrypted_data, aad, kind=record.FIELD_ATTACHMENT))
+
+    def list_attachments(self, category, identifier):
+        return [{'id': attachment_id, 'name': ref['name'], 'size': ref['size']}
+                for attachment_id, ref in self.attachment_refs(category, identifier)]
+
+    def add_attachment(self, category, identifier, source, name=None):
+        """Encrypt ``source`` (a path or a binary file object) as an attachment of an entry.
+
+        The file is streamed through :class:`attachment.AttachmentWriter` into
+        ``attachments/``; the entry only stores its name, size and key. An
+        attachment with the same name is replaced, and a missing entry is
+        created. Entries holding a single value cannot have attachments.
+        """
+        if name is None:
+            name = os.path.basename(source if isinstance(source, str) else getattr(source, 'name', ''))
+        if not name:
+            raise ValueError("An attachment needs a name")
+        items, kept = self.fields_for_update(category, identifier)
+        os.makedirs(self.attachments_dir, exist_ok=True)
+        attachment_id = attachment.new_id()
+        key = os.urandom(32)
+        with open(source, 'rb') if isinstance(source, str) else nullcontext(source) as f:
+            with attachment.AttachmentWriter(self.attachment_path(attachment_id), key) as writer:
+                shutil.copyfileobj(f, writer, attachment.CHUNK_BYTES)
+        ref = {'name': name, 'size': writer.size, 'key': key.hex(), 'chunk': writer.chunk_size}
+        replaced = {attachment_id for attachment_id, old in self.attachment_refs(category, identifier) if old['name'] == name}
+        kept = [item for item in kept if item[0] != record.FIELD_ATTACHMENT or item[1] not in replaced]
+        items.append((record.FIELD_ATTACHMENT, attachment_id, json.dumps(ref)))
+        try:
+            self.store_encrypted(category, identifier,
+                                 self.cipher.encrypt_fields(items, crypto.associated_data(category, identifier), kept))
+        except BaseException:
+            os.remove(self.attachment_path(attachment_id))
+            raise
+        return {'id': attachment_id, 'name': name, 'size': writer.size}
+
+    def fields_for_update(self, category, identifier):
+        # 改寫附件時其他欄位維持不變：v3 紀錄直接沿用密文，舊格式先依分類欄位拆開
+        encrypted_data = self.data.get(category, {}).get(identifier)
+        if not encrypted_data:
+            return [], []
+        if crypto.record_version(encrypted_data) == 3:
+            return [], [(kind, name, bytes(sealed)) for kind, name, sealed in crypto.sealed_fields(encrypted_data)]
+        fields, custom_fields = record.parse_legacy(category, self.decrypt_data(encrypted_data, category, identifier))
+        if not fields and not custom_fields:
+            raise ValueError(f"{category}/{identifier} holds a single value; attachments need an entry with fields")
+        return record.from_fields(fields, custom_fields), []
+
+    def find_attachment(self, category, identifier, name):
+        for attachment_id, ref in self.attachment_refs(category, identifier):
+            if ref['name'] == name or attachment_id == name:
+                return attachment_id, ref
+        raise KeyError(f"No attachment '{name}' in {category}/{identifier}")
+
+    def open_attachment(self, category, identifier, name):
+        """Return a seekable binary file object with the plaintext of an attachment.
+
+        Reads decrypt only the chunks they touch. Raises ``KeyError`` for an
+        unknown attachment and ``ValueError`` if the file was modified.
+        """
+        attachment_id, ref = self.find_attachment(category, identifier, name)
+        reader = attachment.AttachmentReader(self.attachment_path(attachment_id), bytes.fromhex(ref['key']))
+        if reader.size != ref['size']:
+            reader.close()
+            raise ValueError(f"Attachment '{ref['name']}' is truncated")
+        return reader
+
+    def save_attachment(self, category, identifier, name, destination):
+        # destination 為路徑或可寫入的 binary file object
+        with self.open_attachment(category, identifier, name) as reader:
+            with open(destination, 'wb') if isinstance(destination, str) else nullcontext(destination) as f:
+                shutil.copyfileobj(reader, f, attachment.CHUNK_BYTES)
+        return reader.size
+
+    def remove_attachment(self, category, identifier, name):
+        attachment_id, _ = self.find_attachment(category, identifier, name)
+        _, sealed = self.fields_for_update(category, identifier)
+        kept = [item for item in sealed if (item[0], item[1]) != (record.FIELD_ATTACHMENT, attachment_id)]
+        self.store_encrypted(category, identifier,
+                             self.cipher.encrypt_fields([], crypto.associated_data(category, identifier), kept))
+
+    def detach_attachments(self, category, identifier, encrypted_data):
+        previous = self.data.get(category, {}).get(identifier)
+        if previous:
+            try:
+                previous_ids = crypto.attachment_ids(previous)
+            except ValueError:
+                # 損毀的紀錄仍然可以覆寫或刪除；它引用的附件檔案留給 collect_attachments 清理
+                return
+            current = set(crypto.attachment_ids(encrypted_data)) if encrypted_data else set()
+            self.detached_attachments.extend(i for i in previous_ids if i not in current)
+
+    def remove_detached_attachments(self):
+        detached, self.detached_attachments = self.detached_attachments, []
+        for attachment_id in detached:
+            try:
+                os.remove(self.attachment_path(attachment_id))
+            except FileNotFoundError:
+                pass
+
+    def collect_attachments(self, grace=attachment.ORPHAN_GRACE_SECONDS):
+        """Delete attachment files no entry refers to and return how many were removed.
+
+        Files younger than ``grace`` seconds are kept: another process may
+        have written one and not yet stored the entry that refers to it.
+        """
+        if not os.path.isdir(self.attachments_dir):
+            return 0
+        self.reload_if_changed()
+        referenced = set()
+        for entries in self.data.values():
+            for encrypted_data in entries.values():
+                referenced.update(crypto.attachment_ids(encrypted_data))
+        removed = 0
+        cutoff = time.time() - grace
+        for file_name in os.listdir(self.attachments_dir):
+            attachment_id = file_name.split('.', 1)[0]
+            path = os.path.join(self.attachments_dir, file_name)
+            if attachment_id not in referenced and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+                removed += 1
+        return removed
+
     def delete_data(self, category, identifier):
         if category in self.data and identifier in self.data[category]:
-            del self.data[category][identifier]
-            self.save_data()
+            with self.batch():
+                self.remember_previous(category, identifier)
+                self.detach_attachments(category, identifier, None)
+                del self.data[category][identifier]
+                self.record_changes([(category, identifier, None)])
 
+    def add_listener(self, callback):
+        self.listeners.append(callback)
 
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
 
+    def notify(self, changes):
+        for callback in list(self.listeners):
+            callback(changes)
+
+    def remember_previous(self, category, identifier):
+        # 記錄變更前的值，回滾時只需還原被改過的項目
+        had_category = category in self.data
+        previous = self.data[category].get(identifier) if had_category else None
+        self.undo_log.append((category, identifier, previous, had_category))
+
+    def rollback(self, undo_log):
+        reverted = []
+        for category, identifier, previous, had_category in reversed(undo_log):
+            if not had_category:
+                self.data.pop(category, None)
+            elif previous is None:
+                self.data[category].pop(identifier, None)
+            else:
+                self.data[category][identifier] = previous
+            reverted.append((category, identifier, previous))
+        if reverted:
+            self.notify(reverted)
+
+    def record_changes(self, changes):
+        # 在 batch 內呼叫，離開最外層 batch 時一次寫入
+        self.invalidate_cached(changes)
+        self.notify(changes)
+        self.pending_changes.extend(changes)
+
+    @contextmanager
+    def batch(self):
+        # 巢狀的 batch 併入最外層，由最外層負責寫入或回滾
+        if self.pending_changes is not None:
+            yield self
+            return
+
+        self.pending_changes = []
+        self.undo_log = []
+        try:
+            yield self
+            changes, self.pending_changes = self.pending_changes, None
+            if changes:
+                self.write_changes(changes)
+        except BaseException:
+            # 區塊內的例外或寫入失敗：還原記憶體中的資料，與磁碟上的 vault 一致
+            self.pending_changes = None
+            self.rollback(self.undo_log)
+            self.detached_attachments = []
+            self.purge_cache()
+            raise
+        finally:
+            self.undo_log = None
+
+    def store_many(self, entries, **kwargs):
+        # entries: iterable of (category, identifier, plaintext)
+        with self.batch():
+            for category, identifier, encrypted_data in self.encrypt_many(entries, **kwargs):
+                self.store_encrypted(category, identifier, encrypted_data)
+
+    def delete_many(self, entries):
+        # entries: iterable of (category, identifier)
+        with self.batch():
+            for category, identifier in entries:
+                self.delete_data(category, identifier)
 
     def save_data(self):
+        # 整份寫入前同樣先合併其他行程的變更，不會覆蓋掉它們
+        with self.vault_lock.exclusive():
+            if self.is_stale():
+                self.merge_from_disk([])
+            self.storage.save(self.data)
+            self.loaded_generation = self.vault_lock.bump()
+            self.loaded_signature = self.storage.signature()
+
+    def set_passphrase(self, passphrase, target_seconds=None, params=None):
+        # 以 passphrase 包裝目前的資料金鑰，之後不再需要 key.txt；
+        # 未指定 params 時先量測本機速度，選擇解鎖約 target_seconds 的 scrypt 參數
+        from model import kdf
+        if params is None:
+            params = kdf.calibrate(target_seconds or kdf.DEFAULT_TARGET_SECONDS)
+        kdf.save_header(self.header_file, kdf.create_header(self.key, passphrase, params))
+        if os.path.exists(self.key_file):
+            os.remove(self.key_file)
+        return params
+
+    def rotate_key(self, passphrase=None, workers=None, chunk_size=crypto.DEFAULT_CHUNK_SIZE, use_processes=False,
+                   progress=None):
+        """Re-encrypt every entry under a freshly generated key.
+
+        Entries are streamed in chunks (through a thread pool for large vaults,
+        or processes with ``use_processes=True``) and every finished chunk is
+        checkpointed under ``rotation/``, so calling this again after an
+        interruption resumes where it stopped. The vault and the new key are
+        only written once all entries are re-encrypted. ``progress(done, total)``
+        is called after each chunk. Returns throughput statistics.
+        """
+        if self.pending_changes is not None:
+            raise RuntimeError("rotate_key cannot run inside batch()")
+
+        # 整個輪替期間持有獨佔鎖，其他行程的寫入不會混入舊金鑰的紀錄或被覆蓋
+        with self.vault_lock.exclusive():
+            self.reload_if_changed()
+            return self.run_rotation(passphrase, workers, chunk_size, use_processes, progress)
+
+    def run_rotation(self, passphrase, workers, chunk_size, use_processes, progress):
+        start = time.perf_counter()
+        rotation = KeyRotation(self.data_dir)
+        vault_fingerprint = fingerprint(self.data)
+        state = rotation.load_state()
+        if state is not None and state['fingerprint'] != vault_fingerprint:
+            # 中斷之後 vault 又被修改過，已完成的進度不再可信
+            state = None
+        if state is None:
+            new_key = os.urandom(32)
+            state = rotation.start(self.new_key_record(new_key, passphrase), vault_fingerprint)
+            done = {}
+        else:
+            new_key = self.rotation_key(state, passphrase)
+            done = rotation.completed()
+
+        resumed = sum(len(entries) for entries in done.values())
+        total = sum(len(entries) for entries in self.data.values())
+        pending = (
+            (category, identifier, encrypted_data)
+            for category, entries in self.data.items()
+            for identifier, encrypted_data in entries.items()
+            if identifier not in done.get(category, {})
+        )
+
+        chunk, failed, count = [], [], resumed
         try:
-            with open(self.data_file, 'w') as f:
-                # 使用 indent=4 來美化輸出，使 JSON 文件具有縮進，更易於閱讀
-                json.dump(self.data, f, indent=4, sort_keys=True)
-        except IOError as e:
-            print(f"Error writing to file: {e}")
+            results = crypto.reencrypt_many(self.key, new_key, pending, workers=workers, chunk_size=chunk_size,
+                                            use_processes=use_processes)
+            for category, identifier, encrypted_data in results:
+                if encrypted_data is None:
+                    failed.append((category, identifier))
+                    continue
+                done.setdefault(category, {})[identifier] = encrypted_data
+                chunk.append((category, identifier, encrypted_data))
+                if len(chunk) >= chunk_size:
+                    rotation.append(chunk)
+                    count += len(chunk)
+                    chunk = []
+                    if progress is not None:
+                        progress(count, total)
+            if chunk:
+                rotation.append(chunk)
+                count += len(chunk)
+                if progress is not None:
+                    progress(count, total)
+        finally:
+            rotation.close()
 
-    def load_data(self):
+        if failed:
+            category, identifier = failed[0]
+            raise ValueError(f"{len(failed)} entries cannot be decrypted with the current key "
+                             f"(first: {category}/{identifier}); the vault was not changed")
+
+        rotation.set_phase(state, 'commit')
+        self.finish_rotation(rotation, state, new_key, done)
+        seconds = time.perf_counter() - start
+        return {
+            'entries': total,
+            'resumed': resumed,
+            'seconds': seconds,
+            'per_second': (total - resumed) / seconds if seconds > 0 else 0.0,
+        }
+
+    def new_key_record(self, new_key, passphrase):
+        if not self.uses_passphrase():
+            return {'key': new_key.hex()}
+        # 新金鑰以同一個 passphrase 與相同的 KDF 成本包裝
+        from model import kdf
+        header = kdf.load_header(self.header_file)
+        if passphrase is None or kdf.unlock(header, passphrase) != self.key:
+            raise kdf.PassphraseError("The current passphrase is required to rotate the key")
+        return {'header': kdf.create_header(new_key, passphrase, header)}
+
+    def rotation_key(self, state, passphrase):
+        if 'key' in state:
+            return bytes.fromhex(state['key'])
+        from model import kdf
+        if passphrase is None:
+            raise kdf.PassphraseError("This vault is protected by a passphrase")
+        return kdf.unlock(state['header'], passphrase)
+
+    def finish_rotation(self, rotation, state, new_key, data):
+        # 在獨佔鎖內呼叫
         try:
-            with open(self.data_file, 'r') as f:
-                self.data = json.load(f)
-        except (IOError, json.JSONDecodeError) as e:
-            print(f"Error loading from file: {e}")
\ No newline at end of file
+            self.storage.save(data)
+        except OSError as e:
+            # 寫入完整後才安裝新金鑰；檢查點仍在，下次開啟時完成輪替
+            raise IOError(f"The re-encrypted vault could not be written ({e}); "
+                          "the rotation will be finished on next open") from e
+        self.vault_lock.bump()
+
+        if 'header' in state:
+            from model import kdf
+            kdf.save_header(self.header_file, state['header'])
+        else:
+            tmp_path = f"{self.key_file}.tmp"
+            with open(tmp_path, 'w') as f:
+                f.write(new_key.hex())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.key_file)
+        rotation.discard()
+
+        self.key = new_key
+        self.cipher = crypto.RecordCipher(new_key)
+        self.load_data()
+
+    def purge_cache(self):
+        # 鎖定或閒置時呼叫，立即清除記憶體中的明文
+        if self.cache is not None:
+            self.cache.purge()
+
+    def close(self):
+        # 關閉後不能再使用：丟掉金鑰、明文快取與這個 vault 在行程內快取的 KEK
+        self.purge_cache()
+        self.storage.close()
+        self.vault_lock.close()
+        if self.uses_passphrase():
+            from model import kdf
+            kdf.forget_session_keys(bytes.fromhex(kdf.load_header(self.header_file)['salt']))
+        self.key = None
+        self.cipher = None
+        self.data = {}
+
+
+metrics.instrument(
+    LegacyModel,
+    'load_key_and_data', 'load_data', 'save_data', 'encrypt_data', 'decrypt_data',
+    'store_fields', 'retrieve_fields', 'get_field',
+    prefix='model',
+)
@@ -0,0 +1,126 @@
+# crypto_keeper/model/profiles.py
+# 多個 vault（profile）。預設的 profile 就是原本的 CryptoKeeperData，其他 profile 放在
+#   CryptoKeeperData/profiles/<name>/     key.txt、legacy_data.json 等與預設 vault 相同
+# VaultManager 讓 GUI 與長時間執行的程式在 profile 之間切換：最近使用的 vault 保持開啟，
+# 切換回來不必重新載入或重新執行 KDF；超過數量或閒置太久的 vault 會被關閉並丟棄金鑰。
+# 這個模組只使用標準函式庫，main.py 在畫出視窗前匯入它不會拖慢啟動。
+import os
+import re
+import time
+from collections import OrderedDict
+
+DEFAULT_PROFILE = 'default'
+PROFILE_DIR = 'profiles'
+# 同時保持開啟的 vault 數量
+MAX_OPEN_VAULTS = 4
+# 超過這個時間沒有切換過去的 vault 會被關閉（目前使用中的除外）
+IDLE_SECONDS = 15 * 60
+
+NAME_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9._-]{0,63}')
+
+
+def default_base_dir():
+    from model.model import get_app_dir
+    return os.path.join(get_app_dir(), 'CryptoKeeperData')
+
+
+def validate_name(name):
+    if not NAME_PATTERN.fullmatch(name or ''):
+        raise ValueError(f"Invalid profile name {name!r}: use letters, digits, '.', '_' or '-'")
+    return name
+
+
+def profile_dir(name=None, base_dir=None):
+    base_dir = base_dir or default_base_dir()
+    if name in (None, DEFAULT_PROFILE):
+        return base_dir
+    return os.path.join(base_dir, PROFILE_DIR, validate_name(name))
+
+
+def list_profiles(base_dir=None):
+    # 預設 profile 永遠在第一個，其餘依名稱排序
+    root = os.path.join(base_dir or default_base_dir(), PROFILE_DIR)
+    names = []
+    if os.path.isdir(root):
+        names = sorted(name for name in os.listdir(root)
+                       if NAME_PATTERN.fullmatch(name) and os.path.isdir(os.path.join(root, name)))
+    return [DEFAULT_PROFILE] + [name for name in names if name != DEFAULT_PROFILE]
+
+
+def open_legacy_model(data_dir, passphrase):
+    from model.model import LegacyModel
+    return LegacyModel(data_dir=data_dir, passphrase=passphrase)
+
+
+class VaultManager:
+    """Keep the most recently used vaults open, bounded in number and idle time.
+
+    ``open(name)`` returns an already open vault at once and otherwise opens
+    it through ``opener(data_dir, passphrase)``; a missing profile is created.
+    Vaults pushed out of the LRU or idle for ``idle_seconds`` are closed,
+    which drops their key. Not thread-safe: call it from the thread that uses
+    the vaults (the GUI's worker thread).
+    """
+
+    def __init__(self, base_dir=None, max_open=MAX_OPEN_VAULTS, idle_seconds=IDLE_SECONDS, opener=None,
+                 clock=time.monotonic):
+        self.base_dir = base_dir
+        self.max_open = max_open
+        self.idle_seconds = idle_seconds
+        self.opener = opener or open_legacy_model
+        self.clock = clock
+        self.vaults = OrderedDict()  # name -> model，最近使用的在最後
+        self.last_used = {}
+        self.opened = 0
+        self.evictions = 0
+
+    def get_base_dir(self):
+        if self.base_dir is None:
+            self.base_dir = default_base_dir()
+        return self.base_dir
+
+    def profiles(self):
+        return list_profiles(self.get_base_dir())
+
+    def is_open(self, name):
+        return name in self.vaults
+
+    def active(self):
+        # 最近一次 open 的 profile
+        return next(reversed(self.vaults), None)
+
+    def open(self, name=DEFAULT_PROFILE, passphrase=None):
+        model = self.vaults.get(name)
+        if model is None:
+            model = self.opener(profile_dir(name, self.get_base_dir()), passphrase)
+            self.vaults[name] = model
+            self.opened += 1
+        self.vaults.move_to_end(name)
+        self.last_used[name] = self.clock()
+        while len(self.vaults) > max(1, self.max_open):
+            self.close(next(iter(self.vaults)))
+            self.evictions += 1
+        return model
+
+    def evict_idle(self):
+        # 由計時器定期呼叫；回傳被關閉的 profile
+        cutoff = self.clock() - self.idle_seconds
+        idle = [name for name in self.vaults if name != self.active() and self.last_used[name] <= cutoff]
+        for name in idle:
+            self.close(name)
+            self.evictions += 1
+        return idle
+
+    def purge_caches(self):
+        for model in list(self.vaults.values()):
+            model.purge_cache()
+
+    def close(self, name):
+        model = self.vaults.pop(name, None)
+        self.last_used.pop(name, None)
+        if model is not None:
+            model.close()
+
+    def close_all(self):
+        for name in list(self.vaults):
+            self.close(name)
@@ -0,0 +1,125 @@
+# crypto_keeper/model/record.py
+# 分欄位紀錄的容器格式（'v3:' 之後的 base64 內容）：
+#   count:u16 | { kind:u8 | name_len:u16 | name | sealed_len:u32 | sealed }*
+# kind 區分分類預設欄位（name 為 schema 的 key）、自定義欄位與附件（name 為附件 id，見 attachment.py）；
+# sealed 為該欄位單獨的 AES-GCM 密文。
+# 每個欄位都有長度前綴，讀取單一欄位時只需依長度跳過其他欄位，不必解密。
+import json
+import struct
+
+from model.schema import get_fields
+
+FIELD_DEFAULT = 0
+FIELD_CUSTOM = 1
+FIELD_ATTACHMENT = 2
+
+COUNT = struct.Struct('>H')
+FIELD_HEADER = struct.Struct('>BH')
+SEALED_LENGTH = struct.Struct('>I')
+
+
+def pack(items):
+    # items: [(kind, name, sealed bytes)]
+    parts = [COUNT.pack(len(items))]
+    for kind, name, sealed in items:
+        name_bytes = name.encode('utf-8')
+        parts.append(FIELD_HEADER.pack(kind, len(name_bytes)))
+        parts.append(name_bytes)
+        parts.append(SEALED_LENGTH.pack(len(sealed)))
+        parts.append(sealed)
+    return b''.join(parts)
+
+
+def unpack(blob):
+    # 依序產生 (kind, name, sealed)；sealed 為 memoryview，不會複製密文
+    view = memoryview(blob)
+    try:
+        (count,) = COUNT.unpack_from(view, 0)
+        offset = COUNT.size
+        for _ in range(count):
+            kind, name_length = FIELD_HEADER.unpack_from(view, offset)
+            offset += FIELD_HEADER.size
+            name = bytes(view[offset:offset + name_length]).decode('utf-8')
+            offset += name_length
+            (sealed_length,) = SEALED_LENGTH.unpack_from(view, offset)
+            offset += SEALED_LENGTH.size
+            if offset + sealed_length > len(view):
+                raise ValueError("Truncated field record.")
+            yield kind, name, view[offset:offset + sealed_length]
+            offset += sealed_length
+    except struct.error:
+        raise ValueError("Truncated field record.")
+
+
+def field_associated_data(associated_data, kind, name):
+    # 欄位密文同時綁定項目位置與欄位名稱，欄位之間不能互換
+    return associated_data + b'\x00' + bytes((kind,)) + name.encode('utf-8')
+
+
+def from_fields(fields, custom_fields=()):
+    # fields: {schema key: value}，custom_fields: [(name, value)] -> [(kind, name, value)]
+    items = [(FIELD_DEFAULT, key, value) for key, value in fields.items()]
+    items.extend((FIELD_CUSTOM, name, value) for name, value in custom_fields)
+    return items
+
+
+def to_fields(items):
+    # 附件不是表單欄位，另由 attachments() 取得
+    fields, custom_fields = {}, []
+    for kind, name, value in items:
+        if kind == FIELD_DEFAULT:
+            fields[name] = value
+        elif kind == FIELD_CUSTOM:
+            custom_fields.append((name, value))
+    return fields, custom_fields
+
+
+def attachments(items):
+    # [(附件 id, {'name', 'size', 'key', 'chunk'})]
+    return [(name, json.loads(value)) for kind, name, value in items if kind == FIELD_ATTACHMENT]
+
+
+def to_json(items):
+    # 給只認得單一字串值的呼叫端（CLI get、agent、export）；附件只列出名稱與大小，不含金鑰
+    fields, custom_fields = to_fields(items)
+    output = {'fields': fields, 'custom_fields': custom_fields}
+    attached = attachments(items)
+    if attached:
+        output['attachments'] = [{'name': ref['name'], 'size': ref['size']} for _, ref in attached]
+    return json.dumps(output, ensure_ascii=False)
+
+
+def from_json(text):
+    # to_json 的反向：快取中 v3 紀錄的明文 -> (fields, custom_fields)
+    decoded = json.loads(text)
+    return decoded['fields'], [tuple(item) for item in decoded['custom_fields']]
+
+
+def find_field(fields, custom_fields, field):
+    # 預設欄位優先，其次為同名的自定義欄位
+    if field in fields:
+        return fields[field]
+    return next((value for name, value in custom_fields if name == field), None)
+
+
+def parse_legacy(category, text):
+    """Split an old ``','.join(defaults + ['name:value', ...])`` blob into fields.
+
+    Mirrors how the GUI used to read it: the default fields are only filled
+    when there are enough parts, and everything after them must be a
+    ``name:value`` custom field.
+    """
+    schema = get_fields(category)
+    parts = text.split(',')
+    if len(parts) < len(schema):
+        return {}, []
+
+    fields = {field.key: value for field, value in zip(schema, parts)}
+    custom_fields = []
+    for part in parts[len(schema):]:
+        name_value_pair = part.split(':', 1)
+        if len(name_value_pair) != 2:
+            raise ValueError(f"Invalid custom field format: {part}")
+        name, value = name_value_pair
+        custom_fields.append((name.strip(), value.strip()))
+    return fields, custom_fields
@@ -0,0 +1,87 @@
+# crypto_keeper/model/rotation.py
+# 金鑰輪替的進度檔，放在 CryptoKeeperData/rotation/：
+#   state.json      新金鑰（key.txt 模式為 hex，passphrase 模式為包裝後的 header）、開始時的 vault 指紋與階段
+#   progress.jsonl  每完成一個 chunk 追加一行 [[category, identifier, encrypted_data], ...]
+# 階段為 'reencrypt' 時可從 progress 接續；為 'commit' 時表示所有項目都已重新加密，
+# 只剩寫回 vault 與安裝新金鑰，下次開啟 vault 時會自動完成。
+import os
+import json
+import shutil
+import hashlib
+
+from model.storage import write_json_atomic
+
+
+def fingerprint(data):
+    # 以內容而非檔案簽章判斷 vault 是否變動，日誌壓縮等不影響內容的重寫不會讓進度失效
+    digest = hashlib.sha256()
+    for category in sorted(data):
+        entries = data[category]
+        for identifier in sorted(entries):
+            digest.update(json.dumps([category, identifier, entries[identifier]]).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class KeyRotation:
+    def __init__(self, data_dir):
+        self.rotation_dir = os.path.join(data_dir, 'rotation')
+        self.state_file = os.path.join(self.rotation_dir, 'state.json')
+        self.progress_file = os.path.join(self.rotation_dir, 'progress.jsonl')
+        self.progress = None
+
+    def load_state(self):
+        if not os.path.exists(self.state_file):
+            return None
+        with open(self.state_file, 'r') as f:
+            return json.load(f)
+
+    def start(self, key_record, vault_fingerprint):
+        self.discard()
+        os.makedirs(self.rotation_dir)
+        state = {'phase': 'reencrypt', 'fingerprint': vault_fingerprint}
+        state.update(key_record)
+        write_json_atomic(self.state_file, state)
+        return state
+
+    def set_phase(self, state, phase):
+        state['phase'] = phase
+        write_json_atomic(self.state_file, state)
+
+    def completed(self):
+        # 讀取已完成的項目；最後一行可能是中斷時寫到一半的紀錄，截掉後從該處繼續追加
+        done = {}
+        if not os.path.exists(self.progress_file):
+            return done
+        good_size = 0
+        with open(self.progress_file, 'rb') as f:
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break
+                try:
+                    chunk = json.loads(line)
+                except ValueError:
+                    break
+                for category, identifier, encrypted_data in chunk:
+                    done.setdefault(category, {})[identifier] = encrypted_data
+                good_size += len(line)
+        if good_size != os.path.getsize(self.progress_file):
+            with open(self.progress_file, 'r+b') as f:
+                f.truncate(good_size)
+        return done
+
+    def append(self, chunk):
+        if self.progress is None:
+            self.progress = open(self.progress_file, 'a')
+        self.progress.write(json.dumps(chunk) + '\n')
+        self.progress.flush()
+        os.fsync(self.progress.fileno())
+
+    def close(self):
+        if self.progress is not None:
+            self.progress.close()
+            self.progress = None
+
+    def discard(self):
+        self.close()
+        if os.path.exists(self.rotation_dir):
+            shutil.rmtree(self.rotation_dir)
@@ -0,0 +1,30 @@
+# crypto_keeper/model/schema.py
+from collections import namedtuple
+
+# key 為欄位識別名稱（也是 Mainwindow 上 `<key>_input` 的屬性名稱），label 為畫面上的標籤
+Field = namedtuple('Field', ['key', 'label'])
+
+# 各分類的預設欄位，依照儲存時的順序排列；新增分類只需在此加入一筆
+CATEGORY_SCHEMAS = {
+    'Wallet': [
+        Field('wallet_seed', 'Wallet Seed'),
+        Field('private_key', 'Private Key'),
+    ],
+    'Exchange': [
+        Field('exchange_account', 'Exchange Account'),
+        Field('exchange_password', 'Exchange Password'),
+        Field('google_2fa', 'Google 2FA'),
+        Field('auth_email', 'Auth Email'),
+        Field('auth_phone', 'Auth Phone'),
+        Field('fund_password', 'Fund Password'),
+        Field('identity_data', 'Identity Data'),
+    ],
+    # Others 沒有預設欄位，只使用自定義欄位
+    'Others': [],
+}
+
+CATEGORIES = list(CATEGORY_SCHEMAS)
+
+
+def get_fields(category):
+    return CATEGORY_SCHEMAS.get(category, [])
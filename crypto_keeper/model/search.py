@@ -0,0 +1,226 @@
+# crypto_keeper/model/search.py
+import itertools
+import re
+from collections import Counter
+
+# 前綴樹只建到這個深度，更長的前綴在候選中再以 startswith 篩選，避免節點數量爆增
+TRIE_DEPTH = 6
+# 最少見的三元組不超過 limit 的這個倍數時，以三元組候選找出比前綴樹深的前綴；
+# 更常見的前綴由前綴樹很快就能湊滿 limit
+RARE_FACTOR = 4
+
+
+class CategoryIndex:
+    """Prefix trie + trigram index + character index for one category."""
+
+    def __init__(self):
+        self.texts = {}  # identifier -> lowercase identifier
+        self.trie = [{}, []]  # [children, identifiers stored at this node]
+        self.trigrams = {}
+        # 'q' * n -> 至少包含 n 個 q 的識別名稱；模糊比對只需檢查字元數量足夠的候選
+        self.chars = {}
+
+    @staticmethod
+    def trigrams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+    @staticmethod
+    def chars_of(text):
+        # 第 n 次出現的字元對應到 char * n
+        seen = {}
+        tokens = []
+        for char in text:
+            token = seen[char] = seen.get(char, '') + char
+            tokens.append(token)
+        return tokens
+
+    @staticmethod
+    def required_chars(text):
+        return {char * count for char, count in Counter(text).items()}
+
+    @staticmethod
+    def subsequence_pattern(text):
+        # 'abc' -> '[^a]*a[^b]*b[^c]*c'：每個字元取第一次出現的位置，比對失敗時不必回溯
+        return re.compile(''.join(f'[^{re.escape(char)}]*{re.escape(char)}' for char in text))
+
+    def add(self, identifier):
+        if identifier in self.texts:
+            return
+        text = identifier.lower()
+        self.texts[identifier] = text
+
+        node = self.trie
+        for char in text[:TRIE_DEPTH]:
+            node = node[0].setdefault(char, [{}, []])
+        node[1].append(identifier)
+
+        # 以 get 取代 setdefault(token, set())，建立整個索引時不必為每個 token 配置用不到的 set
+        for index, tokens in ((self.trigrams, self.trigrams_of(text)), (self.chars, self.chars_of(text))):
+            for token in tokens:
+                postings = index.get(token)
+                if postings is None:
+                    postings = index[token] = set()
+                postings.add(identifier)
+
+    def remove(self, identifier):
+        text = self.texts.pop(identifier, None)
+        if text is None:
+            return
+
+        path = [self.trie]
+        for char in text[:TRIE_DEPTH]:
+            path.append(path[-1][0][char])
+        path[-1][1].remove(identifier)
+        # 從葉節點往上移除空節點
+        for depth in range(len(path) - 1, 0, -1):
+            node = path[depth]
+            if node[0] or node[1]:
+                break
+            del path[depth - 1][0][text[depth - 1]]
+
+        for index, tokens in ((self.trigrams, self.trigrams_of(text)), (self.chars, self.chars_of(text))):
+            for token in tokens:
+                postings = index[token]
+                postings.discard(identifier)
+                if not postings:
+                    del index[token]
+
+    def prefix_matches(self, text, limit):
+        node = self.trie
+        for char in text[:TRIE_DEPTH]:
+            node = node[0].get(char)
+            if node is None:
+                return []
+
+        results = []
+        stack = [node]
+        while stack and len(results) < limit:
+            node = stack.pop()
+            if len(text) > TRIE_DEPTH:
+                matches = (identifier for identifier in node[1] if self.texts[identifier].startswith(text))
+                results.extend(itertools.islice(matches, limit - len(results)))
+            else:
+                results.extend(node[1])
+            # 反向排序後放入堆疊，讓輸出大致依字母順序
+            stack.extend(node[0][char] for char in sorted(node[0], reverse=True))
+        return results[:limit]
+
+    @staticmethod
+    def rarest(index, tokens):
+        return min((len(index.get(token, ())) for token in tokens), default=0)
+
+    @staticmethod
+    def intersect(index, tokens):
+        postings = []
+        for token in tokens:
+            posting = index.get(token)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        candidates = postings[0]
+        for posting in postings[1:]:
+            candidates = candidates & posting
+            if not candidates:
+                break
+        return candidates
+
+    def search(self, text, limit):
+        if not text:
+            return sorted(self.texts, key=self.texts.get)[:limit]
+
+        candidates = None
+        if len(text) > TRIE_DEPTH and self.rarest(self.trigrams, self.trigrams_of(text)) <= limit * RARE_FACTOR:
+            # 比前綴樹深的查詢：前綴相符的項目都在三元組候選中，候選不多時不必逐一檢查前綴樹的葉節點
+            candidates = self.intersect(self.trigrams, self.trigrams_of(text))
+        if candidates is not None and len(candidates) <= limit:
+            results = sorted((i for i in candidates if self.texts[i].startswith(text)), key=self.texts.get)
+        else:
+            results = self.prefix_matches(text, limit)
+        seen = set(results)
+
+        if len(results) < limit and len(text) >= 3:
+            if candidates is None:
+                candidates = self.intersect(self.trigrams, self.trigrams_of(text))
+            matches = (i for i in candidates if i not in seen and text in self.texts[i])
+            substring = list(itertools.islice(matches, limit - len(results)))
+            results.extend(sorted(substring, key=self.texts.get))
+            seen.update(substring)
+
+        if len(results) < limit:
+            # 依序包含查詢字元的模糊比對；候選已包含足夠數量的每個字元，找到足夠的結果就停止掃描
+            pattern = self.subsequence_pattern(text)
+            candidates = self.intersect(self.chars, self.required_chars(text))
+            matches = (i for i in candidates if i not in seen and pattern.match(self.texts[i]))
+            fuzzy = list(itertools.islice(matches, limit - len(results)))
+            results.extend(sorted(fuzzy, key=self.texts.get))
+
+        return results
+
+
+class IdentifierIndex:
+    """Incremental search index over identifiers in every category.
+
+    :meth:`build` indexes every category at once, e.g. on a background
+    thread when a vault is loaded; otherwise each category gets its own
+    :class:`CategoryIndex` the first time it is searched. The index is then
+    kept up to date from the model's change notifications. With
+    ``listen=False`` the owner forwards the notifications to
+    :meth:`on_changes` itself (e.g. on the GUI thread).
+    """
+
+    def __init__(self, model, listen=True):
+        self.model = model
+        self.indexes = {}
+        # build 之後所有分類都已建立，新增的分類從變更通知建立，不再讀取 model.data
+        self.built = False
+        if listen:
+            model.add_listener(self.on_changes)
+
+    def build(self):
+        for category in list(self.model.data):
+            self.category_index(category)
+        self.built = True
+        return self
+
+    def on_changes(self, changes):
+        # changes 為 None 表示整個 vault 重新載入，下次搜尋時再重建
+        if changes is None:
+            self.indexes = {}
+            self.built = False
+            return
+        for category, identifier, encrypted_data in changes:
+            index = self.indexes.get(category)
+            if index is None:
+                if not self.built:
+                    continue
+                index = self.indexes[category] = CategoryIndex()
+            if encrypted_data is None:
+                index.remove(identifier)
+            else:
+                index.add(identifier)
+
+    def category_index(self, category):
+        index = self.indexes.get(category)
+        if index is None:
+            index = self.indexes[category] = CategoryIndex()
+            if not self.built:
+                for identifier in self.model.data.get(category, {}):
+                    index.add(identifier)
+        return index
+
+    def search(self, query, category=None, limit=1000):
+        """Return ``(category, identifier)`` pairs matching ``query``.
+
+        Within a category, prefix matches come first, then substring
+        matches, then identifiers containing the query's characters in order.
+        """
+        text = query.strip().lower()
+        categories = [category] if category is not None else list(self.model.data)
+        results = []
+        for name in categories:
+            if len(results) >= limit:
+                break
+            matches = self.category_index(name).search(text, limit - len(results))
+            results.extend((name, identifier) for identifier in matches)
+        return results
@@ -0,0 +1,511 @@
+# crypto_keeper/model/storage.py
+import os
+import re
+import json
+import hashlib
+from collections.abc import MutableMapping
+import struct
+import sys
+import threading
+import zlib
+
+from model import metrics
+
+
+def file_signature(path):
+    # 以 (inode, mtime_ns, size) 判斷檔案是否被其他程式改過；檔案不存在時為 None
+    # 以 rename 取代的檔案 inode 一定不同，mtime 精度很粗的檔案系統（FAT、網路磁碟）也能察覺
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def diff_data(old, new):
+    """Return ``[(category, identifier, encrypted_data or None)]`` turning ``old`` into ``new``.
+
+    For :class:`ShardedData` only loaded categories are compared. A category
+    loaded in ``new`` but not in ``old`` (a new shard, or one that changed
+    on disk before anyone read it) is reported entry by entry.
+    """
+    changes = []
+    if isinstance(old, ShardedData):
+        categories = old.loaded()
+        added = new.loaded() if isinstance(new, ShardedData) else new
+    else:
+        categories = old
+        added = new
+    # 新增或剛讀入的分類
+    for category, entries in added.items():
+        if category not in categories:
+            changes.extend((category, identifier, value) for identifier, value in entries.items())
+    for category, old_entries in categories.items():
+        new_entries = new[category] if category in new else {}
+        # 分片沒有變動時沿用同一個 dict
+        if new_entries is old_entries:
+            continue
+        for identifier, value in old_entries.items():
+            new_value = new_entries.get(identifier)
+            if new_value != value:
+                changes.append((category, identifier, new_value))
+        for identifier, value in new_entries.items():
+            if identifier not in old_entries:
+                changes.append((category, identifier, value))
+    return changes
+
+
+def write_json_file(path, data):
+    with open(path, 'w') as f:
+        # 使用 indent=4 來美化輸出，使 JSON 文件具有縮進，更易於閱讀
+        json.dump(data, f, indent=4, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+        if metrics.ENABLED:
+            metrics.add('vault_bytes_written_total', f.tell())
+
+
+def write_json_atomic(path, data):
+    # 先寫入暫存檔並 fsync，再以 rename 取代原檔，避免寫到一半的檔案
+    tmp_path = f"{path}.tmp"
+    write_json_file(tmp_path, data)
+    os.replace(tmp_path, path)
+
+
+class JsonFileStorage:
+    """Stores the whole vault as a single JSON document (the original format)."""
+
+    def __init__(self, data_file):
+        self.data_file = data_file
+
+    def load(self):
+        if not os.path.exists(self.data_file):
+            return {}
+        try:
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+                if metrics.ENABLED:
+                    metrics.add('vault_bytes_read_total', f.tell())
+                return data
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Error loading from file: {e}", file=sys.stderr)
+            return {}
+
+    def save(self, data):
+        # 寫入失敗時拋出例外，由呼叫端回滾
+        write_json_atomic(self.data_file, data)
+
+    def paths(self):
+        return [self.data_file]
+
+    def signature(self):
+        return tuple(file_signature(path) for path in self.paths())
+
+    def reload(self, data):
+        # 回傳 (新的資料, 與 data 之間的逐項差異)
+        new_data = self.load()
+        return new_data, diff_data(data, new_data)
+
+    def apply(self, data, changes):
+        # changes: [(category, identifier, encrypted_data or None), ...]
+        # 單檔模式沒有增量寫入，直接整份重寫
+        self.save(data)
+
+    def close(self):
+        pass
+
+
+class JournalStorage:
+    """Append-only journal replayed over the last ``legacy_data.json`` snapshot.
+
+    Every mutation appends one framed record (length, crc32, JSON payload) to
+    the journal, so a write costs the same no matter how large the vault is.
+    Once the journal grows past ``compact_threshold`` bytes it is rotated and a
+    fresh snapshot is written by a background thread. With a ``vault_lock``
+    (:class:`model.locking.VaultLock`) the new snapshot is swapped in under
+    the exclusive lock and bumps the generation, so readers holding the
+    shared lock never see the snapshot and ``.compacting`` out of step.
+    """
+
+    FRAME_HEADER = struct.Struct('>II')
+
+    def __init__(self, data_file, journal_file=None, compact_threshold=4 * 1024 * 1024, fsync=True, vault_lock=None,
+                 repair=True):
+        self.data_file = data_file
+        self.journal_file = journal_file or os.path.splitext(data_file)[0] + '.journal'
+        self.compacting_file = self.journal_file + '.compacting'
+        self.vault_lock = vault_lock
+        # repair=False 只讀取：截斷的尾端直接略過而不截掉，給只持有共享鎖的讀取者（備份）使用
+        self.repair = repair
+        self.compact_threshold = compact_threshold
+        self.fsync = fsync
+        self.snapshot = JsonFileStorage(data_file)
+        self.lock = threading.RLock()
+        self.compaction_thread = None
+        self.journal_size = 0
+
+    def load(self):
+        with self.lock:
+            self.wait_for_compaction()
+            data = self.snapshot.load()
+            # 壓縮中斷時，.compacting 檔仍需在新日誌之前重播
+            if os.path.exists(self.compacting_file):
+                self.replay(self.compacting_file, data)
+            if os.path.exists(self.journal_file):
+                self.journal_size = self.replay(self.journal_file, data)
+            else:
+                self.journal_size = 0
+            return data
+
+    def replay(self, path, data):
+        valid_size = 0
+        with open(path, 'rb') as f:
+            while True:
+                header = f.read(self.FRAME_HEADER.size)
+                if len(header) < self.FRAME_HEADER.size:
+                    break
+                length, checksum = self.FRAME_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != checksum:
+                    break
+                self.apply_record(data, json.loads(payload.decode('utf-8')))
+                valid_size = f.tell()
+        if metrics.ENABLED:
+            metrics.add('vault_bytes_read_total', valid_size)
+
+        if self.repair and os.path.getsize(path) > valid_size:
+            # 截掉寫到一半的尾端紀錄，之後的追加才不會接在壞資料後面
+            print(f"Journal {path} has a truncated tail, discarding bytes after offset {valid_size}", file=sys.stderr)
+            with open(path, 'r+b') as f:
+                f.truncate(valid_size)
+        return valid_size
+
+    @staticmethod
+    def apply_record(data, record):
+        category = record.get('c')
+        identifier = record.get('i')
+        if record['op'] == 'batch':
+            for sub_record in record['r']:
+                JournalStorage.apply_record(data, sub_record)
+        elif record['op'] == 'set':
+            data.setdefault(category, {})[identifier] = record['v']
+        elif record['op'] == 'del':
+            if identifier in data.get(category, {}):
+                del data[category][identifier]
+
+    @staticmethod
+    def make_record(category, identifier, encrypted_data):
+        if encrypted_data is None:
+            return {'op': 'del', 'c': category, 'i': identifier}
+        return {'op': 'set', 'c': category, 'i': identifier, 'v': encrypted_data}
+
+    def encode_frame(self, record):
+        payload = json.dumps(record, separators=(',', ':')).encode('utf-8')
+        return self.FRAME_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def apply(self, data, changes):
+        records = [self.make_record(*change) for change in changes]
+        if len(records) == 1:
+            frames = self.encode_frame(records[0])
+        else:
+            # 多筆變更包成單一 frame，重播時要嘛全部套用、要嘛全部捨棄
+            frames = self.encode_frame({'op': 'batch', 'r': records})
+        with self.lock:
+            with open(self.journal_file, 'ab') as f:
+                offset = f.seek(0, os.SEEK_END)
+                try:
+                    f.write(frames)
+                    f.flush()
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                except BaseException:
+                    # 截掉寫到一半的紀錄，之後的追加才不會接在壞資料後面
+                    f.truncate(offset)
+                    raise
+            self.journal_size += len(frames)
+            if metrics.ENABLED:
+                metrics.add('vault_bytes_written_total', len(frames))
+            if self.journal_size >= self.compact_threshold:
+                self.start_compaction(data)
+
+    def paths(self):
+        return [self.data_file, self.compacting_file, self.journal_file]
+
+    def signature(self):
+        return tuple(file_signature(path) for path in self.paths())
+
+    def reload(self, data):
+        new_data = self.load()
+        return new_data, diff_data(data, new_data)
+
+    def save(self, data):
+        # 完整寫入即同步壓縮：寫新快照並清空日誌
+        with self.lock:
+            self.wait_for_compaction()
+            write_json_atomic(self.data_file, data)
+            for path in (self.compacting_file, self.journal_file):
+                if os.path.exists(path):
+                    os.remove(path)
+            self.journal_size = 0
+
+    def start_compaction(self, data):
+        with self.lock:
+            if self.compaction_thread is not None and self.compaction_thread.is_alive():
+                return
+            if os.path.exists(self.compacting_file):
+                # 上一次壓縮失敗，留待下次完整寫入時處理，避免覆蓋尚未合併的紀錄
+                return
+            # 在呼叫端執行緒複製資料並輪替日誌，之後的追加會寫到新的日誌檔
+            snapshot = {category: dict(entries) for category, entries in data.items()}
+            os.replace(self.journal_file, self.compacting_file)
+            self.journal_size = 0
+            self.compaction_thread = threading.Thread(
+                target=self.compact, args=(snapshot, file_signature(self.compacting_file)),
+                name='journal-compaction', daemon=True
+            )
+            self.compaction_thread.start()
+
+    def compact(self, snapshot, compacting_signature=None):
+        # 費時的寫入不持有鎖；只有換上新快照與移除 .compacting 在獨佔鎖內一起完成
+        tmp_path = f"{self.data_file}.compacting.tmp"
+        try:
+            write_json_file(tmp_path, snapshot)
+            if self.vault_lock is None:
+                self.install_snapshot(tmp_path)
+                return
+            with self.vault_lock.exclusive(), self.lock:
+                if file_signature(self.compacting_file) != compacting_signature:
+                    # 這段期間已有完整寫入（本行程或其他行程）取代了快照，這份快照已過期
+                    os.remove(tmp_path)
+                    return
+                self.install_snapshot(tmp_path)
+                self.vault_lock.bump()
+        except IOError as e:
+            # 保留 .compacting 檔，下次載入時仍會重播
+            print(f"Error compacting journal: {e}", file=sys.stderr)
+
+    def install_snapshot(self, tmp_path):
+        os.replace(tmp_path, self.data_file)
+        os.remove(self.compacting_file)
+
+    def wait_for_compaction(self):
+        # 呼叫端持有 vault_lock 時，壓縮執行緒要等鎖釋放才能完成，不能在這裡等待；
+        # 鎖本身保證讀寫不會看到寫到一半的壓縮
+        if self.vault_lock is not None and self.vault_lock.held():
+            return
+        thread = self.compaction_thread
+        if thread is not None:
+            thread.join()
+            self.compaction_thread = None
+
+    def close(self):
+        self.wait_for_compaction()
+
+
+class ShardedData(MutableMapping):
+    """Category -> entries mapping whose shards are parsed on first access.
+
+    ``category in data`` and iterating categories only consult the manifest.
+    """
+
+    def __init__(self, storage, categories=(), loaded=None):
+        self.storage = storage
+        self.shards = {category: None for category in categories}
+        self.shards.update(loaded or {})
+
+    def __getitem__(self, category):
+        entries = self.shards[category]
+        if entries is None:
+            entries = self.shards[category] = self.storage.load_shard(category)
+        return entries
+
+    def __setitem__(self, category, entries):
+        self.shards[category] = entries
+
+    def __delitem__(self, category):
+        del self.shards[category]
+
+    def __iter__(self):
+        return iter(self.shards)
+
+    def __len__(self):
+        return len(self.shards)
+
+    def __contains__(self, category):
+        return category in self.shards
+
+    def loaded(self):
+        return {category: entries for category, entries in self.shards.items() if entries is not None}
+
+
+class ShardedStorage:
+    """One JSON file per category under ``shards/`` plus a small manifest.
+
+    Opening the vault only reads the manifest; a category's shard is parsed
+    the first time it is accessed and a write only rewrites the shards it
+    touched. An existing single-file vault is migrated on first load.
+    """
+
+    def __init__(self, shard_dir, legacy_file):
+        self.shard_dir = shard_dir
+        self.manifest_file = os.path.join(shard_dir, 'manifest.json')
+        self.legacy_file = legacy_file
+        self.shard_files = {}
+        # 各分類載入或寫入時的檔案簽章，重新載入時沒變的分片直接沿用
+        self.shard_signatures = {}
+
+    @staticmethod
+    def shard_name(category):
+        # 分類名稱可能含有不能當檔名的字元，以雜湊確保唯一
+        safe = re.sub(r'[^A-Za-z0-9_-]', '_', category)[:32]
+        digest = hashlib.sha1(category.encode('utf-8')).hexdigest()[:8]
+        return f"{safe}-{digest}.json"
+
+    def load(self):
+        if not os.path.exists(self.manifest_file):
+            return self.migrate()
+        try:
+            with open(self.manifest_file, 'r') as f:
+                self.shard_files = json.load(f)['shards']
+        except (IOError, KeyError, json.JSONDecodeError) as e:
+            print(f"Error loading from file: {e}", file=sys.stderr)
+            self.shard_files = {}
+        # 尚未讀取的分片也記下簽章，重新載入時才能察覺其他程式寫過哪些分類
+        self.shard_signatures = {category: file_signature(os.path.join(self.shard_dir, name))
+                                 for category, name in self.shard_files.items()}
+        return ShardedData(self, self.shard_files)
+
+    def load_shard(self, category):
+        path = os.path.join(self.shard_dir, self.shard_files[category])
+        # 讀取前取得簽章：讀取期間被取代時，下次比對會不同而重新讀取
+        self.shard_signatures[category] = file_signature(path)
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                entries = json.load(f)
+                if metrics.ENABLED:
+                    metrics.add('vault_bytes_read_total', f.tell())
+                return entries
+        except (IOError, json.JSONDecodeError) as e:
+            print(f"Error loading from file: {e}", file=sys.stderr)
+            return {}
+
+    def migrate(self):
+        # 將舊的 legacy_data.json（含尚未壓縮的日誌）拆成各分類檔案
+        legacy = JournalStorage(self.legacy_file)
+        data = legacy.load()
+        os.makedirs(self.shard_dir, exist_ok=True)
+        self.shard_files = {}
+        self.save(data)
+
+        for path in (self.legacy_file, legacy.compacting_file, legacy.journal_file):
+            if os.path.exists(path):
+                os.replace(path, path + '.pre-shard')
+        return ShardedData(self, loaded=data)
+
+    def write_shard(self, category, entries):
+        if category not in self.shard_files:
+            self.shard_files[category] = self.shard_name(category)
+        path = os.path.join(self.shard_dir, self.shard_files[category])
+        write_json_atomic(path, entries)
+        self.shard_signatures[category] = file_signature(path)
+
+    def write_manifest(self):
+        write_json_atomic(self.manifest_file, {'version': 1, 'shards': self.shard_files})
+
+    def apply(self, data, changes):
+        categories = {category for category, _, _ in changes}
+        new_categories = [category for category in categories if category not in self.shard_files]
+        try:
+            for category in categories:
+                self.write_shard(category, data.get(category, {}))
+            if new_categories:
+                self.write_manifest()
+        except BaseException:
+            # 呼叫端會回滾記憶體中的資料：已寫入的分片下次重新載入時重讀，新分類不寫進之後的 manifest
+            for category in categories:
+                self.shard_signatures.pop(category, None)
+            for category in new_categories:
+                self.shard_files.pop(category, None)
+            raise
+
+    def save(self, data):
+        # 尚未載入的分類在磁碟上沒有變動，不需要重寫
+        loaded = data.loaded() if isinstance(data, ShardedData) else data
+        os.makedirs(self.shard_dir, exist_ok=True)
+        for category, entries in loaded.items():
+            self.write_shard(category, entries)
+        self.write_manifest()
+
+    def paths(self):
+        return [self.manifest_file] + [os.path.join(self.shard_dir, name) for name in self.shard_files.values()]
+
+    def signature(self):
+        return tuple(file_signature(path) for path in self.paths())
+
+    def reload(self, data):
+        # 依 manifest 與各分片的簽章比對：新出現或簽章改變的分片重新讀取（包括尚未載入的分類），
+        # 沒變的分片沿用已載入的內容，或維持延遲載入
+        previous_files = self.shard_files
+        previous_signatures = self.shard_signatures
+        new_data = self.load()
+        if not isinstance(data, ShardedData):
+            return new_data, diff_data(data, new_data)
+        loaded = data.loaded()
+        for category, name in self.shard_files.items():
+            if (name != previous_files.get(category)
+                    or self.shard_signatures[category] != previous_signatures.get(category)):
+                new_data[category] = self.load_shard(category)
+            elif category in loaded:
+                new_data[category] = loaded[category]
+        return new_data, diff_data(data, new_data)
+
+    def close(self):
+        pass
+
+
+# vault 採用的儲存格式記錄在這個檔案；完整寫入、壓縮與還原都會移除或改名日誌檔，不能依它判斷格式
+LAYOUT_FILE = 'vault_layout.json'
+LAYOUTS = ('json', 'journal', 'sharded')
+
+
+def read_layout(data_dir):
+    try:
+        with open(os.path.join(data_dir, LAYOUT_FILE), 'r') as f:
+            layout = json.load(f)['storage']
+    except FileNotFoundError:
+        return None
+    except (IOError, KeyError, TypeError, json.JSONDecodeError) as e:
+        print(f"Error loading from file: {e}", file=sys.stderr)
+        return None
+    return layout if layout in LAYOUTS else None
+
+
+def write_layout(data_dir, storage):
+    write_json_atomic(os.path.join(data_dir, LAYOUT_FILE), {'version': 1, 'storage': storage})
+
+
+def detect_storage(data_dir, data_file):
+    # 以格式標記為準；沒有標記的舊 vault 依資料夾中現有的檔案判斷，不會觸發分片遷移
+    layout = read_layout(data_dir)
+    if layout is not None:
+        return layout
+    if os.path.exists(os.path.join(data_dir, 'shards', 'manifest.json')):
+        return 'sharded'
+    journal_file = os.path.splitext(data_file)[0] + '.journal'
+    if os.path.exists(journal_file) or os.path.exists(journal_file + '.compacting'):
+        return 'journal'
+    return 'json'
+
+
+def create_storage(storage, data_dir, data_file, vault_lock=None, repair=True):
+    if storage == 'auto':
+        storage = detect_storage(data_dir, data_file)
+    if storage == 'json':
+        return JsonFileStorage(data_file)
+    elif storage == 'journal':
+        return JournalStorage(data_file, vault_lock=vault_lock, repair=repair)
+    elif storage == 'sharded':
+        return ShardedStorage(os.path.join(data_dir, 'shards'), data_file)
+    raise ValueError(f"Unknown storage mode: {storage}")
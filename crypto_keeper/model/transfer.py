@@ -0,0 +1,216 @@
+# crypto_keeper/model/transfer.py
+# 大量匯入與匯出。每一筆紀錄都以 dict 在 generator 之間傳遞，不會一次讀進整個檔案：
+#   {'category', 'identifier', 'fields': {schema key: value}, 'custom_fields': [(name, value)]}
+#   {'category', 'identifier', 'value': 字串}       # 沒有分欄位的項目（例如 cli.py put 存入的值）
+#
+# 可攜式加密封存檔（.ckarchive）：
+#   第一行為 JSON 標頭，內含以 passphrase（scrypt）包裝的隨機封存金鑰，格式與 vault_header.json 相同；
+#   之後為一連串 frame：length:u32 | final:u8 | nonce + AES-GCM(zlib(JSON lines))。
+#   nonce 為固定前綴加上 frame 序號，associated data 綁定標頭、序號與是否為最後一個 frame，
+#   frame 被刪除、重排或截斷都會在讀取時發現。
+import csv
+import hashlib
+import json
+import os
+import struct
+import zlib
+
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.exceptions import InvalidTag
+
+from model import kdf
+from model.schema import get_fields
+
+ARCHIVE_FORMAT = 'crypto-keeper-archive'
+ARCHIVE_VERSION = 1
+ARCHIVE_SUFFIX = '.ckarchive'
+# 累積到這個大小（未壓縮）才封裝成一個 frame
+FRAME_BYTES = 256 * 1024
+FRAME_HEADER = struct.Struct('>IB')
+NONCE_PREFIX_BYTES = 4
+
+IDENTIFIER_COLUMNS = ('identifier', 'name')
+
+
+class ArchiveError(ValueError):
+    pass
+
+
+# ---- CSV / JSON lines ----
+def normalize(name):
+    return name.strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def resolve_field(category, column, mapping):
+    # 欄名對應到分類的預設欄位：先看 --map，再比對 schema 的 key 或畫面上的標籤；找不到時為 None
+    target = mapping.get(column, mapping.get(normalize(column), column))
+    wanted = normalize(target)
+    for field in get_fields(category):
+        if wanted in (field.key, normalize(field.label)):
+            return field.key
+    return None
+
+
+def to_record(row, category=None, mapping=None, line=None):
+    """Turn one CSV row / JSON object into an import record.
+
+    ``category`` and ``identifier`` (or ``name``) columns place the entry;
+    ``category`` is the fallback when the row has none. Columns that match
+    the category's fields (by key or label, or through ``mapping``) fill
+    them; every other non-empty column becomes a custom field. A row with a
+    ``value`` key and no fields is imported as a plain value.
+    """
+    mapping = mapping or {}
+    where = f"line {line}: " if line is not None else ''
+    columns = {normalize(mapping.get(name, name)): name for name in row}
+
+    row_category = row.get(columns['category']) if 'category' in columns else None
+    category = row_category or category
+    if not category:
+        raise ValueError(f"{where}no category (add a category column or pass one)")
+    identifier = next((row[columns[name]] for name in IDENTIFIER_COLUMNS if row.get(columns.get(name))), None)
+    if not identifier:
+        raise ValueError(f"{where}no identifier or name")
+    identifier = str(identifier).strip()
+
+    placed = {columns[name] for name in ('category',) + IDENTIFIER_COLUMNS if name in columns}
+    fields = {}
+    custom_fields = []
+    # export 產生的 JSON lines 已經分好欄位
+    if isinstance(row.get('fields'), dict):
+        placed.add('fields')
+        fields.update(row['fields'])
+    if isinstance(row.get('custom_fields'), list):
+        placed.add('custom_fields')
+        custom_fields.extend((name, value) for name, value in row['custom_fields'])
+    # get/export 列出的附件只有名稱與大小，檔案本身不隨匯入搬移
+    if isinstance(row.get('attachments'), list):
+        placed.add('attachments')
+    if 'value' in row and not fields and not custom_fields and len(row) - len(placed) == 1:
+        return {'category': category, 'identifier': identifier, 'value': row['value']}
+
+    for column, value in row.items():
+        if column in placed or value is None or value == '':
+            continue
+        value = str(value)
+        key = resolve_field(category, column, mapping)
+        if key is not None:
+            fields[key] = value
+        else:
+            custom_fields.append((mapping.get(column, column), value))
+    return {'category': category, 'identifier': identifier, 'fields': fields, 'custom_fields': custom_fields}
+
+
+def read_csv(file, category=None, mapping=None):
+    # 第一列為欄名；依序產生紀錄，不保留已讀過的列
+    reader = csv.DictReader(file)
+    for row in reader:
+        yield to_record(row, category, mapping, line=reader.line_num)
+
+
+def read_jsonl(file, category=None, mapping=None):
+    for line_number, line in enumerate(file, 1):
+        if line.strip():
+            yield to_record(json.loads(line), category, mapping, line=line_number)
+
+
+# ---- 加密封存檔 ----
+def frame_associated_data(header_digest, index, final):
+    return header_digest + struct.pack('>QB', index, final)
+
+
+class ArchiveWriter:
+    """Write records to a portable archive encrypted under ``passphrase``.
+
+    Records are buffered as JSON lines and sealed in compressed frames of
+    about :data:`FRAME_BYTES`, so memory stays flat whatever the vault size.
+    """
+
+    def __init__(self, file, passphrase, params=None):
+        self.file = file
+        key = os.urandom(32)
+        params = params or kdf.calibrate()
+        self.nonce_prefix = os.urandom(NONCE_PREFIX_BYTES)
+        header = {
+            'format': ARCHIVE_FORMAT,
+            'version': ARCHIVE_VERSION,
+            'key': kdf.create_header(key, passphrase, params),
+            'nonce_prefix': self.nonce_prefix.hex(),
+        }
+        header_line = json.dumps(header, sort_keys=True).encode('utf-8') + b'\n'
+        self.header_digest = hashlib.sha256(header_line).digest()
+        self.aead = AESGCM(key)
+        self.buffer = []
+        self.buffered = 0
+        self.index = 0
+        self.count = 0
+        file.write(header_line)
+
+    def write(self, record):
+        line = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        self.buffer.append(line)
+        self.buffered += len(line) + 1
+        self.count += 1
+        if self.buffered >= FRAME_BYTES:
+            self.flush_frame(final=False)
+
+    def flush_frame(self, final):
+        payload = zlib.compress(b'\n'.join(self.buffer), 6)
+        nonce = self.nonce_prefix + struct.pack('>Q', self.index)
+        sealed = nonce + self.aead.encrypt(nonce, payload, frame_associated_data(self.header_digest, self.index, final))
+        self.file.write(FRAME_HEADER.pack(len(sealed), final))
+        self.file.write(sealed)
+        self.buffer = []
+        self.buffered = 0
+        self.index += 1
+
+    def close(self):
+        # 最後一個 frame 一定會寫出（可能是空的），讀取端以它確認檔案完整
+        self.flush_frame(final=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.close()
+
+
+def read_archive(file, passphrase):
+    """Yield the records of an archive written by :class:`ArchiveWriter`.
+
+    Raises :class:`kdf.PassphraseError` for a wrong passphrase and
+    :class:`ArchiveError` if the archive was modified or truncated.
+    """
+    header_line = file.readline()
+    try:
+        header = json.loads(header_line)
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        raise ArchiveError("Not a Crypto Keeper archive")
+    if not isinstance(header, dict) or header.get('format') != ARCHIVE_FORMAT:
+        raise ArchiveError("Not a Crypto Keeper archive")
+    if header.get('version') != ARCHIVE_VERSION:
+        raise ArchiveError(f"Unsupported archive version: {header.get('version')}")
+
+    aead = AESGCM(kdf.unlock(header['key'], passphrase, use_cache=False))
+    header_digest = hashlib.sha256(header_line).digest()
+    index = 0
+    while True:
+        frame_header = file.read(FRAME_HEADER.size)
+        if len(frame_header) < FRAME_HEADER.size:
+            raise ArchiveError("Archive is truncated")
+        length, final = FRAME_HEADER.unpack(frame_header)
+        sealed = file.read(length)
+        if len(sealed) < length:
+            raise ArchiveError("Archive is truncated")
+        try:
+            payload = aead.decrypt(sealed[:12], sealed[12:], frame_associated_data(header_digest, index, final))
+        except InvalidTag:
+            raise ArchiveError(f"Archive frame {index} failed authentication")
+        lines = zlib.decompress(payload)
+        if lines:
+            for line in lines.split(b'\n'):
+                yield json.loads(line)
+        if final:
+            return
+        index += 1
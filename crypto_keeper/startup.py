@@ -0,0 +1,76 @@
+# crypto_keeper/startup.py
+# 啟動各階段的計時，用來檢查打包後的執行檔多快畫出第一個畫面。
+#
+#   CRYPTO_KEEPER_STARTUP_TRACE=1 python main.py            # 載入 vault 後在 stderr 印出各階段耗時
+#   CRYPTO_KEEPER_STARTUP_BUDGET_MS=400 ./CryptoKeeper      # 同上，並在載入後結束；第一次繪製超過預算時結束代碼為 1
+#
+# 這個模組在 main.py 最先匯入，只能使用標準函式庫中已載入的模組。
+import os
+import sys
+import time
+
+BUDGET_MS = float(os.environ.get('CRYPTO_KEEPER_STARTUP_BUDGET_MS') or 0)
+ENABLED = bool(os.environ.get('CRYPTO_KEEPER_STARTUP_TRACE')) or BUDGET_MS > 0
+
+_start = time.perf_counter()
+_phases = []  # (phase, 與上一階段之間的秒數, 從啟動起的秒數)
+_last = _start
+
+
+def process_uptime():
+    # 直譯器（以及打包執行檔的解壓）在 main.py 之前花的時間；只有 Linux 可以取得，其他平台為 None
+    try:
+        with open('/proc/self/stat', 'rb') as f:
+            fields = f.read().rsplit(b')', 1)[1].split()
+        with open('/proc/uptime', 'rb') as f:
+            uptime = float(f.read().split()[0])
+        return uptime - int(fields[19]) / os.sysconf('SC_CLK_TCK')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+_before_main = process_uptime() if ENABLED else None
+
+
+def mark(phase):
+    global _last
+    if not ENABLED:
+        return
+    now = time.perf_counter()
+    _phases.append((phase, now - _last, now - _start))
+    _last = now
+
+
+def elapsed(phase):
+    for name, _, total in _phases:
+        if name == phase:
+            return total
+    return None
+
+
+def report(file=sys.stderr):
+    lines = [f"{'phase':<32}{'delta ms':>10}{'total ms':>10}"]
+    if _before_main is not None:
+        lines.append(f"{'process start -> main.py':<32}{_before_main * 1000:>10.1f}{'':>10}")
+    for phase, delta, total in _phases:
+        lines.append(f"{phase:<32}{delta * 1000:>10.1f}{total * 1000:>10.1f}")
+    first_paint = time_to_first_paint()
+    if first_paint is not None:
+        since = 'process start' if _before_main is not None else 'main.py'
+        verdict = ''
+        if BUDGET_MS:
+            verdict = f", {'within' if within_budget() else 'OVER'} budget of {BUDGET_MS:.0f} ms"
+        lines.append(f"time to first paint: {first_paint * 1000:.1f} ms since {since}{verdict}")
+    print('\n'.join(lines), file=file)
+
+
+def time_to_first_paint():
+    first_paint = elapsed('first paint')
+    if first_paint is None:
+        return None
+    return first_paint + (_before_main or 0.0)
+
+
+def within_budget():
+    first_paint = time_to_first_paint()
+    return first_paint is not None and first_paint * 1000 <= BUDGET_MS
@@ -0,0 +1,94 @@
+# crypto_keeper/view/diagnostics.py
+# 隱藏的診斷面板（Ctrl+Shift+D），顯示 model/metrics.py 收集到的計時與計數
+from PySide6.QtWidgets import (
+    QDialog, QVBoxLayout, QHBoxLayout, QPushButton, QPlainTextEdit, QCheckBox, QFileDialog
+)
+from PySide6.QtGui import QFont
+from PySide6.QtCore import QTimer
+from model import metrics
+
+REFRESH_MS = 1000
+
+
+def format_snapshot(data):
+    lines = [f"{'operation':<32}{'count':>8}{'mean ms':>10}{'max ms':>10}{'total s':>10}"]
+    for name in sorted(data['timers']):
+        timer = data['timers'][name]
+        lines.append(
+            f"{name:<32}{timer['count']:>8}{timer['mean_s'] * 1000:>10.2f}{timer['max_s'] * 1000:>10.2f}{timer['sum_s']:>10.3f}"
+        )
+    if data['counters']:
+        lines.append('')
+        for name in sorted(data['counters']):
+            lines.append(f"{name:<32}{data['counters'][name]:>18,}")
+    return '\n'.join(lines)
+
+
+class DiagnosticsDialog(QDialog):
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle('Diagnostics')
+        self.resize(640, 400)
+        layout = QVBoxLayout(self)
+
+        self.enabled_checkbox = QCheckBox('Collect metrics')
+        self.enabled_checkbox.setChecked(metrics.ENABLED)
+        self.enabled_checkbox.toggled.connect(self.set_enabled)
+        layout.addWidget(self.enabled_checkbox)
+
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        font = QFont('Monospace')
+        font.setStyleHint(QFont.TypeWriter)
+        self.text.setFont(font)
+        layout.addWidget(self.text)
+
+        button_layout = QHBoxLayout()
+        reset_button = QPushButton('Reset')
+        reset_button.clicked.connect(self.reset)
+        json_button = QPushButton('Export JSON')
+        json_button.clicked.connect(lambda: self.export('JSON (*.json)', metrics.write_json))
+        prometheus_button = QPushButton('Export Prometheus')
+        prometheus_button.clicked.connect(lambda: self.export('Prometheus textfile (*.prom)', metrics.write_textfile))
+        button_layout.addWidget(reset_button)
+        button_layout.addWidget(json_button)
+        button_layout.addWidget(prometheus_button)
+        layout.addLayout(button_layout)
+
+        # 只在面板開啟時定時更新
+        self.timer = QTimer(self)
+        self.timer.setInterval(REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+        self.refresh()
+
+    def showEvent(self, event):
+        self.timer.start()
+        self.refresh()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+
+    def set_enabled(self, enabled):
+        if enabled:
+            metrics.enable()
+        else:
+            metrics.disable()
+        self.refresh()
+
+    def reset(self):
+        metrics.reset()
+        self.refresh()
+
+    def refresh(self):
+        data = metrics.snapshot()
+        if not data['timers'] and not data['counters']:
+            self.text.setPlainText('No data yet.' if data['enabled'] else 'Metrics are disabled.')
+        else:
+            self.text.setPlainText(format_snapshot(data))
+
+    def export(self, file_filter, write):
+        path, _ = QFileDialog.getSaveFileName(self, 'Export metrics', '', file_filter)
+        if path:
+            write(path)
@@ -0,0 +1,165 @@
+# crypto_keeper/view/identifier_list.py
+import bisect
+
+from PySide6.QtCore import Qt, QAbstractListModel, QModelIndex
+
+# 每次 fetchMore 交給 view 的列數
+FETCH_BATCH = 500
+
+
+class IdentifierListModel(QAbstractListModel):
+    """List model over ``(category, identifier)`` rows for a ``QListView``.
+
+    In category mode rows are kept sorted and store/delete notifications from
+    the vault become single-row insert/remove signals. Rows are handed to
+    the view in batches through ``canFetchMore``/``fetchMore``.
+    """
+
+    EntryRole = Qt.UserRole
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []  # 依 identifier 遞增排序（搜尋模式時為搜尋結果的順序）
+        self.fetched = 0
+        self.category = None
+        self.show_category = False
+        self.descending = False
+        # 顯示搜尋結果時保留的 (category, rows)；清除查詢時直接換回，不必重新排序整個分類
+        self.category_rows = None
+
+    # ---- 重設內容 ----
+    def set_category(self, category, identifiers):
+        self.beginResetModel()
+        if self.category_rows is not None and self.category_rows[0] == category:
+            rows = self.category_rows[1]
+        else:
+            # 同一分類的 tuple 只需依 identifier 排序，比較字串比比較 tuple 快
+            rows = [(category, identifier) for identifier in sorted(identifiers)]
+        self.category_rows = None
+        self.category = category
+        self.show_category = False
+        self.rows = rows
+        self.fetched = min(FETCH_BATCH, len(self.rows))
+        self.endResetModel()
+
+    def set_results(self, entries, show_category):
+        # 搜尋結果保留排名順序，不做增量更新
+        self.beginResetModel()
+        if self.category is not None:
+            self.category_rows = (self.category, self.rows)
+        self.category = None
+        self.show_category = show_category
+        self.rows = list(entries)
+        self.fetched = min(FETCH_BATCH, len(self.rows))
+        self.endResetModel()
+
+    # ---- 列與位置的轉換（遞減排序時反轉） ----
+    def position_of_row(self, row):
+        return len(self.rows) - 1 - row if self.descending and self.category is not None else row
+
+    def entry(self, row):
+        return self.rows[self.position_of_row(row)]
+
+    def row_of(self, entry):
+        if self.category is not None:
+            position = bisect.bisect_left(self.rows, entry)
+            if position >= len(self.rows) or self.rows[position] != entry:
+                return -1
+            row = self.position_of_row(position)
+        elif entry in self.rows:
+            row = self.rows.index(entry)
+        else:
+            return -1
+        # 確保該列已交給 view
+        while row >= self.fetched and self.canFetchMore(QModelIndex()):
+            self.fetchMore(QModelIndex())
+        return row
+
+    # ---- QAbstractListModel ----
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else self.fetched
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or index.row() >= self.fetched:
+            return None
+        category, identifier = self.entry(index.row())
+        if role == Qt.DisplayRole:
+            return f"{identifier}  [{category}]" if self.show_category else identifier
+        if role == self.EntryRole:
+            return (category, identifier)
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.fetched < len(self.rows)
+
+    def fetchMore(self, parent=QModelIndex()):
+        count = min(FETCH_BATCH, len(self.rows) - self.fetched)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.fetched, self.fetched + count - 1)
+        self.fetched += count
+        self.endInsertRows()
+
+    def sort(self, column=0, order=Qt.AscendingOrder):
+        descending = order == Qt.DescendingOrder
+        if self.category is None or descending == self.descending:
+            return
+        self.layoutAboutToBeChanged.emit()
+        self.descending = descending
+        self.layoutChanged.emit()
+
+    # ---- 增量更新 ----
+    def insert_entry(self, entry):
+        position = bisect.bisect_left(self.rows, entry)
+        if position < len(self.rows) and self.rows[position] == entry:
+            return
+        row = len(self.rows) - position if self.descending else position
+        if row < self.fetched or self.fetched == len(self.rows):
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.rows.insert(position, entry)
+            self.fetched += 1
+            self.endInsertRows()
+        else:
+            # 尚未交給 view 的範圍，不需要通知
+            self.rows.insert(position, entry)
+
+    def remove_entry(self, entry):
+        position = bisect.bisect_left(self.rows, entry)
+        if position >= len(self.rows) or self.rows[position] != entry:
+            return
+        row = self.position_of_row(position)
+        if row < self.fetched:
+            self.beginRemoveRows(QModelIndex(), row, row)
+            del self.rows[position]
+            self.fetched -= 1
+            self.endRemoveRows()
+        else:
+            del self.rows[position]
+
+    def forget_category_rows(self):
+        # 重新載入或切換 vault 後保留的列已不正確
+        self.category_rows = None
+
+    def apply_changes(self, changes):
+        # 只有分類模式做增量更新；搜尋模式由呼叫端重新搜尋，這裡只更新保留的分類列
+        if self.category is None:
+            if self.category_rows is not None:
+                category, rows = self.category_rows
+                for change_category, identifier, encrypted_data in changes:
+                    if change_category != category:
+                        continue
+                    entry = (category, identifier)
+                    position = bisect.bisect_left(rows, entry)
+                    present = position < len(rows) and rows[position] == entry
+                    if encrypted_data is None and present:
+                        del rows[position]
+                    elif encrypted_data is not None and not present:
+                        rows.insert(position, entry)
+            return
+        for category, identifier, encrypted_data in changes:
+            if category != self.category:
+                continue
+            if encrypted_data is None:
+                self.remove_entry((category, identifier))
+            else:
+                self.insert_entry((category, identifier))
@@ -1,13 +1,27 @@
 # crypto_keeper/view/mainwindow.py
 
 from PySide6.QtWidgets import (
-    QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLineEdit, QPushButton, QListWidget, QLabel, QApplication, QListWidget, QSizePolicy, QScrollArea
+    QWidget, QVBoxLayout, QHBoxLayout, QComboBox, QLineEdit, QPushButton, QListView, QLabel, QApplication, QSizePolicy, QScrollArea, QCheckBox,
+    QStackedWidget
 )
 from PySide6.QtGui import QFont
-from PySide6.QtGui import QIcon
-from PySide6.QtCore import Qt
+from PySide6.QtGui import QIcon, QShortcut, QKeySequence
+from PySide6.QtCore import Qt, Signal
 import os
 import sys
+from model.schema import CATEGORIES, get_fields
+from model.profiles import DEFAULT_PROFILE
+from model import metrics
+from view.identifier_list import IdentifierListModel
+
+# 搜尋結果最多顯示的筆數
+SEARCH_LIMIT = 1000
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB', 'GB'):
+        if size < 1024 or unit == 'GB':
+            return f'{size:.0f} {unit}' if unit == 'B' else f'{size:.1f} {unit}'
+        size /= 1024
 
 def get_base_dir():
     if getattr(sys, 'frozen', False):
@@ -19,12 +33,46 @@ def get_base_dir():
         return os.path.dirname(os.path.abspath(__file__))
 
 class Mainwindow(QWidget):
-    def __init__(self, model):
+    # model 的變更通知可能來自背景執行緒，透過 signal 轉到 UI 執行緒處理
+    model_changed = Signal(object)
+    # 附件列的按鈕，參數為附件 id
+    attachment_save_requested = Signal(str)
+    attachment_remove_requested = Signal(str)
+    # 重新載入整個 vault 後要求在背景重建搜尋索引，參數為 model
+    search_index_requested = Signal(object)
+
+    def __init__(self, model=None):
         super().__init__()
-        self.model = model
-        self.init_ui()
+        self.model = None
+        self.search_index = None
+        self.busy = False
         self.custom_fields = []
+        self.attachment_rows = []
+        self.attachment_names = {}
+        # 各分類的表單頁只建立一次，之後切換分類只切換 QStackedWidget
+        self.category_pages = {}
+        self.field_inputs = {}
+        # 目前有內容的預設欄位與自定義欄位，讓存檔按鈕的判斷不必每次掃描所有欄位
+        self.filled_fields = set()
+        self.filled_custom_fields = set()
+        self.init_ui()
         self.resize(600, 800)
+        # 沒有 model 時先顯示視窗，vault 在背景載入完成後再呼叫 set_model
+        if model is None:
+            self.set_busy(True, 'Loading vault...')
+        else:
+            self.set_model(model)
+
+    def set_model(self, model):
+        # 切換 vault 時改為接收新 vault 的變更通知；搜尋索引由 controller 在背景建立後以 set_search_index 交給畫面
+        if self.model is not None:
+            self.model.remove_listener(self.on_model_changes)
+        self.model = model
+        self.search_index = None
+        self.data_list_model.forget_category_rows()
+        self.model.add_listener(self.on_model_changes)
+        self.update_data_list(self.category_combo.currentIndex())
+        self.set_busy(False)
 
     def init_ui(self):
         self.setWindowTitle('Crypto Keeper')
@@ -39,10 +87,20 @@ class Mainwindow(QWidget):
         icon_path = os.path.join(base_dir, 'icon.png')
         self.setWindowIcon(QIcon(icon_path))
 
+        # Vault（profile）切換
+        vault_layout = QHBoxLayout()
+        vault_layout.addWidget(QLabel('Vault:'))
+        self.vault_combo = QComboBox()
+        self.vault_combo.addItem(DEFAULT_PROFILE)
+        vault_layout.addWidget(self.vault_combo, 1)
+        self.new_vault_button = QPushButton('New Vault...')
+        vault_layout.addWidget(self.new_vault_button)
+        layout.addLayout(vault_layout)
+
         # Category combo box
         category_layout = QHBoxLayout()
         category_label = QComboBox()
-        category_label.addItems(['Wallet', 'Exchange', 'Others'])
+        category_label.addItems(CATEGORIES)
         self.category_combo = category_label
         category_layout.addWidget(category_label)
         layout.addLayout(category_layout)
@@ -61,10 +119,21 @@ class Mainwindow(QWidget):
         identifier_layout.addWidget(self.identifier_input)
         layout.addLayout(identifier_layout)
 
-        # Data inputs
+        # Data inputs：上方為各分類的表單頁，下方為自定義欄位
         self.data_input_widget = QWidget()
         self.data_input_layout = QVBoxLayout(self.data_input_widget)
         self.data_input_layout.setAlignment(Qt.AlignTop)  # 確保內容對齊頂部
+        self.page_stack = QStackedWidget()
+        self.data_input_layout.addWidget(self.page_stack)
+        self.custom_field_widget = QWidget()
+        self.custom_field_layout = QVBoxLayout(self.custom_field_widget)
+        self.custom_field_layout.setContentsMargins(0, 0, 0, 0)
+        self.data_input_layout.addWidget(self.custom_field_widget)
+        # 目前項目的附件，只列出名稱與大小；檔案內容在另存時才解密
+        self.attachment_widget = QWidget()
+        self.attachment_layout = QVBoxLayout(self.attachment_widget)
+        self.attachment_layout.setContentsMargins(0, 0, 0, 0)
+        self.data_input_layout.addWidget(self.attachment_widget)
 
         # 將 data_input_widget 封裝在 QScrollArea 中
         self.scroll_area = QScrollArea()
@@ -84,6 +153,8 @@ class Mainwindow(QWidget):
         self.add_field_button = QPushButton('Add Custom Field')
         self.add_field_button.clicked.connect(self.add_custom_field)
         button_layout.addWidget(self.add_field_button)
+        self.attach_button = QPushButton('Attach File...')
+        button_layout.addWidget(self.attach_button)
         self.reset_button = QPushButton('Reset')  
         self.reset_button.clicked.connect(self.reset_fields)  
         button_layout.addWidget(self.reset_button)  
@@ -100,153 +171,217 @@ class Mainwindow(QWidget):
         button_layout2.addWidget(self.delete_button)  # 將刪除按鈕添加到第二個按鈕佈局
         layout.addLayout(button_layout2)
 
-        # Data list
-        self.data_list = QListWidget()
-        self.data_list.currentItemChanged.connect(self.enable_delete_button)
+        # Search
+        search_layout = QHBoxLayout()
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText('Search...')
+        self.search_input.setClearButtonEnabled(True)
+        self.search_input.textChanged.connect(self.apply_search)
+        self.search_all_checkbox = QCheckBox('All categories')
+        self.search_all_checkbox.toggled.connect(self.apply_search)
+        self.sort_button = QPushButton('A-Z')
+        self.sort_button.setCheckable(True)
+        self.sort_button.toggled.connect(self.toggle_sort_order)
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_all_checkbox)
+        search_layout.addWidget(self.sort_button)
+        layout.addLayout(search_layout)
+
+        # Data list：QListView + IdentifierListModel，只繪製可見的列
+        self.data_list_model = IdentifierListModel(self)
+        self.data_list = QListView()
+        self.data_list.setModel(self.data_list_model)
+        self.data_list.setUniformItemSizes(True)
+        self.data_list.activated.connect(self.jump_to_search_result)
         self.data_list.setFixedHeight(150)
+        self.model_changed.connect(self.apply_model_changes)
         layout.addWidget(self.data_list)
 
+        # 載入或寫入中的狀態
+        self.status_label = QLabel()
+        self.status_label.setVisible(False)
+        layout.addWidget(self.status_label)
+        # 載入或寫入中停用的控制項
+        self.editing_controls = [
+            self.vault_combo, self.new_vault_button, self.category_combo, self.identifier_input, self.scroll_area, self.add_field_button, self.attach_button,
+            self.reset_button,
+            self.retrieve_button, self.search_input, self.search_all_checkbox, self.sort_button,
+        ]
+
         # Set size policy for all widgets
         size_policy = QSizePolicy(QSizePolicy.Expanding, QSizePolicy.Expanding)
         self.data_input_widget.setSizePolicy(size_policy)
         self.data_list.setSizePolicy(size_policy)
 
+        # 隱藏的診斷面板
+        self.diagnostics_dialog = None
+        QShortcut(QKeySequence('Ctrl+Shift+D'), self, self.show_diagnostics)
+
         # update data list when opening the window
-        self.category_combo.currentIndexChanged.connect(self.update_data_inputs)
-        self.update_data_inputs(0) 
-        self.update_data_list(0)
-        self.set_scroll_area_font_size(0)
+        # 透過 lambda 呼叫，metrics 啟用後換上的計時版本才會生效
+        self.category_combo.currentIndexChanged.connect(lambda index: self.update_data_inputs(index))
+        self.update_data_inputs(0)
+
+    def set_vaults(self, names, current):
+        # 以程式設定選項，不觸發 activated
+        self.vault_combo.blockSignals(True)
+        self.vault_combo.clear()
+        self.vault_combo.addItems(names)
+        self.vault_combo.setCurrentText(current)
+        self.vault_combo.blockSignals(False)
 
-        # double click to copy data
-        self.connect_data_input_events()
+    def update_data_list(self, index):
+        if self.model is None:
+            return
+        if self.search_input.text().strip():
+            self.apply_search()
+            return
+        category = self.category_combo.itemText(index)
+        self.data_list_model.set_category(category, self.model.data.get(category, {}))
 
-        # Set font size for newly added widgets inside the scroll area
-        self.category_combo.currentIndexChanged.connect(self.set_scroll_area_font_size)
+    def on_model_changes(self, changes):
+        self.model_changed.emit(changes)
 
-    def set_scroll_area_font_size(self, index):
-        for widget in self.data_input_widget.findChildren(QWidget):
-            widget.setFont(self.scroll_area.font())
+    def set_search_index(self, model, index):
+        # 背景建好的索引已包含建立前送出的變更，之後的變更依序送到這裡
+        if model is not self.model:
+            return
+        self.search_index = index
+        if not self.busy:
+            self.status_label.setVisible(False)
+        if self.search_input.text().strip():
+            self.apply_search()
+
+    def apply_model_changes(self, changes):
+        if changes is None:
+            # 重建完成前沿用舊的索引，輸入時不必等待
+            self.search_index_requested.emit(self.model)
+            self.data_list_model.forget_category_rows()
+        else:
+            if self.search_index is not None:
+                self.search_index.on_changes(changes)
+            self.data_list_model.apply_changes(changes)
+        # 儲存或刪除只更新受影響的列；重新載入或搜尋中則重建列表
+        if changes is None or self.search_input.text().strip():
+            self.update_data_list(self.category_combo.currentIndex())
+
+    def toggle_sort_order(self, descending):
+        self.sort_button.setText('Z-A' if descending else 'A-Z')
+        self.data_list_model.sort(0, Qt.DescendingOrder if descending else Qt.AscendingOrder)
+
+    def apply_search(self):
+        if self.model is None:
+            return
+        query = self.search_input.text()
+        if not query.strip():
+            category = self.category_combo.currentText()
+            self.data_list_model.set_category(category, self.model.data.get(category, {}))
+            return
 
-    def update_data_list(self, index):
-        category = self.category_combo.itemText(index)
-        self.data_list.clear()
-        if category in self.model.data:
-            self.data_list.addItems(self.model.data[category].keys())
+        search_all = self.search_all_checkbox.isChecked()
+        if self.search_index is None:
+            # 索引仍在背景建立，完成後 set_search_index 會套用目前的查詢；不留下前一個 vault 的結果
+            self.data_list_model.set_results([], show_category=search_all)
+            if not self.busy:
+                self.status_label.setText('Indexing...')
+                self.status_label.setVisible(True)
+            return
+        category = None if search_all else self.category_combo.currentText()
+        results = self.search_index.search(query, category, limit=SEARCH_LIMIT)
+        # 跨分類搜尋時在名稱後顯示分類
+        self.data_list_model.set_results(results, show_category=search_all)
+
+    def current_entry(self):
+        # 回傳目前選取項目的 (category, identifier)，未選取時為 None
+        index = self.data_list.currentIndex()
+        if not index.isValid():
+            return None
+        return self.data_list_model.entry(index.row())
+
+    def current_identifier(self):
+        entry = self.current_entry()
+        return entry[1] if entry else None
+
+    def jump_to_search_result(self, index=None):
+        # 跨分類搜尋結果：切換到該分類並選取對應項目
+        if not self.search_all_checkbox.isChecked():
+            return
+        if index is None:
+            index = self.data_list.currentIndex()
+        category, identifier = self.data_list_model.entry(index.row())
+        self.search_all_checkbox.setChecked(False)
+        self.category_combo.setCurrentIndex(self.category_combo.findText(category))
+        self.select_entry(category, identifier)
+
+    def select_entry(self, category, identifier):
+        row = self.data_list_model.row_of((category, identifier))
+        if row >= 0:
+            self.data_list.setCurrentIndex(self.data_list_model.index(row))
 
     def update_data_inputs(self, index):
-        # 移除佈局中的所有 widgets
-        for i in reversed(range(self.data_input_layout.count())):
-            layout_item = self.data_input_layout.itemAt(i)
-            widget = layout_item.widget()
-            if widget is not None:
-                widget.setParent(None)
-                widget.deleteLater()  # 確保釋放資源
-
-        if index == 0:  # Wallet
-            self.add_wallet_inputs()
-        elif index == 1:  # Exchange
-            self.add_exchange_inputs()
-        else:  # Others
-            # 為 Others 分類不加載任何預設欄位
-            pass
-
-    def add_wallet_inputs(self):
-        wallet_seed_label = QLabel('Wallet Seed:')
-        self.wallet_seed_input = QLineEdit()
-        self.wallet_seed_input.textChanged.connect(self.update_save_button_state)
-        self.data_input_layout.addWidget(wallet_seed_label)
-        self.data_input_layout.addWidget(self.wallet_seed_input)
-
-        private_key_label = QLabel('Private Key:')
-        self.private_key_input = QLineEdit()
-        self.private_key_input.textChanged.connect(self.update_save_button_state)
-        self.data_input_layout.addWidget(private_key_label)
-        self.data_input_layout.addWidget(self.private_key_input)
-
-    def add_exchange_inputs(self):
-            exchange_account_label = QLabel('Exchange Account:')
-            self.exchange_account_input = QLineEdit()
-            self.exchange_account_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(exchange_account_label)
-            self.data_input_layout.addWidget(self.exchange_account_input)
-
-            exchange_password_label = QLabel('Exchange Password:')
-            self.exchange_password_input = QLineEdit()
-            self.exchange_password_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(exchange_password_label)
-            self.data_input_layout.addWidget(self.exchange_password_input)
-
-            google_2fa_label = QLabel('Google 2FA:')
-            self.google_2fa_input = QLineEdit()
-            self.google_2fa_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(google_2fa_label)
-            self.data_input_layout.addWidget(self.google_2fa_input)
-
-            auth_email_label = QLabel('Auth Email:')
-            self.auth_email_input = QLineEdit()
-            self.auth_email_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(auth_email_label)
-            self.data_input_layout.addWidget(self.auth_email_input)
-
-            auth_phone_label = QLabel('Auth Phone:')
-            self.auth_phone_input = QLineEdit()
-            self.auth_phone_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(auth_phone_label)
-            self.data_input_layout.addWidget(self.auth_phone_input)
-
-            fund_password_label = QLabel('Fund Password:')
-            self.fund_password_input = QLineEdit()
-            self.fund_password_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(fund_password_label)
-            self.data_input_layout.addWidget(self.fund_password_input)
-
-            identity_data_label = QLabel('Identity Data:')
-            self.identity_data_input = QLineEdit()
-            self.identity_data_input.textChanged.connect(self.update_save_button_state)
-            self.data_input_layout.addWidget(identity_data_label)
-            self.data_input_layout.addWidget(self.identity_data_input)
-
-    def connect_data_input_events(self):
-        if self.category_combo.currentIndex() == 0:  # Wallet
-            self.connect_wallet_events()
-        elif self.category_combo.currentIndex() == 1:  # Exchange
-            self.connect_exchange_events()
-        else:  # Others
-            pass
-
-    def connect_wallet_events(self):
-        self.wallet_seed_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.wallet_seed_input)
-        self.private_key_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.private_key_input)
-
-    def connect_exchange_events(self):
-        self.exchange_account_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.exchange_account_input)
-        self.exchange_password_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.exchange_password_input)
-        self.google_2fa_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.google_2fa_input)
-        self.auth_email_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.auth_email_input)
-        self.auth_phone_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.auth_phone_input)
-        self.fund_password_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.fund_password_input)
-        self.identity_data_input.mouseDoubleClickEvent = lambda event: self.copy_to_clipboard(self.identity_data_input)
-
-    def copy_to_clipboard(self, input_field):
-        input_field.selectAll()
-        QApplication.clipboard().setText(input_field.selectedText())
+        category = self.category_combo.itemText(index)
+        page = self.category_pages.get(category)
+        if page is None:
+            page = self.build_category_page(category)
+
+        # 非目前的頁面不佔空間，讓 QStackedWidget 的高度跟著目前頁面
+        current = self.page_stack.currentWidget()
+        if current is not None and current is not page:
+            current.setSizePolicy(QSizePolicy.Ignored, QSizePolicy.Ignored)
+            # 離開的頁面保留元件但清掉內容，不讓明文留在隱藏的欄位中
+            for input_field in current.findChildren(QLineEdit):
+                input_field.clear()
+        page.setSizePolicy(QSizePolicy.Expanding, QSizePolicy.Minimum)
+        self.page_stack.setCurrentWidget(page)
+
+        self.filled_fields = {
+            key for key, input_field in self.field_inputs[category].items() if input_field.text().strip()
+        }
+        self.update_save_button_state()
 
+    def build_category_page(self, category):
+        page = QWidget()
+        page_layout = QVBoxLayout(page)
+        page_layout.setContentsMargins(0, 0, 0, 0)
+        page_layout.setAlignment(Qt.AlignTop)
+        page.setFont(self.scroll_area.font())
+
+        inputs = {}
+        for field in get_fields(category):
+            label = QLabel(f'{field.label}:')
+            input_field = QLineEdit()
+            input_field.textChanged.connect(
+                lambda text, key=field.key: self.on_field_text_changed(key, text)
+            )
+            self.setup_double_click_to_copy(input_field)
+            page_layout.addWidget(label)
+            page_layout.addWidget(input_field)
+            inputs[field.key] = input_field
+            # 保留 wallet_seed_input 等屬性名稱
+            setattr(self, f'{field.key}_input', input_field)
+
+        self.field_inputs[category] = inputs
+        self.category_pages[category] = page
+        self.page_stack.addWidget(page)
+        return page
+
+    def current_field_inputs(self):
+        return self.field_inputs.get(self.category_combo.currentText(), {})
+
+    def on_field_text_changed(self, key, text):
+        filled = bool(text.strip())
+        if filled == (key in self.filled_fields):
+            return
+        if filled:
+            self.filled_fields.add(key)
+        else:
+            self.filled_fields.discard(key)
+        self.update_save_button_state()
 
     def clear_data_fields(self):
         self.identifier_input.clear()
-        if self.category_combo.currentIndex() == 0:  # Wallet
-            self.wallet_seed_input.clear()
-            self.private_key_input.clear()
-        elif self.category_combo.currentIndex() == 1:  # Exchange
-            self.exchange_account_input.clear()
-            self.exchange_password_input.clear()
-            self.google_2fa_input.clear()
-            self.auth_email_input.clear()
-            self.auth_phone_input.clear()
-            self.fund_password_input.clear()
-            self.identity_data_input.clear()
-        else:  # Others
-            pass
+        for input_field in self.current_field_inputs().values():
+            input_field.clear()
 
     def add_custom_field(self, name=None, value=None):
         # Create the custom field container widget
@@ -265,16 +400,21 @@ class Mainwindow(QWidget):
             value_input.setText(value)
         else:
             value_input.setPlaceholderText('Field Value')
-        value_input.textChanged.connect(self.update_save_button_state)
         self.setup_double_click_to_copy(value_input)  # Setup double-click to copy for the value field
         
         custom_field_layout.addWidget(name_widget)
         custom_field_layout.addWidget(value_input)
         
         # Add the entire widget to the layout, not just the QLineEdit components
-        self.data_input_layout.addWidget(custom_field_widget)
+        self.custom_field_layout.addWidget(custom_field_widget)
         self.custom_fields.append((custom_field_widget, name_widget, value_input))  # Include the widget itself
-        self.update_save_button_state()
+
+        # 名稱或內容變動時只重新判斷這一組自定義欄位
+        update = lambda *args: self.on_custom_field_changed(custom_field_widget, name_widget, value_input)
+        value_input.textChanged.connect(update)
+        if isinstance(name_widget, QLineEdit):
+            name_widget.textChanged.connect(update)
+        update()
         
         # Set font size for the new custom field widget
         scroll_area_font = self.scroll_area.font()
@@ -290,62 +430,103 @@ class Mainwindow(QWidget):
         input_field.mouseDoubleClickEvent = on_double_click
 
 
+    def on_custom_field_changed(self, custom_field_widget, name_widget, value_input):
+        filled = bool(name_widget.text().strip() and value_input.text().strip())
+        if filled == (custom_field_widget in self.filled_custom_fields):
+            return
+        if filled:
+            self.filled_custom_fields.add(custom_field_widget)
+        else:
+            self.filled_custom_fields.discard(custom_field_widget)
+        self.update_save_button_state()
+
     def remove_custom_fields(self):
+        if not self.custom_fields:
+            return
         # Remove all custom field widgets from the layout
         for custom_field_widget, name_input, value_input in self.custom_fields:
             # Remove and delete the whole container widget
-            self.data_input_layout.removeWidget(custom_field_widget)
+            self.custom_field_layout.removeWidget(custom_field_widget)
             custom_field_widget.deleteLater()
         self.custom_fields.clear()  # Clear the list after removing all custom fields
+        self.filled_custom_fields.clear()
         self.update_save_button_state()
 
+    def show_attachments(self, attachments):
+        # attachments: [{'id', 'name', 'size'}]
+        self.remove_attachments()
+        for item in attachments:
+            row = QWidget()
+            row_layout = QHBoxLayout(row)
+            label = QLabel(f"{item['name']} ({format_size(item['size'])})")
+            label.setFont(self.scroll_area.font())
+            save_button = QPushButton('Save As...')
+            save_button.clicked.connect(lambda checked=False, i=item['id']: self.attachment_save_requested.emit(i))
+            remove_button = QPushButton('Remove')
+            remove_button.clicked.connect(lambda checked=False, i=item['id']: self.attachment_remove_requested.emit(i))
+            row_layout.addWidget(label, 1)
+            row_layout.addWidget(save_button)
+            row_layout.addWidget(remove_button)
+            self.attachment_layout.addWidget(row)
+            self.attachment_rows.append(row)
+            self.attachment_names[item['id']] = item['name']
+
+    def remove_attachments(self):
+        for row in self.attachment_rows:
+            self.attachment_layout.removeWidget(row)
+            row.deleteLater()
+        self.attachment_rows.clear()
+        self.attachment_names.clear()
+
     def update_save_button_state(self):
         category = self.category_combo.currentText()
         identifier = self.identifier_input.text().strip()
 
-        if not identifier:
+        if not identifier or self.busy:
             self.save_button.setEnabled(False)
             return
 
-        if category == 'Others':
-            has_custom_field = self.has_valid_custom_fields()
-            self.save_button.setEnabled(has_custom_field)
+        if not get_fields(category):  # Others
+            self.save_button.setEnabled(self.has_valid_custom_fields())
         else:
             has_default_field = self.has_valid_default_fields(category)
             has_custom_field = self.has_valid_custom_fields()
             self.save_button.setEnabled(has_default_field or has_custom_field)
 
     def has_valid_default_fields(self, category):
-        default_fields = []
-        if category == 'Wallet':
-            default_fields = [
-                self.wallet_seed_input.text().strip(),
-                self.private_key_input.text().strip()
-            ]
-        elif category == 'Exchange':
-            default_fields = [
-                self.exchange_account_input.text().strip(),
-                self.exchange_password_input.text().strip(),
-                self.google_2fa_input.text().strip(),
-                self.auth_email_input.text().strip(),
-                self.auth_phone_input.text().strip(),
-                self.fund_password_input.text().strip(),
-                self.identity_data_input.text().strip()
-            ]
-
-        return any(default_fields)
+        if category != self.category_combo.currentText():
+            return any(input_field.text().strip() for input_field in self.field_inputs.get(category, {}).values())
+        return bool(self.filled_fields)
 
     def has_valid_custom_fields(self):
-        return any(
-            name_widget.text().strip() and value_input.text().strip()
-            for _, name_widget, value_input in self.custom_fields
-        )
+        return bool(self.filled_custom_fields)
 
 
-    def enable_delete_button(self, item):
-        self.delete_button.setEnabled(item is not None)
+    def enable_delete_button(self, index):
+        self.delete_button.setEnabled(not self.busy and index is not None and index.isValid())
+
+    def set_busy(self, busy, message=''):
+        # 載入或寫入 vault 時停用會改動表單或 vault 的控制項，完成後依目前內容恢復
+        self.busy = busy
+        self.status_label.setText(message)
+        self.status_label.setVisible(bool(message))
+        for control in self.editing_controls:
+            control.setEnabled(not busy)
+        self.update_save_button_state()
+        self.enable_delete_button(self.data_list.currentIndex())
+
+    def show_diagnostics(self):
+        if self.diagnostics_dialog is None:
+            from view.diagnostics import DiagnosticsDialog
+            self.diagnostics_dialog = DiagnosticsDialog(self)
+        self.diagnostics_dialog.show()
+        self.diagnostics_dialog.raise_()
 
     def reset_fields(self):
         self.identifier_input.clear()
         self.clear_data_fields()
-        self.remove_custom_fields()
\ No newline at end of file
+        self.remove_custom_fields()
+        self.remove_attachments()
+
+
+metrics.instrument(Mainwindow, 'update_data_list', 'update_data_inputs', prefix='view')
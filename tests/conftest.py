@@ -0,0 +1,8 @@
+# tests/conftest.py
+# 程式以 crypto_keeper/ 為匯入根目錄（from model.x import ...），測試沿用相同的路徑
+import os
+import sys
+
+SOURCE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'crypto_keeper')
+if SOURCE_DIR not in sys.path:
+    sys.path.insert(0, SOURCE_DIR)
@@ -0,0 +1,86 @@
+# tests/test_aead_records.py
+import base64
+import os
+
+import pytest
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+from model import crypto
+from model.model import LegacyModel
+
+
+def flip(encrypted_data, position):
+    # 翻轉 v2 紀錄中 nonce 之後第 position 個 byte
+    raw = bytearray(base64.b64decode(encrypted_data[len(crypto.V2_PREFIX):]))
+    raw[crypto.NONCE_BYTES + position] ^= 1
+    return crypto.V2_PREFIX + base64.b64encode(bytes(raw)).decode('utf-8')
+
+
+def test_v2_round_trip():
+    cipher = crypto.RecordCipher(os.urandom(32))
+    aad = crypto.associated_data('Wallet', 'metamask')
+    encrypted = cipher.encrypt('seed words', aad)
+    assert encrypted.startswith(crypto.V2_PREFIX)
+    assert crypto.record_version(encrypted) == 2
+    assert cipher.decrypt(encrypted, aad) == 'seed words'
+    # 每次加密使用新的 nonce
+    assert cipher.encrypt('seed words', aad) != encrypted
+
+
+@pytest.mark.parametrize('position', [0, -1])
+def test_v2_tamper_is_detected(position):
+    cipher = crypto.RecordCipher(os.urandom(32))
+    aad = crypto.associated_data('Wallet', 'metamask')
+    encrypted = cipher.encrypt('seed words', aad)
+    with pytest.raises(ValueError, match='Authentication failed'):
+        cipher.decrypt(flip(encrypted, position), aad)
+
+
+def test_v2_requires_its_location():
+    cipher = crypto.RecordCipher(os.urandom(32))
+    encrypted = cipher.encrypt('seed words', crypto.associated_data('Wallet', 'metamask'))
+    with pytest.raises(ValueError, match='category and identifier'):
+        cipher.decrypt(encrypted)
+    for category, identifier in (('Wallet', 'ledger'), ('Others', 'metamask')):
+        with pytest.raises(ValueError, match='Authentication failed'):
+            cipher.decrypt(encrypted, crypto.associated_data(category, identifier))
+
+
+def test_moved_record_does_not_decrypt(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path))
+    model.encrypt_and_store('Wallet', 'metamask', 'seed words')
+    # 把密文複製到另一個項目下：AAD 不同，解密失敗而不是回傳別人的內容
+    model.store_encrypted('Wallet', 'ledger', model.data['Wallet']['metamask'])
+    assert model.decrypt_and_retrieve('Wallet', 'ledger') is None
+    assert model.decrypt_and_retrieve('Wallet', 'metamask') == 'seed words'
+    model.close()
+
+
+def test_cbc_records_upgrade_on_next_save(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path))
+    legacy = model.encrypt_data('account,password')
+    assert crypto.record_version(legacy) == 1
+    model.store_encrypted('Exchange', 'binance', legacy)
+    model.close()
+
+    model = LegacyModel(data_dir=str(tmp_path))
+    assert model.decrypt_and_retrieve('Exchange', 'binance') == 'account,password'
+    # 讀取不改寫，下一次儲存時才寫成 v2
+    assert model.data['Exchange']['binance'] == legacy
+    model.encrypt_and_store('Exchange', 'binance', 'account,password')
+    assert crypto.record_version(model.data['Exchange']['binance']) == 2
+    assert model.decrypt_and_retrieve('Exchange', 'binance') == 'account,password'
+    model.close()
+
+
+def test_cbc_padding_is_checked():
+    key = os.urandom(32)
+    iv = os.urandom(16)
+    # 最後一個 byte 為 0 的區塊不是合法的 PKCS7 padding
+    encryptor = Cipher(algorithms.AES(key), modes.CBC(iv)).encryptor()
+    body = encryptor.update(b'x' * 15 + b'\x00') + encryptor.finalize()
+    cipher = crypto.RecordCipher(key)
+    with pytest.raises(ValueError, match='Invalid padding'):
+        cipher.decrypt(base64.b64encode(iv + body).decode('utf-8'))
+    with pytest.raises(ValueError, match='multiple of the block length'):
+        cipher.decrypt(base64.b64encode(iv + body[:-1]).decode('utf-8'))
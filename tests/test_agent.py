@@ -0,0 +1,148 @@
+# tests/test_agent.py
+import asyncio
+import shutil
+import tempfile
+import threading
+import time
+
+import pytest
+
+from agent import ReadWriteLock, VaultAgent
+from model.model import LegacyModel
+
+
+@pytest.fixture
+def agent(tmp_path):
+    # Unix socket 路徑有長度限制，放在短的暫存資料夾
+    socket_dir = tempfile.mkdtemp(prefix='ck-')
+    agent = VaultAgent(LegacyModel(data_dir=str(tmp_path)), f'{socket_dir}/agent.sock')
+    yield agent
+    shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+def run(agent, coroutine):
+    async def main():
+        await agent.start()
+        try:
+            return await coroutine()
+        finally:
+            agent.server.close()
+            agent.vault_executor.shutdown(wait=True)
+            agent.model.close()
+    return asyncio.run(main())
+
+
+def test_writes_and_lists_interleave(agent):
+    async def scenario():
+        puts = [agent.dispatch({'op': 'put', 'category': 'Wallet', 'identifier': f'w{i}', 'value': str(i)})
+                for i in range(200)]
+        lists = [agent.dispatch({'op': 'list'}) for _ in range(200)]
+        responses = await asyncio.gather(*puts, *lists)
+        listed = await agent.dispatch({'op': 'list', 'category': 'Wallet'})
+        return responses, listed
+
+    responses, listed = run(agent, scenario)
+    assert all(response['ok'] for response in responses)
+    assert len(listed['value']['Wallet']) == 200
+
+
+def test_reload_sees_other_writers(agent, tmp_path):
+    async def scenario():
+        other = LegacyModel(data_dir=str(tmp_path))
+        other.encrypt_and_store('Others', 'ext', 'hello')
+        other.close()
+        return await agent.dispatch({'op': 'get', 'category': 'Others', 'identifier': 'ext'})
+
+    assert run(agent, scenario) == {'ok': True, 'value': 'hello'}
+
+
+def test_failures_become_error_responses(agent):
+    def broken(*args):
+        raise OSError('disk full')
+
+    async def scenario():
+        agent.model.encrypt_and_store = broken
+        failed = await agent.dispatch({'op': 'put', 'category': 'Wallet', 'identifier': 'w', 'value': 'v'})
+        missing = await agent.dispatch({'op': 'get', 'category': 'Wallet'})
+        still_serving = await agent.dispatch({'op': 'list'})
+        return failed, missing, still_serving
+
+    failed, missing, still_serving = run(agent, scenario)
+    assert failed['ok'] is False and 'disk full' in failed['error']
+    assert missing == {'ok': False, 'error': "missing field: 'identifier'"}
+    assert still_serving['ok'] is True
+
+
+def test_reads_do_not_wait_for_each_other(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path), storage='sharded')
+    model.encrypt_and_store('Wallet', 'metamask', 'seed')
+    model.encrypt_and_store('Exchange', 'binance', 'pw')
+    model.close()
+
+    socket_dir = tempfile.mkdtemp(prefix='ck-')
+    agent = VaultAgent(LegacyModel(data_dir=str(tmp_path), storage='sharded'), f'{socket_dir}/agent.sock')
+    agent.model.data['Exchange']
+    load_shard = agent.model.storage.load_shard
+    slow_load_started = threading.Event()
+
+    def slow_load_shard(category):
+        if category == 'Wallet':
+            slow_load_started.set()
+            time.sleep(0.3)
+        return load_shard(category)
+
+    agent.model.storage.load_shard = slow_load_shard
+    done = []
+
+    async def get(category, identifier):
+        response = await agent.dispatch({'op': 'get', 'category': category, 'identifier': identifier})
+        done.append(category)
+        return response
+
+    async def scenario():
+        slow = asyncio.ensure_future(get('Wallet', 'metamask'))
+        await asyncio.get_running_loop().run_in_executor(None, slow_load_started.wait)
+        # 另一個分類已在記憶體中：不必等待讀檔中的查詢，event loop 也沒有被讀檔卡住
+        fast = await get('Exchange', 'binance')
+        return fast, await slow
+
+    try:
+        fast, slow = run(agent, scenario)
+    finally:
+        shutil.rmtree(socket_dir, ignore_errors=True)
+    assert fast == {'ok': True, 'value': 'pw'}
+    assert slow == {'ok': True, 'value': 'seed'}
+    assert done == ['Exchange', 'Wallet']
+
+
+def test_read_write_lock():
+    async def scenario():
+        lock = ReadWriteLock()
+        events = []
+
+        async def reader(name, delay):
+            async with lock.read():
+                events.append(f'{name} in')
+                await asyncio.sleep(delay)
+                events.append(f'{name} out')
+
+        async def writer():
+            async with lock.write():
+                events.append('writer in')
+                await asyncio.sleep(0.01)
+                events.append('writer out')
+
+        first = asyncio.ensure_future(reader('r1', 0.05))
+        second = asyncio.ensure_future(reader('r2', 0.05))
+        await asyncio.sleep(0)
+        write = asyncio.ensure_future(writer())
+        await asyncio.sleep(0)
+        # 等待中的寫入者讓之後的讀取者排在它後面
+        late = asyncio.ensure_future(reader('r3', 0))
+        await asyncio.gather(first, second, write, late)
+        return events
+
+    events = asyncio.run(scenario())
+    assert events[:2] == ['r1 in', 'r2 in']
+    assert events.index('writer in') > events.index('r2 out')
+    assert events.index('r3 in') > events.index('writer out')
@@ -0,0 +1,108 @@
+# tests/test_async_model.py
+import asyncio
+
+import pytest
+
+from model import crypto
+from model.async_model import AsyncLegacyModel
+from model.cache import DecryptCache
+from model.model import LegacyModel
+
+
+def run(tmp_path, scenario, **kwargs):
+    async def main():
+        async with AsyncLegacyModel(data_dir=str(tmp_path), **kwargs) as vault:
+            return await scenario(vault)
+    return asyncio.run(main())
+
+
+@pytest.mark.parametrize('storage', ['json', 'sharded'])
+def test_put_get_delete(tmp_path, storage):
+    async def scenario(vault):
+        await vault.put('Others', 'api-key', 'secret')
+        await vault.put_fields('Exchange', 'binance', {'exchange_password': 'pw'}, [('otp', '123')])
+        results = [
+            await vault.get('Others', 'api-key'),
+            await vault.get('Exchange', 'binance', field='otp'),
+            await vault.list(),
+        ]
+        await vault.delete('Others', 'api-key')
+        results.append(await vault.get('Others', 'api-key'))
+        return results
+
+    value, field, listing, deleted = run(tmp_path, scenario, storage=storage)
+    assert (value, field, deleted) == ('secret', '123', None)
+    assert listing == {'Others': ['api-key'], 'Exchange': ['binance']}
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.get_field('Exchange', 'binance', 'exchange_password') == 'pw'
+    assert 'api-key' not in reopened.data['Others']
+    reopened.close()
+
+
+def test_concurrent_writes_are_coalesced(tmp_path):
+    async def scenario(vault):
+        writes = []
+        write_changes = vault.model.write_changes
+        vault.model.write_changes = lambda changes: (writes.append(len(changes)), write_changes(changes))
+        await asyncio.gather(*(vault.put('Wallet', f'w{i}', f'secret {i}') for i in range(20)))
+        return writes, await vault.get('Wallet', 'w19')
+
+    writes, value = run(tmp_path, scenario, flush_delay=0.01)
+    assert writes == [20]
+    assert value == 'secret 19'
+
+
+def test_get_after_rotate(tmp_path):
+    async def scenario(vault):
+        await vault.put('Wallet', 'metamask', 'seed words')
+        assert await vault.get('Wallet', 'metamask') == 'seed words'
+        old_key = vault.model.key
+        await vault.run_in_vault(vault.model.rotate_key)
+        assert vault.model.key != old_key
+        # 輪替後的 get 以新金鑰解密，之後的寫入也以新金鑰加密
+        before = await vault.get('Wallet', 'metamask')
+        await vault.put('Wallet', 'ledger', 'more words')
+        return before, await vault.get('Wallet', 'ledger')
+
+    assert run(tmp_path, scenario, cache=DecryptCache()) == ('seed words', 'more words')
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.decrypt_and_retrieve('Wallet', 'ledger') == 'more words'
+    reopened.close()
+
+
+def test_write_pending_across_rotation_is_refused(tmp_path):
+    async def scenario(vault):
+        key = vault.model.key
+        encrypted_data = crypto.RecordCipher(key).encrypt('old', crypto.associated_data('Wallet', 'w'))
+        await vault.run_in_vault(vault.model.rotate_key)
+        with pytest.raises(ValueError, match='rotated'):
+            await vault.enqueue(('Wallet', 'w', encrypted_data, key))
+        return await vault.get('Wallet', 'w')
+
+    assert run(tmp_path, scenario) is None
+
+
+def test_stale_get_does_not_fill_the_cache(tmp_path):
+    cache = DecryptCache()
+
+    async def scenario(vault):
+        await vault.put('Wallet', 'metamask', 'old seed')
+        run_crypto = vault.run_crypto
+
+        async def slow_decrypt(size, func, *args, key=None):
+            # 解密途中另一個呼叫端寫入同一個項目
+            if func is crypto.RecordCipher.decrypt:
+                vault.run_crypto = run_crypto
+                await vault.put('Wallet', 'metamask', 'new seed')
+            return await run_crypto(size, func, *args, key=key)
+
+        vault.run_crypto = slow_decrypt
+        stale = await vault.get('Wallet', 'metamask')
+        cached = cache.get(('Wallet', 'metamask'))
+        return stale, cached, await vault.get('Wallet', 'metamask')
+
+    stale, cached, fresh = run(tmp_path, scenario, cache=cache)
+    assert stale == 'old seed'
+    assert cached is None
+    assert fresh == 'new seed'
@@ -0,0 +1,236 @@
+# tests/test_attachments.py
+import base64
+import io
+import os
+
+import pytest
+
+from model import attachment, crypto
+from model.model import LegacyModel
+
+KEY = bytes(range(32))
+CHUNK = 16
+
+
+def write_attachment(path, data, chunk_size=CHUNK):
+    with attachment.AttachmentWriter(str(path), KEY, chunk_size=chunk_size) as writer:
+        writer.write(data)
+    return writer
+
+
+def read_all(path, key=KEY):
+    with attachment.AttachmentReader(str(path), key) as reader:
+        return reader.read()
+
+
+def sealed_offset(index):
+    return attachment.HEADER.size + index * (CHUNK + attachment.TAG_BYTES)
+
+
+@pytest.fixture
+def model(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path))
+    model.store_fields('Others', 'passport', {'content': 'scan below'}, [])
+    yield model
+    model.close()
+
+
+def attachment_files(model):
+    if not os.path.isdir(model.attachments_dir):
+        return []
+    return sorted(os.listdir(model.attachments_dir))
+
+
+@pytest.mark.parametrize('size', [0, 1, CHUNK, CHUNK + 1, 5 * CHUNK])
+def test_round_trip_and_layout(tmp_path, size):
+    data = os.urandom(size)
+    path = tmp_path / 'a.ckatt'
+    write_attachment(path, data)
+
+    # 每段固定長度，最後一段可以較短；空檔案也有一段空的密文
+    chunks = max(1, -(-size // CHUNK))
+    assert path.stat().st_size == attachment.HEADER.size + size + chunks * attachment.TAG_BYTES
+    assert path.read_bytes()[:4] == attachment.MAGIC
+    assert not os.path.exists(f"{path}.tmp")
+    assert read_all(path) == data
+
+
+def test_random_access_reads_across_chunks(tmp_path):
+    data = bytes(range(256)) * 2
+    path = tmp_path / 'a.ckatt'
+    write_attachment(path, data)
+
+    with attachment.AttachmentReader(str(path), KEY) as reader:
+        assert reader.size == len(data)
+        reader.seek(CHUNK - 3)
+        assert reader.read(7) == data[CHUNK - 3:CHUNK + 4]
+        reader.seek(-5, io.SEEK_END)
+        assert reader.read() == data[-5:]
+        assert reader.read(1) == b''
+        reader.seek(100)
+        reader.seek(10, io.SEEK_CUR)
+        assert reader.tell() == 110
+        assert reader.read(40) == data[110:150]
+
+
+def test_failed_write_leaves_nothing(tmp_path):
+    path = tmp_path / 'a.ckatt'
+    with pytest.raises(RuntimeError):
+        with attachment.AttachmentWriter(str(path), KEY, chunk_size=CHUNK) as writer:
+            writer.write(b'x' * 40)
+            raise RuntimeError('source went away')
+    assert os.listdir(tmp_path) == []
+
+
+def test_modified_chunk_is_rejected_only_where_read(tmp_path):
+    data = os.urandom(4 * CHUNK)
+    path = tmp_path / 'a.ckatt'
+    write_attachment(path, data)
+    raw = bytearray(path.read_bytes())
+    raw[sealed_offset(2) + 3] ^= 1
+    path.write_bytes(bytes(raw))
+
+    with attachment.AttachmentReader(str(path), KEY) as reader:
+        # 只解密讀到的段落：其他段落仍然可以讀取
+        assert reader.read(2 * CHUNK) == data[:2 * CHUNK]
+        reader.seek(3 * CHUNK)
+        assert reader.read() == data[3 * CHUNK:]
+        reader.seek(2 * CHUNK)
+        with pytest.raises(ValueError, match='chunk 2'):
+            reader.read(1)
+
+
+def test_swapped_chunks_are_rejected(tmp_path):
+    path = tmp_path / 'a.ckatt'
+    write_attachment(path, os.urandom(3 * CHUNK))
+    raw = path.read_bytes()
+    first, second = raw[sealed_offset(0):sealed_offset(1)], raw[sealed_offset(1):sealed_offset(2)]
+    path.write_bytes(raw[:sealed_offset(0)] + second + first + raw[sealed_offset(2):])
+
+    with pytest.raises(ValueError, match='chunk 0'):
+        read_all(path)
+
+
+def test_truncation_at_chunk_boundary_breaks_final_flag(tmp_path):
+    path = tmp_path / 'a.ckatt'
+    data = os.urandom(3 * CHUNK)
+    write_attachment(path, data)
+    raw = path.read_bytes()
+    # 去掉最後一段後，倒數第二段的長度完整，但它加密時標記為非最後一段
+    path.write_bytes(raw[:sealed_offset(2)])
+
+    with attachment.AttachmentReader(str(path), KEY) as reader:
+        assert reader.read(CHUNK) == data[:CHUNK]
+        with pytest.raises(ValueError, match='chunk 1'):
+            reader.read()
+
+
+def test_header_is_authenticated(tmp_path):
+    path = tmp_path / 'a.ckatt'
+    write_attachment(path, os.urandom(2 * CHUNK))
+    raw = path.read_bytes()
+
+    path.write_bytes(b'NOPE' + raw[4:])
+    with pytest.raises(ValueError, match='Not an attachment'):
+        attachment.AttachmentReader(str(path), KEY)
+
+    # 段落長度寫在標頭中，也在每段的 associated data 裡
+    path.write_bytes(attachment.HEADER.pack(attachment.MAGIC, attachment.VERSION, CHUNK * 2)
+                     + raw[attachment.HEADER.size:])
+    with pytest.raises(ValueError, match='failed authentication'):
+        read_all(path)
+
+    path.write_bytes(raw)
+    with pytest.raises(ValueError, match='failed authentication'):
+        read_all(path, key=bytes(32))
+
+
+def test_model_round_trip(model, tmp_path):
+    data = os.urandom(3 * attachment.CHUNK_BYTES + 5)
+    info = model.add_attachment('Others', 'passport', io.BytesIO(data), name='passport.pdf')
+    assert info['size'] == len(data)
+    assert model.list_attachments('Others', 'passport') == [info]
+    # 附件的金鑰與大小只存在加密的紀錄中，其他欄位維持不變
+    assert crypto.attachment_ids(model.data['Others']['passport']) == [info['id']]
+    assert model.get_field('Others', 'passport', 'content') == 'scan below'
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    with reopened.open_attachment('Others', 'passport', 'passport.pdf') as reader:
+        reader.seek(attachment.CHUNK_BYTES - 2)
+        assert reader.read(4) == data[attachment.CHUNK_BYTES - 2:attachment.CHUNK_BYTES + 2]
+    out = io.BytesIO()
+    assert reopened.save_attachment('Others', 'passport', info['id'], out) == len(data)
+    assert out.getvalue() == data
+    with pytest.raises(KeyError):
+        reopened.open_attachment('Others', 'passport', 'missing.pdf')
+    reopened.close()
+
+
+def test_single_value_entries_cannot_have_attachments(model):
+    model.encrypt_and_store('Wallet', 'single', 'only a seed')
+    with pytest.raises(ValueError, match='single value'):
+        model.add_attachment('Wallet', 'single', io.BytesIO(b'x'), name='x.bin')
+    assert attachment_files(model) == []
+
+
+def test_truncated_attachment_is_reported(model):
+    info = model.add_attachment('Others', 'passport', io.BytesIO(os.urandom(3 * attachment.CHUNK_BYTES)),
+                                name='scan.png')
+    path = model.attachment_path(info['id'])
+    with open(path, 'r+b') as f:
+        f.truncate(attachment.HEADER.size + 2 * (attachment.CHUNK_BYTES + attachment.TAG_BYTES))
+    # 紀錄中的大小與檔案不符，開啟時就會發現
+    with pytest.raises(ValueError, match='truncated'):
+        model.open_attachment('Others', 'passport', 'scan.png')
+
+
+def test_replaced_and_removed_attachments_delete_their_files(model):
+    first = model.add_attachment('Others', 'passport', io.BytesIO(b'old'), name='scan.png')
+    second = model.add_attachment('Others', 'passport', io.BytesIO(b'new'), name='scan.png')
+    other = model.add_attachment('Others', 'passport', io.BytesIO(b'other'), name='back.png')
+    assert attachment_files(model) == sorted(i['id'] + attachment.SUFFIX for i in (second, other))
+    assert [i['name'] for i in model.list_attachments('Others', 'passport')] == ['scan.png', 'back.png']
+
+    model.remove_attachment('Others', 'passport', 'scan.png')
+    assert attachment_files(model) == [other['id'] + attachment.SUFFIX]
+    assert model.get_field('Others', 'passport', 'content') == 'scan below'
+
+    model.delete_data('Others', 'passport')
+    assert attachment_files(model) == []
+    assert first['id'] != second['id']
+
+
+def test_damaged_record_can_be_replaced(model):
+    model.add_attachment('Others', 'passport', io.BytesIO(b'scan'), name='scan.png')
+    raw = base64.b64decode(model.data['Others']['passport'][len(crypto.V3_PREFIX):])
+    model.data['Others']['passport'] = crypto.V3_PREFIX + base64.b64encode(raw[:-1]).decode('utf-8')
+
+    model.store_fields('Others', 'passport', {'content': 'rescanned'}, [])
+    assert model.get_field('Others', 'passport', 'content') == 'rescanned'
+    # 損毀紀錄引用的檔案留給 collect_attachments
+    assert len(attachment_files(model)) == 1
+    assert model.collect_attachments(grace=0) == 1
+
+
+def test_collect_attachments_keeps_recent_orphans(model):
+    info = model.add_attachment('Others', 'passport', io.BytesIO(b'scan'), name='scan.png')
+    orphan = model.attachment_path(attachment.new_id())
+    write_attachment(orphan, b'written by another process')
+
+    assert model.collect_attachments() == 0
+    old = os.path.getmtime(orphan) - attachment.ORPHAN_GRACE_SECONDS - 1
+    os.utime(orphan, (old, old))
+    assert model.collect_attachments() == 1
+    assert attachment_files(model) == [info['id'] + attachment.SUFFIX]
+
+
+def test_rotation_keeps_attachment_files(model, tmp_path):
+    data = os.urandom(1000)
+    model.add_attachment('Others', 'passport', io.BytesIO(data), name='scan.png')
+    before = {name: (tmp_path / 'attachments' / name).read_bytes() for name in attachment_files(model)}
+
+    model.rotate_key(chunk_size=4)
+    # 附件的金鑰跟著紀錄重新加密，檔案本身不需要重寫
+    assert {name: (tmp_path / 'attachments' / name).read_bytes() for name in attachment_files(model)} == before
+    with model.open_attachment('Others', 'passport', 'scan.png') as reader:
+        assert reader.read() == data
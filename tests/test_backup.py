@@ -0,0 +1,155 @@
+# tests/test_backup.py
+import os
+
+import pytest
+
+from model import storage as storage_module
+from model.backup import BackupError, BackupRepository
+from model.model import LegacyModel
+
+FAST_KDF = {'kdf': 'scrypt', 'n': 2 ** 10, 'r': 8, 'p': 1}
+
+
+def make_vault(data_dir, layout='journal', size=20):
+    model = LegacyModel(data_dir=str(data_dir), storage=layout)
+    with model.batch():
+        for i in range(size):
+            model.encrypt_and_store('Wallet', f'w{i}', f'secret {i}')
+    return model
+
+
+def pack_bytes(repository):
+    content = b''
+    for name in sorted(os.listdir(repository.pack_dir)):
+        with open(os.path.join(repository.pack_dir, name), 'rb') as f:
+            content += f.read()
+    return content
+
+
+@pytest.mark.parametrize('layout', ['json', 'journal', 'sharded'])
+def test_backup_round_trip(tmp_path, layout):
+    vault = tmp_path / 'vault'
+    make_vault(vault, layout).close()
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    snapshot = repository.backup(str(vault))
+
+    target = tmp_path / 'restored'
+    assert repository.restore(snapshot, str(target), key_file=str(vault / 'key.txt')) == 20
+    restored = LegacyModel(data_dir=str(target))
+    assert restored.detect_storage() == layout
+    assert restored.decrypt_and_retrieve('Wallet', 'w5') == 'secret 5'
+    restored.close()
+
+
+def test_key_file_is_not_backed_up(tmp_path):
+    vault = tmp_path / 'vault'
+    make_vault(vault).close()
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    snapshot = repository.backup(str(vault))
+
+    key_text = (vault / 'key.txt').read_bytes()
+    assert key_text not in pack_bytes(repository)
+    assert bytes.fromhex(key_text.decode()) not in pack_bytes(repository)
+    # 沒有金鑰或金鑰不符時拒絕還原，不會產生打不開的 vault
+    with pytest.raises(BackupError, match='--key-file'):
+        repository.restore(snapshot, str(tmp_path / 'restored'))
+    other = tmp_path / 'other'
+    make_vault(other, size=1).close()
+    with pytest.raises(BackupError, match='not the key'):
+        repository.restore(snapshot, str(tmp_path / 'restored'), key_file=str(other / 'key.txt'))
+
+
+def test_restore_over_the_same_vault_keeps_its_key(tmp_path):
+    vault = tmp_path / 'vault'
+    model = make_vault(vault)
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    snapshot = repository.backup(str(vault))
+    model.delete_data('Wallet', 'w0')
+    model.close()
+
+    repository.restore(snapshot, str(vault), overwrite=True)
+    restored = LegacyModel(data_dir=str(vault))
+    assert restored.decrypt_and_retrieve('Wallet', 'w0') == 'secret 0'
+    assert os.path.isdir(vault / f"pre-restore-{snapshot['id']}")
+    restored.close()
+
+
+def test_passphrase_vault_needs_no_key_file(tmp_path):
+    vault = tmp_path / 'vault'
+    model = make_vault(vault)
+    model.set_passphrase('correct horse', params=FAST_KDF)
+    model.close()
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    snapshot = repository.backup(str(vault))
+
+    target = tmp_path / 'restored'
+    repository.restore(snapshot, str(target))
+    restored = LegacyModel(data_dir=str(target), passphrase='correct horse')
+    assert restored.decrypt_and_retrieve('Wallet', 'w1') == 'secret 1'
+    restored.close()
+
+
+def test_incremental_backup_writes_only_changes(tmp_path):
+    vault = tmp_path / 'vault'
+    model = make_vault(vault, size=400)
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    first = repository.backup(str(vault))
+    model.encrypt_and_store('Wallet', 'w7', 'changed')
+    model.close()
+    second = repository.backup(str(vault))
+
+    assert second['parent'] == first['id']
+    # 一個密文、它所在 bucket 的 tree 與 root
+    assert second['added']['objects'] == 3
+    assert second['added']['bytes'] < first['added']['bytes'] / 10
+
+    target = tmp_path / 'restored'
+    repository.restore(first, str(target), key_file=str(vault / 'key.txt'))
+    restored = LegacyModel(data_dir=str(target))
+    assert restored.decrypt_and_retrieve('Wallet', 'w7') == 'secret 7'
+    restored.close()
+
+
+def test_backup_does_not_repair_the_journal(tmp_path):
+    vault = tmp_path / 'vault'
+    make_vault(vault).close()
+    journal = vault / 'legacy_data.journal'
+    # 另一個行程寫到一半的紀錄：備份只讀取，不能截掉它
+    with open(journal, 'ab') as f:
+        f.write(b'\x00\x00\x01\x00partial')
+    size = journal.stat().st_size
+
+    snapshot = BackupRepository(str(tmp_path / 'backups')).backup(str(vault))
+    assert snapshot['entries'] == 20
+    assert journal.stat().st_size == size
+
+
+def test_failed_restore_write_raises(tmp_path, monkeypatch):
+    vault = tmp_path / 'vault'
+    make_vault(vault, 'json').close()
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    snapshot = repository.backup(str(vault))
+
+    def full_disk(path, data):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(storage_module, 'write_json_atomic', full_disk)
+    with pytest.raises(BackupError, match='Failed to write'):
+        repository.restore(snapshot, str(tmp_path / 'restored'), key_file=str(vault / 'key.txt'))
+
+
+def test_corrupted_pack_is_detected(tmp_path):
+    vault = tmp_path / 'vault'
+    make_vault(vault).close()
+    repository = BackupRepository(str(tmp_path / 'backups'))
+    snapshot = repository.backup(str(vault))
+    pack = next(name for name in os.listdir(repository.pack_dir) if name.endswith('.pack'))
+    path = os.path.join(repository.pack_dir, pack)
+    with open(path, 'r+b') as f:
+        f.seek(10)
+        byte = f.read(1)
+        f.seek(10)
+        f.write(bytes([byte[0] ^ 1]))
+
+    with pytest.raises(BackupError, match='corrupted'):
+        repository.restore(snapshot, str(tmp_path / 'restored'), key_file=str(vault / 'key.txt'))
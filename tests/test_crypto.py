@@ -0,0 +1,40 @@
+# tests/test_crypto.py
+import os
+
+import pytest
+
+from model import crypto
+
+
+def make_entries(size):
+    return [('Exchange', f'exchange-{i}', f'account-{i},p@ssw0rd') for i in range(size)]
+
+
+def test_small_batches_run_serially():
+    assert crypto.execution_path(crypto.PARALLEL_MIN_ENTRIES - 1, workers=4) == 'serial'
+    assert crypto.execution_path(crypto.PARALLEL_MIN_ENTRIES, workers=1) == 'serial'
+    assert crypto.execution_path(crypto.PARALLEL_MIN_ENTRIES, workers=4) == 'threads'
+    assert crypto.execution_path(crypto.PARALLEL_MIN_ENTRIES, workers=4, use_processes=True) == 'processes'
+
+
+@pytest.mark.parametrize('use_processes', [False, True])
+def test_pooled_paths_match_serial(monkeypatch, use_processes):
+    # 降低門檻讓小批次也進入 pool，結果必須與逐筆處理相同且維持輸入順序
+    monkeypatch.setattr(crypto, 'PARALLEL_MIN_ENTRIES', 10)
+    key = os.urandom(32)
+    entries = make_entries(50)
+    encrypted = list(crypto.encrypt_many(key, entries, workers=2, chunk_size=4, use_processes=use_processes))
+    decrypted = list(crypto.decrypt_many(key, encrypted, workers=2, chunk_size=4, use_processes=use_processes))
+
+    assert [entry[:2] for entry in encrypted] == [entry[:2] for entry in entries]
+    assert decrypted == entries
+
+
+def test_reencrypt_round_trip():
+    key, new_key = os.urandom(32), os.urandom(32)
+    entries = make_entries(5)
+    encrypted = list(crypto.encrypt_many(key, entries, workers=1))
+    reencrypted = list(crypto.reencrypt_many(key, new_key, encrypted, workers=1))
+
+    assert list(crypto.decrypt_many(new_key, reencrypted, workers=1)) == entries
+    assert all(value is None for _, _, value in crypto.decrypt_many(key, reencrypted, workers=1))
@@ -0,0 +1,134 @@
+# tests/test_field_records.py
+import base64
+import json
+
+import pytest
+
+from model import crypto, record
+from model.cache import DecryptCache
+from model.model import LegacyModel
+
+WALLET = {'wallet_seed': 'abandon, ability: able', 'private_key': '0xdeadbeef'}
+CUSTOM = [('note', 'a,b:c'), ('pin', '1234')]
+
+
+def edit_fields(encrypted_data, change):
+    # 解開 v3 容器、以 change 修改欄位列表後重新打包（不需要金鑰）
+    items = [(kind, name, bytes(sealed)) for kind, name, sealed in crypto.sealed_fields(encrypted_data)]
+    return crypto.V3_PREFIX + base64.b64encode(record.pack(change(items))).decode('utf-8')
+
+
+@pytest.fixture
+def model(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path))
+    model.store_fields('Wallet', 'metamask', WALLET, CUSTOM)
+    yield model
+    model.close()
+
+
+def test_round_trip_keeps_separators(model, tmp_path):
+    encrypted = model.data['Wallet']['metamask']
+    assert crypto.record_version(encrypted) == 3
+    names = [(kind, name) for kind, name, _ in crypto.sealed_fields(encrypted)]
+    assert names == [(record.FIELD_DEFAULT, 'wallet_seed'), (record.FIELD_DEFAULT, 'private_key'),
+                     (record.FIELD_CUSTOM, 'note'), (record.FIELD_CUSTOM, 'pin')]
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.retrieve_fields('Wallet', 'metamask') == (WALLET, CUSTOM)
+    # 只處理單一字串的呼叫端拿到 JSON
+    assert json.loads(reopened.decrypt_and_retrieve('Wallet', 'metamask')) == {
+        'fields': WALLET, 'custom_fields': [list(item) for item in CUSTOM]}
+    reopened.close()
+
+
+def test_single_field_is_decrypted_alone(model):
+    assert model.get_field('Wallet', 'metamask', 'private_key') == '0xdeadbeef'
+    assert model.get_field('Wallet', 'metamask', 'note') == 'a,b:c'
+    assert model.get_field('Wallet', 'metamask', 'missing') is None
+
+    # 其他欄位損毀不影響讀取單一欄位，但整筆讀取會失敗
+    def corrupt_seed(items):
+        kind, name, sealed = items[0]
+        return [(kind, name, sealed[:-1] + bytes((sealed[-1] ^ 1,)))] + items[1:]
+
+    model.store_encrypted('Wallet', 'metamask', edit_fields(model.data['Wallet']['metamask'], corrupt_seed))
+    assert model.get_field('Wallet', 'metamask', 'private_key') == '0xdeadbeef'
+    assert model.get_field('Wallet', 'metamask', 'wallet_seed') is None
+    assert model.retrieve_fields('Wallet', 'metamask') is None
+
+
+def test_swapped_fields_are_rejected(model):
+    # 欄位密文綁定欄位名稱：交換兩個欄位的名稱後無法解密
+    def swap(items):
+        (kind_a, name_a, sealed_a), (kind_b, name_b, sealed_b) = items[:2]
+        return [(kind_a, name_a, sealed_b), (kind_b, name_b, sealed_a)] + items[2:]
+
+    model.store_encrypted('Wallet', 'metamask', edit_fields(model.data['Wallet']['metamask'], swap))
+    assert model.get_field('Wallet', 'metamask', 'wallet_seed') is None
+    assert model.retrieve_fields('Wallet', 'metamask') is None
+
+
+def test_moved_record_is_rejected(model):
+    model.store_encrypted('Wallet', 'ledger', model.data['Wallet']['metamask'])
+    assert model.retrieve_fields('Wallet', 'ledger') is None
+    assert model.get_field('Wallet', 'ledger', 'private_key') is None
+
+
+def test_truncated_container_is_rejected(model):
+    raw = base64.b64decode(model.data['Wallet']['metamask'][len(crypto.V3_PREFIX):])
+    for size in (1, 10, len(raw) - 1):
+        truncated = crypto.V3_PREFIX + base64.b64encode(raw[:size]).decode('utf-8')
+        with pytest.raises(ValueError, match='Truncated'):
+            list(crypto.sealed_fields(truncated))
+        # 像是其他程式寫到一半的檔案，直接放進記憶體中的資料
+        model.data['Wallet']['metamask'] = truncated
+        assert model.retrieve_fields('Wallet', 'metamask') is None
+        assert model.get_field('Wallet', 'metamask', 'private_key') is None
+
+
+def test_legacy_entries_are_migrated(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path))
+    model.encrypt_and_store('Wallet', 'metamask', 'seed words,0xkey,note:hi')
+    model.encrypt_and_store('Wallet', 'single', 'only a seed')
+    model.encrypt_and_store('Others', 'notes', 'bad,custom')
+
+    assert model.migrate_field_records() == 1
+    assert crypto.record_version(model.data['Wallet']['metamask']) == 3
+    assert model.retrieve_fields('Wallet', 'metamask') == (
+        {'wallet_seed': 'seed words', 'private_key': '0xkey'}, [('note', 'hi')])
+    # 無法依欄位拆開的項目維持原樣
+    assert crypto.record_version(model.data['Wallet']['single']) == 2
+    assert crypto.record_version(model.data['Others']['notes']) == 2
+    assert model.decrypt_and_retrieve('Wallet', 'single') == 'only a seed'
+    model.close()
+
+
+def test_field_reads_go_through_the_cache(tmp_path):
+    cache = DecryptCache()
+    model = LegacyModel(data_dir=str(tmp_path), cache=cache)
+    model.store_fields('Wallet', 'metamask', WALLET, CUSTOM)
+    model.encrypt_and_store('Wallet', 'legacy', 'seed words,0xkey,note:hi')
+
+    # v3 紀錄在快取外只解密單一欄位，不放進快取
+    assert model.get_field('Wallet', 'metamask', 'pin') == '1234'
+    assert cache.stats()['entries'] == 0
+    assert model.retrieve_fields('Wallet', 'metamask') == (WALLET, CUSTOM)
+    assert model.retrieve_fields('Wallet', 'metamask') == (WALLET, CUSTOM)
+    assert model.get_field('Wallet', 'metamask', 'private_key') == '0xdeadbeef'
+    assert cache.stats()['hits'] == 2
+    # 舊格式本來就要解密整筆，直接放進快取
+    assert model.get_field('Wallet', 'legacy', 'note') == 'hi'
+    assert cache.stats()['entries'] == 2
+
+    model.store_fields('Wallet', 'metamask', {'wallet_seed': 'new seed', 'private_key': '0x1'}, [])
+    assert model.get_field('Wallet', 'metamask', 'private_key') == '0x1'
+    assert model.retrieve_fields('Wallet', 'metamask') == ({'wallet_seed': 'new seed', 'private_key': '0x1'}, [])
+
+    # 其他行程的寫入在重新載入時讓快取失效
+    other = LegacyModel(data_dir=str(tmp_path))
+    other.store_fields('Wallet', 'metamask', WALLET, CUSTOM)
+    other.close()
+    model.reload_if_changed()
+    assert model.retrieve_fields('Wallet', 'metamask') == (WALLET, CUSTOM)
+    assert model.get_field('Wallet', 'metamask', 'note') == 'a,b:c'
+    model.close()
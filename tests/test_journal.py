@@ -0,0 +1,177 @@
+# tests/test_journal.py
+import os
+
+import pytest
+
+from model import storage as storage_module
+from model.model import LegacyModel
+from model.storage import JournalStorage
+
+
+def data_file(tmp_path):
+    return str(tmp_path / 'legacy_data.json')
+
+
+def test_round_trip(tmp_path):
+    storage = JournalStorage(data_file(tmp_path))
+    data = {}
+    data.setdefault('Wallet', {})['a'] = 'v1'
+    storage.apply(data, [('Wallet', 'a', 'v1')])
+    data['Wallet']['b'] = 'v2'
+    del data['Wallet']['a']
+    storage.apply(data, [('Wallet', 'b', 'v2'), ('Wallet', 'a', None)])
+
+    assert JournalStorage(data_file(tmp_path)).load() == {'Wallet': {'b': 'v2'}}
+
+
+def test_save_folds_journal_into_snapshot(tmp_path):
+    storage = JournalStorage(data_file(tmp_path))
+    storage.apply({'Wallet': {'a': 'v1'}}, [('Wallet', 'a', 'v1')])
+    storage.save({'Wallet': {'a': 'v1'}})
+
+    assert not os.path.exists(storage.journal_file)
+    assert JournalStorage(data_file(tmp_path)).load() == {'Wallet': {'a': 'v1'}}
+
+
+def test_truncated_tail_is_discarded(tmp_path):
+    storage = JournalStorage(data_file(tmp_path))
+    storage.apply({}, [('Wallet', 'a', 'v1')])
+    storage.apply({}, [('Wallet', 'b', 'v2'), ('Wallet', 'c', 'v3')])
+    good_size = len(storage.encode_frame(storage.make_record('Wallet', 'a', 'v1')))
+    # 模擬寫到一半時當機：第二個 frame 只留下一部分
+    with open(storage.journal_file, 'r+b') as f:
+        f.truncate(good_size + 10)
+
+    reopened = JournalStorage(data_file(tmp_path))
+    # batch frame 要嘛整個套用、要嘛整個捨棄
+    assert reopened.load() == {'Wallet': {'a': 'v1'}}
+    assert os.path.getsize(storage.journal_file) == good_size
+    reopened.apply({}, [('Wallet', 'd', 'v4')])
+    assert JournalStorage(data_file(tmp_path)).load() == {'Wallet': {'a': 'v1', 'd': 'v4'}}
+
+
+def test_corrupted_frame_stops_replay(tmp_path):
+    storage = JournalStorage(data_file(tmp_path))
+    storage.apply({}, [('Wallet', 'a', 'v1')])
+    storage.apply({}, [('Wallet', 'b', 'v2')])
+    with open(storage.journal_file, 'r+b') as f:
+        f.seek(-2, os.SEEK_END)
+        f.write(b'XX')
+
+    assert JournalStorage(data_file(tmp_path)).load() == {'Wallet': {'a': 'v1'}}
+
+
+def test_interrupted_compaction_is_replayed(tmp_path):
+    storage = JournalStorage(data_file(tmp_path))
+    storage.save({'Wallet': {'a': 'v1'}})
+    storage.apply({}, [('Wallet', 'b', 'v2')])
+    # 壓縮在寫新快照之前中斷：日誌已輪替成 .compacting
+    os.replace(storage.journal_file, storage.compacting_file)
+    storage.apply({}, [('Wallet', 'c', 'v3')])
+
+    assert JournalStorage(data_file(tmp_path)).load() == {'Wallet': {'a': 'v1', 'b': 'v2', 'c': 'v3'}}
+
+
+def test_background_compaction(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    model.storage.compact_threshold = 512
+    for i in range(50):
+        model.encrypt_and_store('Wallet', f'w{i}', f'secret {i}')
+    model.storage.wait_for_compaction()
+    model.close()
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.detect_storage() == 'journal'
+    assert len(reopened.data['Wallet']) == 50
+    assert reopened.decrypt_and_retrieve('Wallet', 'w49') == 'secret 49'
+    reopened.close()
+
+
+def test_layout_survives_compaction_and_rotation(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    model.encrypt_and_store('Wallet', 'a', 'v1')
+    model.storage.start_compaction(model.data)
+    model.storage.wait_for_compaction()
+    model.close()
+    # 壓縮後沒有日誌檔，格式仍由 vault_layout.json 決定
+    assert not os.path.exists(tmp_path / 'legacy_data.journal')
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert isinstance(reopened.storage, JournalStorage)
+    reopened.encrypt_and_store('Wallet', 'b', 'v2')
+    reopened.rotate_key()
+    reopened.close()
+    assert not os.path.exists(tmp_path / 'legacy_data.journal')
+
+    rotated = LegacyModel(data_dir=str(tmp_path))
+    assert isinstance(rotated.storage, JournalStorage)
+    assert rotated.decrypt_and_retrieve('Wallet', 'b') == 'v2'
+    rotated.close()
+
+
+def test_switching_to_json_writes_the_journal_back(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    model.encrypt_and_store('Wallet', 'a', 'v1')
+    model.close()
+
+    model = LegacyModel(data_dir=str(tmp_path), storage='json')
+    assert model.decrypt_and_retrieve('Wallet', 'a') == 'v1'
+    assert not os.path.exists(tmp_path / 'legacy_data.journal')
+    model.close()
+    assert LegacyModel(data_dir=str(tmp_path)).detect_storage() == 'json'
+
+
+def test_sharded_vault_keeps_its_layout(tmp_path):
+    LegacyModel(data_dir=str(tmp_path), storage='sharded').close()
+    with pytest.raises(ValueError, match='sharded'):
+        LegacyModel(data_dir=str(tmp_path), storage='journal')
+
+
+@pytest.mark.parametrize('layout', ['json', 'journal', 'sharded'])
+def test_failed_write_rolls_back(tmp_path, monkeypatch, layout):
+    model = LegacyModel(data_dir=str(tmp_path), storage=layout)
+    model.encrypt_and_store('Wallet', 'a', 'v1')
+    notified = []
+    model.add_listener(notified.append)
+
+    def full_disk(*args):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(storage_module, 'write_json_atomic', full_disk)
+    monkeypatch.setattr(JournalStorage, 'encode_frame', full_disk)
+    with pytest.raises(OSError, match='disk full'):
+        with model.batch():
+            model.encrypt_and_store('Wallet', 'a', 'v2')
+            model.encrypt_and_store('Exchange', 'b', 'v3')
+    # 寫入失敗時記憶體回到寫入前的狀態，並通知被還原的項目
+    assert model.decrypt_and_retrieve('Wallet', 'a') == 'v1'
+    assert 'Exchange' not in model.data
+    assert notified[-1] == [('Exchange', 'b', None), ('Wallet', 'a', model.data['Wallet']['a'])]
+
+    with pytest.raises(OSError, match='disk full'):
+        model.delete_data('Wallet', 'a')
+    assert model.decrypt_and_retrieve('Wallet', 'a') == 'v1'
+
+    monkeypatch.undo()
+    model.encrypt_and_store('Wallet', 'c', 'v4')
+    model.close()
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert {c: set(e) for c, e in reopened.data.items() if e} == {'Wallet': {'a', 'c'}}
+    reopened.close()
+
+
+def test_failed_append_leaves_no_partial_frame(tmp_path, monkeypatch):
+    storage = JournalStorage(data_file(tmp_path), fsync=True)
+    storage.apply({}, [('Wallet', 'a', 'v1')])
+    size = os.path.getsize(storage.journal_file)
+
+    def failing_fsync(fd):
+        raise OSError('I/O error')
+
+    monkeypatch.setattr(os, 'fsync', failing_fsync)
+    with pytest.raises(OSError):
+        storage.apply({}, [('Wallet', 'b', 'v2')])
+    monkeypatch.undo()
+    assert os.path.getsize(storage.journal_file) == size
+    storage.apply({}, [('Wallet', 'c', 'v3')])
+    assert JournalStorage(data_file(tmp_path)).load() == {'Wallet': {'a': 'v1', 'c': 'v3'}}
@@ -0,0 +1,108 @@
+# tests/test_kdf.py
+import json
+import os
+
+import pytest
+
+from model import kdf
+from model.model import LegacyModel
+
+FAST_KDF = {'kdf': 'scrypt', 'n': 2 ** 10, 'r': 8, 'p': 1}
+
+
+@pytest.fixture(autouse=True)
+def clear_session_keys():
+    kdf.forget_session_keys()
+    yield
+    kdf.forget_session_keys()
+
+
+def protected_vault(tmp_path, passphrase='correct horse'):
+    model = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    model.encrypt_and_store('Wallet', 'metamask', 'seed words')
+    model.set_passphrase(passphrase, params=FAST_KDF)
+    model.close()
+    return tmp_path / 'vault_header.json'
+
+
+def test_header_round_trip(tmp_path):
+    header_file = protected_vault(tmp_path)
+    assert not os.path.exists(tmp_path / 'key.txt')
+    header = json.loads(header_file.read_text())
+    assert header['version'] == kdf.HEADER_VERSION
+    assert (header['kdf'], header['n'], header['r'], header['p']) == ('scrypt', 2 ** 10, 8, 1)
+    assert len(bytes.fromhex(header['salt'])) == 16
+    # nonce + 32 bytes 的金鑰 + GCM tag
+    assert len(bytes.fromhex(header['wrapped_key'])) == 12 + 32 + 16
+
+    model = LegacyModel(data_dir=str(tmp_path), passphrase='correct horse')
+    assert model.decrypt_and_retrieve('Wallet', 'metamask') == 'seed words'
+    model.close()
+
+
+def test_missing_or_wrong_passphrase(tmp_path):
+    protected_vault(tmp_path)
+    with pytest.raises(kdf.PassphraseError, match='protected'):
+        LegacyModel(data_dir=str(tmp_path))
+    with pytest.raises(kdf.PassphraseError, match='Wrong passphrase'):
+        LegacyModel(data_dir=str(tmp_path), passphrase='wrong horse')
+
+
+@pytest.mark.parametrize('field', ['salt', 'n', 'wrapped_key'])
+def test_tampered_header_is_rejected(tmp_path, field):
+    header_file = protected_vault(tmp_path)
+    header = json.loads(header_file.read_text())
+    if field == 'n':
+        header['n'] *= 2
+    else:
+        value = bytearray(bytes.fromhex(header[field]))
+        value[-1] ^= 1
+        header[field] = value.hex()
+    header_file.write_text(json.dumps(header))
+
+    with pytest.raises(kdf.PassphraseError):
+        LegacyModel(data_dir=str(tmp_path), passphrase='correct horse')
+
+
+def test_unsupported_kdf(tmp_path):
+    header_file = protected_vault(tmp_path)
+    header = json.loads(header_file.read_text())
+    header['kdf'] = 'argon2id'
+    header_file.write_text(json.dumps(header))
+    with pytest.raises(kdf.PassphraseError, match='Unsupported KDF'):
+        LegacyModel(data_dir=str(tmp_path), passphrase='correct horse')
+
+
+def test_changing_passphrase_only_rewraps_the_key(tmp_path):
+    protected_vault(tmp_path)
+    journal = tmp_path / 'legacy_data.journal'
+    before = journal.read_bytes()
+
+    model = LegacyModel(data_dir=str(tmp_path), passphrase='correct horse')
+    model.set_passphrase('battery staple', params=FAST_KDF)
+    model.close()
+
+    assert journal.read_bytes() == before
+    with pytest.raises(kdf.PassphraseError):
+        LegacyModel(data_dir=str(tmp_path), passphrase='correct horse')
+    model = LegacyModel(data_dir=str(tmp_path), passphrase='battery staple')
+    assert model.decrypt_and_retrieve('Wallet', 'metamask') == 'seed words'
+    model.close()
+
+
+def test_session_keys_are_dropped_on_close(tmp_path):
+    header_file = protected_vault(tmp_path)
+    salt = bytes.fromhex(json.loads(header_file.read_text())['salt'])
+    model = LegacyModel(data_dir=str(tmp_path), passphrase='correct horse')
+    assert any(cache_key[0] == salt for cache_key in kdf._session_keys)
+    model.close()
+    assert not any(cache_key[0] == salt for cache_key in kdf._session_keys)
+
+
+def test_calibration_respects_target_and_memory():
+    params = kdf.calibrate(target_seconds=0)
+    assert params['n'] == 2 ** kdf.MIN_LOG2_N
+    # 記憶體上限只夠 MIN_LOG2_N 時不再往上加
+    params = kdf.calibrate(target_seconds=60, max_memory=128 * 8 * 2 ** kdf.MIN_LOG2_N)
+    assert params['n'] == 2 ** kdf.MIN_LOG2_N
+    assert params['seconds'] > 0
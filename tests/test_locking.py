@@ -0,0 +1,167 @@
+# tests/test_locking.py
+import multiprocessing
+import os
+import threading
+import time
+
+import pytest
+
+from model import storage as storage_module
+from model.locking import VaultLock, fcntl
+from model.model import LegacyModel
+from model.storage import file_signature
+
+needs_flock = pytest.mark.skipif(fcntl is None, reason='flock is not available on this platform')
+
+
+def writer(data_dir, prefix, count, layout='journal', compact_threshold=None):
+    model = LegacyModel(data_dir=data_dir, storage=layout)
+    if compact_threshold is not None:
+        model.storage.compact_threshold = compact_threshold
+    for i in range(count):
+        model.encrypt_and_store('Wallet', f'{prefix}{i}', f'secret {i}')
+    model.close()
+
+
+def run_processes(*targets):
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=target, args=args) for target, args in targets]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(60)
+        assert process.exitcode == 0
+
+
+def test_generation_marks_other_models_stale(tmp_path):
+    first = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    second = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    generation = first.vault_lock.generation()
+    first.encrypt_and_store('Wallet', 'a', '1')
+
+    assert first.vault_lock.generation() == generation + 1
+    assert second.is_stale()
+    assert second.reload_if_changed()
+    assert second.decrypt_and_retrieve('Wallet', 'a') == '1'
+    assert not second.is_stale()
+    first.close()
+    second.close()
+
+
+def test_stale_writer_merges_instead_of_overwriting(tmp_path):
+    first = LegacyModel(data_dir=str(tmp_path), storage='json')
+    second = LegacyModel(data_dir=str(tmp_path), storage='json')
+    first.encrypt_and_store('Wallet', 'a', '1')
+    # second 還沒看過 a，寫入前必須先合併，不能以舊的內容整份覆蓋
+    second.encrypt_and_store('Wallet', 'b', '2')
+    first.close()
+    second.close()
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert sorted(reopened.data['Wallet']) == ['a', 'b']
+    reopened.close()
+
+
+@needs_flock
+@pytest.mark.parametrize('layout', ['json', 'journal', 'sharded'])
+def test_concurrent_processes_keep_every_entry(tmp_path, layout):
+    LegacyModel(data_dir=str(tmp_path), storage=layout).close()
+    run_processes(*[(writer, (str(tmp_path), f'p{n}-', 30, layout)) for n in range(3)])
+
+    reopened = LegacyModel(data_dir=str(tmp_path), storage=layout)
+    assert len(reopened.data['Wallet']) == 90
+    reopened.close()
+
+
+@needs_flock
+def test_compaction_waits_for_readers(tmp_path, monkeypatch):
+    # 讓壓縮停在寫完新快照之後，模擬另一個行程在這時持有共享鎖讀取
+    written = threading.Event()
+    release = threading.Event()
+    write_json_file = storage_module.write_json_file
+
+    def slow_write(path, data):
+        write_json_file(path, data)
+        if path.endswith('.compacting.tmp'):
+            written.set()
+            release.wait(10)
+
+    monkeypatch.setattr(storage_module, 'write_json_file', slow_write)
+    model = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    model.storage.compact_threshold = 512
+    i = 0
+    while not written.is_set():
+        model.encrypt_and_store('Wallet', f'w{i}', f'secret {i}')
+        i += 1
+    generation = model.vault_lock.generation()
+    snapshot = file_signature(model.data_file)
+
+    # 另一個 open file description 上的 flock，與另一個行程相同
+    reader = VaultLock(model.vault_lock.path)
+    with reader.shared():
+        release.set()
+        time.sleep(0.2)
+        # 快照與 .compacting 在讀取期間保持一致
+        assert os.path.exists(model.storage.compacting_file)
+        assert file_signature(model.data_file) == snapshot
+    reader.close()
+    model.storage.wait_for_compaction()
+
+    assert not os.path.exists(model.storage.compacting_file)
+    assert model.vault_lock.generation() == generation + 1
+    model.close()
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert len(reopened.data['Wallet']) == i
+    reopened.close()
+
+
+def test_outdated_compaction_is_discarded(tmp_path, monkeypatch):
+    written = threading.Event()
+    release = threading.Event()
+    write_json_file = storage_module.write_json_file
+
+    def slow_write(path, data):
+        write_json_file(path, data)
+        if path.endswith('.compacting.tmp'):
+            written.set()
+            release.wait(10)
+
+    monkeypatch.setattr(storage_module, 'write_json_file', slow_write)
+    model = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    model.storage.compact_threshold = 512
+    i = 0
+    while not written.is_set():
+        model.encrypt_and_store('Wallet', f'w{i}', f'secret {i}')
+        i += 1
+    # 壓縮完成前整份寫入並再追加一筆，過期的壓縮快照不能蓋掉它們
+    model.save_data()
+    model.encrypt_and_store('Wallet', 'late', 'after save')
+    release.set()
+    model.storage.wait_for_compaction()
+    model.close()
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert len(reopened.data['Wallet']) == i + 1
+    assert reopened.decrypt_and_retrieve('Wallet', 'late') == 'after save'
+    reopened.close()
+
+
+@needs_flock
+def test_readers_never_lose_entries_during_compaction(tmp_path):
+    LegacyModel(data_dir=str(tmp_path), storage='journal').close()
+    context = multiprocessing.get_context('fork')
+    process = context.Process(target=writer, args=(str(tmp_path), 'w', 300, 'journal', 1024))
+    process.start()
+    reader = LegacyModel(data_dir=str(tmp_path), storage='journal')
+    seen = 0
+    while process.is_alive():
+        reader.reload_if_changed()
+        count = len(reader.data.get('Wallet', {}))
+        # 寫入只會新增項目，讀到的數量不應該變少
+        assert count >= seen
+        seen = count
+    process.join()
+    assert process.exitcode == 0
+    reader.reload_if_changed()
+    assert len(reader.data['Wallet']) == 300
+    reader.close()
@@ -0,0 +1,114 @@
+# tests/test_rotation.py
+import pytest
+
+from model import storage as storage_module
+from model.model import LegacyModel
+from model.rotation import KeyRotation
+
+
+class Interrupted(Exception):
+    pass
+
+
+def make_vault(tmp_path, size=20):
+    model = LegacyModel(data_dir=str(tmp_path))
+    with model.batch():
+        for i in range(size):
+            model.encrypt_and_store('Wallet', f'w{i}', f'secret {i}')
+    return model
+
+
+def read_key(tmp_path):
+    return (tmp_path / 'key.txt').read_text()
+
+
+def test_rotation_round_trip(tmp_path):
+    model = make_vault(tmp_path)
+    old_key = read_key(tmp_path)
+    stats = model.rotate_key(chunk_size=4)
+    model.close()
+
+    assert stats['entries'] == 20 and stats['resumed'] == 0
+    assert read_key(tmp_path) != old_key
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.decrypt_and_retrieve('Wallet', 'w7') == 'secret 7'
+    reopened.close()
+
+
+def test_interrupted_rotation_resumes(tmp_path):
+    model = make_vault(tmp_path)
+    old_key = read_key(tmp_path)
+
+    def progress(done, total):
+        if done >= 8:
+            raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        model.rotate_key(chunk_size=4, progress=progress)
+    model.close()
+    # 中斷時 vault 與金鑰都沒有改變
+    assert read_key(tmp_path) == old_key
+    interrupted = LegacyModel(data_dir=str(tmp_path))
+    assert interrupted.decrypt_and_retrieve('Wallet', 'w19') == 'secret 19'
+
+    stats = interrupted.rotate_key(chunk_size=4)
+    interrupted.close()
+    assert stats['resumed'] == 8
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert all(reopened.decrypt_and_retrieve('Wallet', f'w{i}') == f'secret {i}' for i in range(20))
+    reopened.close()
+
+
+def test_changed_vault_restarts_rotation(tmp_path):
+    model = make_vault(tmp_path)
+
+    def progress(done, total):
+        raise Interrupted()
+
+    with pytest.raises(Interrupted):
+        model.rotate_key(chunk_size=4, progress=progress)
+    model.encrypt_and_store('Wallet', 'w0', 'changed')
+
+    stats = model.rotate_key(chunk_size=4)
+    model.close()
+    assert stats['resumed'] == 0
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.decrypt_and_retrieve('Wallet', 'w0') == 'changed'
+    reopened.close()
+
+
+def test_interrupted_commit_finishes_on_open(tmp_path):
+    model = make_vault(tmp_path)
+    old_key = read_key(tmp_path)
+    # 模擬所有項目都重新加密、寫回 vault 之前當機
+    model.finish_rotation = lambda *args: None
+    model.rotate_key(chunk_size=4)
+    model.close()
+    assert KeyRotation(str(tmp_path)).load_state()['phase'] == 'commit'
+    assert read_key(tmp_path) == old_key
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert read_key(tmp_path) != old_key
+    assert KeyRotation(str(tmp_path)).load_state() is None
+    assert reopened.decrypt_and_retrieve('Wallet', 'w3') == 'secret 3'
+    reopened.close()
+
+
+def test_failed_commit_keeps_the_old_key(tmp_path, monkeypatch):
+    model = make_vault(tmp_path)
+    old_key = read_key(tmp_path)
+
+    def full_disk(path, data):
+        raise OSError('disk full')
+
+    monkeypatch.setattr(storage_module, 'write_json_atomic', full_disk)
+    with pytest.raises(IOError, match='finished on next open'):
+        model.rotate_key(chunk_size=4)
+    monkeypatch.undo()
+    model.close()
+    assert read_key(tmp_path) == old_key
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert read_key(tmp_path) != old_key
+    assert reopened.decrypt_and_retrieve('Wallet', 'w3') == 'secret 3'
+    reopened.close()
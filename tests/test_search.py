@@ -0,0 +1,97 @@
+# tests/test_search.py
+import random
+
+import pytest
+
+from model.search import CategoryIndex, IdentifierIndex, TRIE_DEPTH
+
+
+class FakeModel:
+    def __init__(self, data):
+        self.data = data
+
+    def add_listener(self, callback):
+        pass
+
+
+def reference(identifiers, text):
+    # 逐一比對的結果：(前綴, 子字串, 模糊) 三組
+    texts = {identifier: identifier.lower() for identifier in identifiers}
+    prefix = {i for i, t in texts.items() if t.startswith(text)}
+    substring = {i for i, t in texts.items() if text in t} - prefix
+    fuzzy = set()
+    for i, t in texts.items():
+        position = 0
+        for char in text:
+            position = t.find(char, position) + 1
+            if not position:
+                break
+        else:
+            fuzzy.add(i)
+    return prefix, substring, fuzzy - prefix - substring
+
+
+def make_identifiers(size, seed=1):
+    rng = random.Random(seed)
+    words = ['binance', 'okx', 'metamask', 'Ledger', 'kraken', 'a.b', 'x[y]', 'q^q']
+    return [f'{rng.choice(words)}-{rng.choice(words)}-{i}' for i in range(size)]
+
+
+@pytest.mark.parametrize('text', [
+    'b', 'bin', 'binance', 'binance-ok', 'metamask-metamask-1', 'nce-k', 'bnc', 'ledger', 'aa', 'aaaaaaa',
+    'kk', 'kkkk', 'qqqqq', 'a.b', '[y]', 'q^q-x', 'zzz', '-1-',
+])
+def test_search_matches_reference(text):
+    identifiers = make_identifiers(2000)
+    index = CategoryIndex()
+    for identifier in identifiers:
+        index.add(identifier)
+
+    results = index.search(text, limit=len(identifiers))
+    prefix, substring, fuzzy = reference(identifiers, text)
+    assert len(results) == len(set(results))
+    # 依前綴、子字串、模糊的順序排列
+    assert set(results[:len(prefix)]) == prefix
+    assert set(results[len(prefix):len(prefix) + len(substring)]) == substring
+    assert set(results[len(prefix) + len(substring):]) == fuzzy
+
+
+def test_limit_keeps_best_matches():
+    identifiers = make_identifiers(2000)
+    index = CategoryIndex()
+    for identifier in identifiers:
+        index.add(identifier)
+    text = 'binance-ok'
+    assert len(text) > TRIE_DEPTH
+    prefix, substring, fuzzy = reference(identifiers, text)
+    results = index.search(text, limit=len(prefix) + 3)
+    assert set(results[:len(prefix)]) == prefix
+    assert set(results[len(prefix):]) <= substring
+    assert len(index.search('b', limit=10)) == 10
+
+
+def test_remove_drops_every_token():
+    index = CategoryIndex()
+    for identifier in ('banana', 'bandana', 'cabana'):
+        index.add(identifier)
+    index.remove('banana')
+    index.remove('cabana')
+    assert index.search('aaa', limit=10) == ['bandana']
+    index.remove('bandana')
+    assert index.texts == {} and index.trigrams == {} and index.chars == {} and index.trie == [{}, []]
+
+
+def test_built_index_follows_changes():
+    model = FakeModel({'Wallet': {'metamask': 'x'}, 'Exchange': {'binance': 'x'}})
+    index = IdentifierIndex(model, listen=False).build()
+    assert index.search('meta') == [('Wallet', 'metamask')]
+
+    # 建立後不再讀取 model.data：新分類與項目都來自變更通知
+    model.data = {}
+    index.on_changes([('Others', 'notes', 'x'), ('Wallet', 'ledger', 'x'), ('Exchange', 'binance', None)])
+    assert index.search('notes', 'Others') == [('Others', 'notes')]
+    assert index.search('led', 'Wallet') == [('Wallet', 'ledger')]
+    assert index.search('binance', 'Exchange') == []
+
+    index.on_changes(None)
+    assert not index.built and index.indexes == {}
@@ -0,0 +1,137 @@
+# tests/test_sharded.py
+import json
+import os
+
+from model.model import LegacyModel
+from model.storage import ShardedData, ShardedStorage, file_signature
+
+
+def open_vault(tmp_path, storage='sharded'):
+    return LegacyModel(data_dir=str(tmp_path), storage=storage)
+
+
+def fill(model):
+    with model.batch():
+        model.encrypt_and_store('Wallet', 'metamask', 'seed words')
+        model.encrypt_and_store('Exchange', 'binance', 'account,password')
+        model.encrypt_and_store('Others', 'notes', 'k:v')
+
+
+def test_round_trip_loads_shards_lazily(tmp_path):
+    model = open_vault(tmp_path)
+    fill(model)
+    model.close()
+
+    with open(tmp_path / 'shards' / 'manifest.json') as f:
+        manifest = json.load(f)
+    assert manifest['version'] == 1
+    assert set(manifest['shards']) == {'Wallet', 'Exchange', 'Others'}
+
+    model = open_vault(tmp_path, 'auto')
+    assert model.detect_storage() == 'sharded'
+    assert isinstance(model.data, ShardedData)
+    # 開啟時只讀 manifest，存取分類時才載入它的分片
+    assert set(model.data) == {'Wallet', 'Exchange', 'Others'}
+    assert model.data.loaded() == {}
+    assert model.decrypt_and_retrieve('Exchange', 'binance') == 'account,password'
+    assert set(model.data.loaded()) == {'Exchange'}
+    model.close()
+
+
+def test_write_rewrites_only_touched_shards(tmp_path):
+    model = open_vault(tmp_path)
+    fill(model)
+    storage = model.storage
+    paths = {category: os.path.join(storage.shard_dir, name) for category, name in storage.shard_files.items()}
+    os.utime(paths['Wallet'], ns=(0, 0))
+    os.utime(paths['Others'], ns=(0, 0))
+    before = {category: file_signature(path) for category, path in paths.items()}
+
+    model.encrypt_and_store('Exchange', 'okx', 'x')
+    after = {category: file_signature(path) for category, path in paths.items()}
+    assert after['Wallet'] == before['Wallet']
+    assert after['Others'] == before['Others']
+    assert after['Exchange'] != before['Exchange']
+    model.close()
+
+
+def test_odd_category_names_get_safe_unique_files():
+    names = {ShardedStorage.shard_name(category) for category in ('a/b', 'a_b', '../x', 'a' * 100)}
+    assert len(names) == 4
+    for name in names:
+        assert os.path.basename(name) == name
+        assert not name.startswith('.')
+
+
+def test_json_vault_is_migrated(tmp_path):
+    model = open_vault(tmp_path, 'json')
+    fill(model)
+    model.close()
+
+    model = open_vault(tmp_path)
+    assert model.decrypt_and_retrieve('Wallet', 'metamask') == 'seed words'
+    assert model.decrypt_and_retrieve('Others', 'notes') == 'k:v'
+    model.close()
+    assert not os.path.exists(tmp_path / 'legacy_data.json')
+    assert os.path.exists(tmp_path / 'legacy_data.json.pre-shard')
+    assert LegacyModel(data_dir=str(tmp_path)).detect_storage() == 'sharded'
+
+
+def test_journal_vault_is_migrated_with_pending_records(tmp_path):
+    model = open_vault(tmp_path, 'journal')
+    fill(model)
+    # 尚未壓縮的日誌紀錄也要帶進分片
+    model.delete_data('Others', 'notes')
+    model.encrypt_and_store('Wallet', 'ledger', 'more words')
+    model.close()
+    assert os.path.exists(tmp_path / 'legacy_data.journal')
+
+    model = open_vault(tmp_path)
+    assert model.decrypt_and_retrieve('Wallet', 'ledger') == 'more words'
+    assert 'notes' not in model.data['Others']
+    model.close()
+    assert not os.path.exists(tmp_path / 'legacy_data.journal')
+
+
+def test_reload_reads_only_changed_shards(tmp_path):
+    model = open_vault(tmp_path)
+    fill(model)
+    other = open_vault(tmp_path)
+    assert other.decrypt_and_retrieve('Wallet', 'metamask') == 'seed words'
+
+    wallet = other.data['Wallet']
+
+    changes = []
+    other.add_listener(changes.append)
+    # 沒載入過但被寫入的分類依分片簽章讀取並逐項通知；沒變的分類維持延遲載入
+    model.encrypt_and_store('Exchange', 'okx', 'x')
+    assert other.reload_if_changed()
+    assert sorted(changes.pop()) == sorted(('Exchange', identifier, value)
+                                           for identifier, value in model.data['Exchange'].items())
+    assert other.data['Wallet'] is wallet
+    assert set(other.data.loaded()) == {'Wallet', 'Exchange'}
+
+    model.encrypt_and_store('Wallet', 'ledger', 'more words')
+    assert other.reload_if_changed()
+    assert changes == [[('Wallet', 'ledger', model.data['Wallet']['ledger'])]]
+    assert other.decrypt_and_retrieve('Exchange', 'okx') == 'x'
+    assert set(other.data.loaded()) == {'Wallet', 'Exchange'}
+    model.close()
+    other.close()
+
+
+def test_reload_reports_categories_created_elsewhere(tmp_path):
+    model = open_vault(tmp_path)
+    model.encrypt_and_store('Wallet', 'metamask', 'seed words')
+    other = open_vault(tmp_path)
+    # 畫面上的空分類不在 manifest 中，也沒有載入
+    assert other.data.get('Exchange', {}) == {}
+    changes = []
+    other.add_listener(changes.append)
+
+    model.encrypt_and_store('Exchange', 'binance', 'account,password')
+    assert other.reload_if_changed()
+    assert changes == [[('Exchange', 'binance', model.data['Exchange']['binance'])]]
+    assert set(other.data.loaded()) == {'Exchange'}
+    model.close()
+    other.close()
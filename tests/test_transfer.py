@@ -0,0 +1,101 @@
+# tests/test_transfer.py
+import io
+
+import pytest
+
+from model import kdf, transfer
+from model.model import LegacyModel
+
+# 測試使用最低的 scrypt 成本
+FAST_KDF = {'kdf': 'scrypt', 'n': 2 ** 10, 'r': 8, 'p': 1}
+
+
+def write_archive(records, passphrase='archive pass'):
+    output = io.BytesIO()
+    with transfer.ArchiveWriter(output, passphrase, FAST_KDF) as archive:
+        for item in records:
+            archive.write(item)
+    return output.getvalue()
+
+
+def make_records(size):
+    return [{'category': 'Wallet', 'identifier': f'w{i}', 'value': f'secret {i}' * 20} for i in range(size)]
+
+
+def test_archive_round_trip(monkeypatch):
+    # 縮小 frame 讓封存檔有多個 frame
+    monkeypatch.setattr(transfer, 'FRAME_BYTES', 1024)
+    records = make_records(100)
+    archive = write_archive(records)
+
+    assert list(transfer.read_archive(io.BytesIO(archive), 'archive pass')) == records
+
+
+def test_archive_wrong_passphrase():
+    archive = write_archive(make_records(3))
+    with pytest.raises(kdf.PassphraseError):
+        list(transfer.read_archive(io.BytesIO(archive), 'wrong'))
+
+
+def test_archive_tampered_frame():
+    archive = bytearray(write_archive(make_records(3)))
+    archive[-5] ^= 1
+    with pytest.raises(transfer.ArchiveError):
+        list(transfer.read_archive(io.BytesIO(bytes(archive)), 'archive pass'))
+
+
+def test_archive_missing_final_frame(monkeypatch):
+    monkeypatch.setattr(transfer, 'FRAME_BYTES', 1024)
+    output = io.BytesIO()
+    archive = transfer.ArchiveWriter(output, 'archive pass', FAST_KDF)
+    for item in make_records(100):
+        archive.write(item)
+    # 沒有 close：只寫出非 final 的 frame，就像傳輸中斷的檔案
+    with pytest.raises(transfer.ArchiveError, match='truncated'):
+        list(transfer.read_archive(io.BytesIO(output.getvalue()), 'archive pass'))
+
+
+def test_archive_final_flag_is_authenticated(monkeypatch):
+    monkeypatch.setattr(transfer, 'FRAME_BYTES', 1024)
+    archive = bytearray(write_archive(make_records(100)))
+    # 把第一個 frame 標成 final，截斷後的檔案不能被當成完整的封存檔
+    first_frame = archive.index(b'\n') + 1
+    archive[first_frame + 4] = 1
+    with pytest.raises(transfer.ArchiveError, match='authentication'):
+        list(transfer.read_archive(io.BytesIO(bytes(archive)), 'archive pass'))
+
+
+def test_import_csv(tmp_path):
+    source = io.StringIO('name,Password,note\nbinance,hunter2,main account\n')
+    model = LegacyModel(data_dir=str(tmp_path))
+    counts = model.import_records(transfer.read_csv(source, 'Exchange', {'Password': 'exchange_password'}))
+
+    assert counts == {'imported': 1, 'skipped': 0, 'duplicates': 0}
+    fields, custom_fields = model.retrieve_fields('Exchange', 'binance')
+    assert fields['exchange_password'] == 'hunter2'
+    assert ('note', 'main account') in list(custom_fields)
+    model.close()
+
+
+def test_import_skips_existing_and_repeated(tmp_path):
+    model = LegacyModel(data_dir=str(tmp_path))
+    model.encrypt_and_store('Wallet', 'w0', 'kept')
+    records = make_records(3) + [{'category': 'Wallet', 'identifier': 'w1', 'value': 'repeated'}]
+    counts = model.import_records(iter(records))
+
+    assert counts == {'imported': 2, 'skipped': 1, 'duplicates': 1}
+    assert model.decrypt_and_retrieve('Wallet', 'w0') == 'kept'
+    assert model.decrypt_and_retrieve('Wallet', 'w1') == 'secret 1' * 20
+    model.close()
+
+
+def test_import_failure_leaves_vault_unchanged(tmp_path):
+    source = io.StringIO('category,identifier,value\nWallet,w0,a\nWallet,,b\n')
+    model = LegacyModel(data_dir=str(tmp_path))
+    with pytest.raises(ValueError):
+        model.import_records(transfer.read_csv(source))
+    model.close()
+
+    reopened = LegacyModel(data_dir=str(tmp_path))
+    assert reopened.data.get('Wallet', {}) == {}
+    reopened.close()
@@ -0,0 +1,47 @@
+# tests/test_watcher.py
+import time
+
+import pytest
+
+QtCore = pytest.importorskip('PySide6.QtCore')
+
+from controller.watcher import VaultWatcher
+from controller.worker import VaultWorker
+from model.model import LegacyModel
+
+
+@pytest.fixture(scope='module')
+def app():
+    return QtCore.QCoreApplication.instance() or QtCore.QCoreApplication([])
+
+
+def wait_for(app, condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        app.processEvents()
+        time.sleep(0.005)
+    return condition()
+
+
+def test_category_created_elsewhere_is_reported(app, tmp_path):
+    writer = LegacyModel(data_dir=str(tmp_path), storage='sharded')
+    writer.encrypt_and_store('Wallet', 'metamask', 'seed words')
+    model = LegacyModel(data_dir=str(tmp_path), storage='sharded')
+    changes = []
+    model.add_listener(changes.append)
+    worker = VaultWorker()
+    watcher = VaultWatcher(model, worker)
+
+    # 另一個程式建立這個行程沒有的分類，再寫入這個行程沒有載入過的分類
+    writer.encrypt_and_store('Exchange', 'binance', 'account,password')
+    assert wait_for(app, lambda: changes)
+    assert changes.pop() == [('Exchange', 'binance', writer.data['Exchange']['binance'])]
+    writer.encrypt_and_store('Wallet', 'ledger', 'more words')
+    assert wait_for(app, lambda: changes)
+    assert sorted(changes.pop()) == sorted(('Wallet', identifier, value)
+                                           for identifier, value in writer.data['Wallet'].items())
+
+    watcher.stop()
+    worker.wait()
+    model.close()
+    writer.close()